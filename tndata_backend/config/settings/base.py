@@ -256,6 +256,7 @@ MIDDLEWARE_CLASSES = (
     'utils.middleware.TimezoneMiddleware',
     'utils.middleware.ResponseForbiddenMiddleware',
     'utils.middleware.APIMetricsMiddleware',
+    'utils.middleware.QueryBudgetMiddleware',
     'staticflatpages.middleware.StaticFlatpageFallbackMiddleware',
     'utils.middleware.DebugMedia404Middleware',
 )
@@ -458,6 +459,14 @@ IGNORE_BAD_HOST_HEADERS = [
     'proxyradar.com',  # Stupid check.proxyradar.com/azenv.php
 ]
 
+# Query budgets & N+1 detection (see utils.querybudget). When DEBUG is off,
+# this fraction of requests have their queries recorded & stored in Redis.
+# Views that exceed their `query_budget` fail the tests.
+QUERY_BUDGET_SAMPLE_RATE = float(os.environ.get('QUERY_BUDGET_SAMPLE_RATE', 0))
+QUERY_BUDGET_REPEAT_THRESHOLD = 5
+QUERY_BUDGET_MAX_SAMPLES = 1000
+QUERY_BUDGET_STRICT = TESTING
+
 
 # Slack tokens: https://api.slack.com/web
 SLACK_API_TOKEN = os.environ.get('SLACK_API_TOKEN')
@@ -14,7 +14,7 @@ import tablib
 from django_fsm import TransitionNotAllowed
 from utils.admin import UserRelatedModelAdmin
 
-from . import models
+from . import models, transitions
 
 
 class ContentWorkflowAdmin(admin.ModelAdmin):
@@ -36,7 +36,9 @@ class ContentWorkflowAdmin(admin.ModelAdmin):
             self.message_user(request, err, level=ERROR)
 
     def set_draft(self, request, queryset):
-        self._transition_to(request, queryset, "draft", "Items marked Draft")
+        # Drafting cascades to child content; see goals.transitions.
+        transitions.draft_tree(queryset, updated_by=request.user)
+        self.message_user(request, "Items marked Draft")
     set_draft.short_description = "Mark as Draft"
 
     def set_review(self, request, queryset):
@@ -52,25 +54,7 @@ class ContentWorkflowAdmin(admin.ModelAdmin):
     set_published.short_description = "Publish"
 
     def publish_children(self, request, queryset):
-        count = 0  # Track total number of items published.
-
-        # publish the selected objects:
-        for obj in queryset:
-            if obj.is_draft or obj.is_pending:
-                obj.publish()
-                obj.save()
-                count += 1
-
-        # Now, publish all the children
-        children = [obj.publish_children() for obj in queryset]
-        children = [val for sublist in children for val in sublist]
-        count += len(children)
-
-        # and the children's children
-        while len(children) > 0:
-            children = [obj.publish_children() for obj in children]
-            children = [val for sublist in children for val in sublist]
-            count += len(children)
+        count = transitions.publish_tree(queryset, updated_by=request.user)
         self.message_user(request, "Published {} objects.".format(count))
     publish_children.short_description = "Publish selected item and all child content"
 
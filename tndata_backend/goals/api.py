@@ -16,14 +16,15 @@ from rest_framework.pagination import PageNumberPagination, _positive_int
 from rest_framework.response import Response
 from redis_metrics import metric
 
-from utils.mixins import VersionedViewSetMixin
+from utils.mixins import PrefetchPlanMixin, VersionedViewSetMixin
+from utils.pagination import KeysetPagination
 from utils.serializers import resultset
 from utils.user_utils import local_day_range
 
-from . import models
+from . import completions, models
 from . models.signals import invalidate_feed
 from . serializers import v1, v2
-from . mixins import DeleteMultipleMixin
+from . mixins import DeleteMultipleMixin, ResponseCacheMixin
 from . permissions import is_content_author
 from . user_feed import progress_streaks
 from . utils import pop_first
@@ -33,6 +34,16 @@ class PageSizePagination(PageNumberPagination):
     page_size_query_param = 'page_size'
 
 
+class UserActionPagination(KeysetPagination):
+    ordering = ('id', )
+    fallback_class = PageSizePagination
+
+
+class DailyProgressPagination(KeysetPagination):
+    ordering = ('-updated_on', '-id')
+    fallback_class = PageSizePagination
+
+
 class PublicViewSetPagination(PageNumberPagination):
     """This is a pagination class for publicly accessable, read-only viewsets
     (e.g. the content library). It enables the following:
@@ -190,7 +201,9 @@ class ProgramViewSet(VersionedViewSetMixin, viewsets.ReadOnlyModelViewSet):
         return Response(resultset(serializer.data))
 
 
-class CategoryViewSet(VersionedViewSetMixin, viewsets.ReadOnlyModelViewSet):
+class CategoryViewSet(ResponseCacheMixin,
+                      VersionedViewSetMixin,
+                      viewsets.ReadOnlyModelViewSet):
     """ViewSet for public Categories. See the api_docs/ for more info"""
     authentication_classes = (TokenAuthentication, SessionAuthentication)
     queryset = models.Category.objects.published()
@@ -291,7 +304,9 @@ def _enroll_user_in_goal(user, goal, category=None):
     goal.enroll(user, category)
 
 
-class GoalViewSet(VersionedViewSetMixin, viewsets.ReadOnlyModelViewSet):
+class GoalViewSet(ResponseCacheMixin,
+                  VersionedViewSetMixin,
+                  viewsets.ReadOnlyModelViewSet):
     """ViewSet for public Goals. See the api_docs/ for more info"""
     authentication_classes = (TokenAuthentication, SessionAuthentication)
     queryset = models.Goal.objects.published()
@@ -428,7 +443,9 @@ class TriggerViewSet(VersionedViewSetMixin,
         return super().update(request, *args, **kwargs)
 
 
-class ActionViewSet(VersionedViewSetMixin, viewsets.ReadOnlyModelViewSet):
+class ActionViewSet(ResponseCacheMixin,
+                    VersionedViewSetMixin,
+                    viewsets.ReadOnlyModelViewSet):
     """ViewSet for public Actions. See the api_docs/ for more info"""
     authentication_classes = (TokenAuthentication, SessionAuthentication)
     queryset = models.Action.objects.published()
@@ -501,6 +518,7 @@ class ActionViewSet(VersionedViewSetMixin, viewsets.ReadOnlyModelViewSet):
 
 
 class UserGoalViewSet(VersionedViewSetMixin,
+                      PrefetchPlanMixin,
                       mixins.CreateModelMixin,
                       mixins.ListModelMixin,
                       mixins.RetrieveModelMixin,
@@ -515,6 +533,8 @@ class UserGoalViewSet(VersionedViewSetMixin,
     docstring_prefix = "goals/api_docs"
     permission_classes = [IsOwner]
     pagination_class = PageSizePagination
+    # See utils.querybudget; listing is O(1) (see the serializer's prefetch plan).
+    query_budget = {'list': 15, 'retrieve': 10}
 
     def get_serializer_class(self):
         """
@@ -576,6 +596,7 @@ class UserGoalViewSet(VersionedViewSetMixin,
 
 
 class UserActionViewSet(VersionedViewSetMixin,
+                        PrefetchPlanMixin,
                         mixins.CreateModelMixin,
                         mixins.ListModelMixin,
                         mixins.RetrieveModelMixin,
@@ -590,7 +611,9 @@ class UserActionViewSet(VersionedViewSetMixin,
     serializer_class_v2 = v2.UserActionSerializer
     docstring_prefix = "goals/api_docs"
     permission_classes = [IsOwner]
-    pagination_class = PageSizePagination
+    pagination_class = UserActionPagination
+    # See utils.querybudget; listing is O(1) (see the serializer's prefetch plan).
+    query_budget = {'list': 15, 'retrieve': 10}
 
     def get_serializer_class(self):
         """
@@ -912,6 +935,48 @@ class UserActionViewSet(VersionedViewSetMixin,
                 status=status.HTTP_400_BAD_REQUEST
             )
 
+    @list_route(methods=['post'], url_path='complete')
+    def complete_batch(self, request, pk=None):
+        """Complete a batch of the user's actions and/or custom actions at
+        once (e.g. those completed while the app was offline). Requires a
+        payload of:
+
+            {items: [{useraction: <pk>, state: <state>, timestamp: <date>}, ...]}
+
+        See `goals.completions` for details. The response contains a result
+        for each item, in the same order.
+
+        """
+        if not request.user.is_authenticated():
+            return Response({}, status=status.HTTP_401_UNAUTHORIZED)
+
+        items = request.data.get('items')
+        if not isinstance(items, list) or not items:
+            return Response(
+                data={'error': "items must be a list of completions"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if len(items) > completions.MAX_BATCH_SIZE:
+            return Response(
+                data={'error': "Too many items (the maximum is {})".format(
+                    completions.MAX_BATCH_SIZE)},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        # Validate each item; only the valid ones are written.
+        valid, results = [], [None] * len(items)
+        for i, item in enumerate(items):
+            serializer = v2.CompletionSerializer(data=item)
+            if serializer.is_valid():
+                valid.append((i, serializer.validated_data))
+            else:
+                results[i] = {'status': completions.ERROR, 'error': serializer.errors}
+
+        written = completions.complete_batch(request.user, [data for _, data in valid])
+        for (i, _), result in zip(valid, written):
+            results[i] = result
+        return Response(data={'results': results}, status=status.HTTP_200_OK)
+
 
 class UserCategoryViewSet(VersionedViewSetMixin,
                           mixins.CreateModelMixin,
@@ -1391,7 +1456,7 @@ class DailyProgressViewSet(VersionedViewSetMixin,
     serializer_class_v2 = v2.DailyProgressSerializer
     docstring_prefix = "goals/api_docs"
     permission_classes = [IsOwner]
-    pagination_class = PageSizePagination
+    pagination_class = DailyProgressPagination
 
     def get_queryset(self):
         if not self.request.user.is_authenticated():
@@ -0,0 +1,237 @@
+"""
+Enrolling a cohort (a roster of email addresses) in a package.
+
+`PackageEnrollmentManager.batch_enroll` used to look up every email address
+with its own query, create accounts one at a time, and add goals to each
+PackageEnrollment individually. For rosters of thousands of users, that
+took far too long to do in a request.
+
+`import_cohort` instead:
+
+1. Resolves all of the email addresses in one (case-insensitive) query.
+2. Bulk-creates inactive accounts (with their profiles and API tokens) for
+   any addresses that don't yet have one.
+3. Bulk-creates (or updates) the PackageEnrollments, and bulk-inserts the
+   rows linking them to the package's goals.
+4. Fans the per-user work (enrolling users who've already accepted the
+   package in its content, enrolling new users in the default content, and
+   notifying users with a device about their new enrollments) out to
+   background jobs, in chunks.
+
+Each import has a progress record, stored in the cache, that can be polled
+with `get_progress` (see the `package-enrollment-progress` view).
+
+"""
+import uuid
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db.models.functions import Lower
+from django.utils import timezone
+from django.utils.text import slugify
+from django_rq import job
+from rest_framework.authtoken.models import Token
+
+from userprofile.models import UserProfile
+from utils.user_utils import username_hash
+
+from .models import Category, PackageEnrollment
+from .models.signals import notify_enrolled
+
+
+CHUNK_SIZE = 100
+PROGRESS_KEY = "package-enrollment-progress-{batch}-{name}"
+PROGRESS_TIMEOUT = 60 * 60 * 24  # 24 hours
+
+# Session key used to pass the id of the latest import to the package page.
+ENROLLMENT_BATCH_SESSION_KEY = "package-enrollment-batch"
+
+
+def normalize_emails(emails):
+    """Return a list of unique, stripped & lower-cased email addresses (in
+    their original order)."""
+    results = []
+    seen = set()
+    for email in emails:
+        email = email.strip().lower()
+        if email and email not in seen:
+            seen.add(email)
+            results.append(email)
+    return results
+
+
+def _create_inactive_users(emails):
+    """Bulk-create inactive accounts (that need onboarding) for the given
+    email addresses; this is a bulk version of `create_inactive_user`."""
+    User = get_user_model()
+    users = []
+    for email in emails:
+        user = User(username=username_hash(email), email=email, is_active=False)
+        user.set_unusable_password()
+        users.append(user)
+    User.objects.bulk_create(users)
+
+    # NOTE: bulk_create doesn't fire post_save, so create the objects that
+    # the User signal handlers would.
+    users = list(User.objects.filter(username__in=[u.username for u in users]))
+    UserProfile.objects.bulk_create([
+        UserProfile(user=user, needs_onboarding=True) for user in users
+    ])
+    Token.objects.bulk_create([
+        Token(user=user, key=Token().generate_key()) for user in users
+    ])
+    return users
+
+
+def resolve_users(emails):
+    """Given a list of normalized email addresses, return a tuple of:
+
+    - a dict mapping each address to a User (creating inactive accounts for
+      any that don't exist)
+    - a list of the ids of the newly created users.
+
+    """
+    User = get_user_model()
+    users = {}
+    existing = User.objects.annotate(email_lower=Lower('email'))
+    existing = existing.filter(email_lower__in=emails).order_by('-id')
+    for user in existing:
+        users[user.email_lower] = user  # If there are duplicates, the oldest wins.
+
+    created = _create_inactive_users([e for e in emails if e not in users])
+    for user in created:
+        users[user.email.lower()] = user
+    return users, [user.id for user in created]
+
+
+def _enroll_users(category, users, goals, by, prevent_triggers):
+    """Create or update a PackageEnrollment for each of the given users, and
+    add the goals to them. Returns a tuple of:
+
+    * a list of (PackageEnrollment id, user id) tuples.
+    * the set of ids of the PackageEnrollments that were created.
+
+    """
+    user_ids = [user.id for user in users]
+    enrollments = PackageEnrollment.objects.filter(category=category)
+    existing = set(
+        enrollments.filter(user__in=user_ids).values_list('user_id', flat=True)
+    )
+    enrollments.filter(user__in=existing).update(
+        enrolled_by=by,
+        prevent_custom_triggers=prevent_triggers,
+        updated_on=timezone.now()
+    )
+    PackageEnrollment.objects.bulk_create([
+        PackageEnrollment(
+            user_id=user_id,
+            category=category,
+            enrolled_by=by,
+            prevent_custom_triggers=prevent_triggers
+        )
+        for user_id in user_ids if user_id not in existing
+    ])
+
+    enrolled = list(enrollments.filter(user__in=user_ids).values_list('id', 'user_id'))
+    ids = [pe_id for pe_id, user_id in enrolled]
+    created = {pe_id for pe_id, user_id in enrolled if user_id not in existing}
+
+    # Add the goals to every enrollment (skipping those already added).
+    Through = PackageEnrollment.goals.through
+    goal_ids = [goal.id for goal in goals]
+    linked = set(
+        Through.objects.filter(packageenrollment_id__in=ids, goal_id__in=goal_ids)
+        .values_list('packageenrollment_id', 'goal_id')
+    )
+    Through.objects.bulk_create([
+        Through(packageenrollment_id=pe_id, goal_id=goal_id)
+        for pe_id in ids for goal_id in goal_ids
+        if (pe_id, goal_id) not in linked
+    ])
+    return enrolled, created
+
+
+def _progress_key(batch_id, name):
+    return PROGRESS_KEY.format(batch=batch_id, name=name)
+
+
+def get_progress(batch_id):
+    """Return a dict describing the progress of an import (or None if the
+    import is unknown or expired)."""
+    total = cache.get(_progress_key(batch_id, 'total'))
+    if total is None:
+        return None
+    done = cache.get(_progress_key(batch_id, 'done')) or 0
+    return {'total': total, 'done': done, 'complete': done >= total}
+
+
+@job
+def enroll_chunk(enrollment_ids, new_user_ids, batch_id, created_ids=None):
+    """Do the per-user work for a chunk of PackageEnrollments: users that
+    already accepted the package are enrolled in its content, new users
+    are enrolled in the default content (as the `auto_enroll` signal handler
+    would've done), and users with a device are notified about the
+    enrollments in `created_ids` (as `notify_for_new_package` would've done,
+    since bulk_create doesn't send post_save)."""
+    enrollments = PackageEnrollment.objects.filter(id__in=enrollment_ids)
+    enrollments = enrollments.select_related('user', 'category')
+    created_ids = set(created_ids or [])
+    notify = set()
+    if created_ids:
+        notify = set(
+            enrollments.filter(id__in=created_ids, user__gcmdevice__isnull=False)
+            .values_list('id', flat=True)
+        )
+    default_categories = None
+    for enrollment in enrollments:
+        if enrollment.accepted:
+            enrollment.create_user_mappings()
+        if enrollment.id in notify:
+            notify_enrolled(enrollment)
+
+        user = enrollment.user
+        key = "omit-default-selections-{}".format(slugify(user.email))
+        if user.id in new_user_ids and not cache.get(key):
+            if default_categories is None:
+                default_categories = list(
+                    Category.objects.selected_by_default(state='published'))
+            for category in default_categories:
+                category.enroll(user)
+
+    done_key = _progress_key(batch_id, 'done')
+    cache.add(done_key, 0, timeout=PROGRESS_TIMEOUT)
+    try:
+        cache.incr(done_key, len(enrollment_ids))
+    except ValueError:
+        pass  # The progress record expired (or the cache isn't persistent).
+
+
+def import_cohort(emails, category, goals, by, prevent_triggers=False,
+                  chunk_size=CHUNK_SIZE):
+    """Enroll the given email addresses in a package (a Category), including
+    the given goals. Returns a tuple of (QuerySet of PackageEnrollments,
+    progress id).
+
+    """
+    emails = normalize_emails(emails)
+    users, new_user_ids = resolve_users(emails)
+    users = [users[email] for email in emails]
+    enrolled, created = _enroll_users(category, users, goals, by, prevent_triggers)
+    enrollment_ids = [pe_id for pe_id, user_id in enrolled]
+
+    batch_id = uuid.uuid4().hex
+    cache.set(_progress_key(batch_id, 'total'), len(enrollment_ids), PROGRESS_TIMEOUT)
+    cache.set(_progress_key(batch_id, 'done'), 0, PROGRESS_TIMEOUT)
+    new_user_ids = set(new_user_ids)
+    for i in range(0, len(enrolled), chunk_size):
+        chunk = enrolled[i:i + chunk_size]
+        enroll_chunk.delay(
+            [pe_id for pe_id, user_id in chunk],
+            new_user_ids & {user_id for pe_id, user_id in chunk},
+            batch_id,
+            created_ids=[pe_id for pe_id, user_id in chunk if pe_id in created]
+        )
+
+    enrollments = PackageEnrollment.objects.filter(pk__in=enrollment_ids)
+    enrollments = enrollments.select_related('user', 'category')
+    return enrollments, batch_id
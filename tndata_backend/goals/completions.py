@@ -0,0 +1,295 @@
+"""
+Batched completions of UserActions and CustomActions.
+
+After being offline, the mobile app replays every completion it recorded,
+one `POST /api/users/actions/<id>/complete/` (or custom action `complete`)
+at a time. Each of those does a get-or-create of the day's completion, and
+its `post_save` signals update the user's DailyProgress, record metrics,
+delete any queued notifications for the action, check whether the UserGoal
+is complete, and update the SequenceState; the api then busts the Feed.
+
+`complete_batch` instead writes a list of completions in one transaction:
+
+1. The user's UserActions / CustomActions and the existing completions for
+   the days involved are fetched with one query per model.
+2. Completions are still kept to 1 record per object per (local) day, and
+   the latest item for that day wins. Items that are older than what's
+   already recorded are skipped.
+3. Existing records are written with a single UPDATE per model, and new ones
+   with a single INSERT per model (keeping the item's timestamp as their
+   `created_on` / `updated_on`).
+4. The work done by the signals (and the Feed invalidation) is done once for
+   the whole batch.
+
+"""
+from collections import Counter, OrderedDict
+
+from django.contrib.contenttypes.models import ContentType
+from django.db import connection, transaction
+from redis_metrics import metric
+
+from utils.user_utils import local_day_range
+
+from . import progress_queue
+from .models import (
+    Action,
+    CustomAction,
+    DailyProgress,
+    SequenceState,
+    UserAction,
+    UserCompletedAction,
+    UserCompletedCustomAction,
+    UserGoal,
+)
+from .models.signals import invalidate_feed
+
+
+# The maximum number of items accepted in a single batch.
+MAX_BATCH_SIZE = 200
+
+CREATED = 'created'
+UPDATED = 'updated'
+SKIPPED = 'skipped'
+ERROR = 'error'
+
+
+def _insert(model, columns, rows):
+    """INSERT the rows (tuples of values for the given columns) with a single
+    statement, and return the list of their new ids (in the same order)."""
+    if not rows:
+        return []
+    qn = connection.ops.quote_name
+    values = "({})".format(", ".join(["%s"] * len(columns)))
+    sql = "INSERT INTO {} ({}) VALUES {} RETURNING {}".format(
+        qn(model._meta.db_table),
+        ", ".join(qn(c) for c in columns),
+        ", ".join([values] * len(rows)),
+        qn(model._meta.pk.column),
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [value for row in rows for value in row])
+        return [row[0] for row in cursor.fetchall()]
+
+
+def _update(model, rows):
+    """Set the `state` and `updated_on` of existing completions with a single
+    UPDATE. `rows` is a list of (id, state, updated_on) tuples."""
+    if not rows:
+        return
+    qn = connection.ops.quote_name
+    table = qn(model._meta.db_table)
+    sql = (
+        "UPDATE {table} SET {state} = v.state, {updated_on} = v.updated_on "
+        "FROM (VALUES {values}) AS v(id, state, updated_on) "
+        "WHERE {table}.{id} = v.id"
+    ).format(
+        table=table,
+        state=qn('state'),
+        updated_on=qn('updated_on'),
+        id=qn(model._meta.pk.column),
+        values=", ".join(["(%s, %s, %s::timestamptz)"] * len(rows)),
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [value for row in rows for value in row])
+
+
+class _Kind:
+    """Describes how to complete one kind of object (UserAction or
+    CustomAction)."""
+
+    def __init__(self, key, model, completion_model):
+        self.key = key  # The item's field containing the object's id.
+        self.model = model
+        self.completion_model = completion_model
+        self.fk = '{}_id'.format(key)
+
+    def objects(self, user, ids):
+        queryset = self.model.objects.filter(user=user, id__in=ids)
+        if self.model == UserAction:
+            queryset = queryset.select_related('custom_trigger', 'action__default_trigger')
+        return {obj.id: obj for obj in queryset}
+
+    def existing(self, user, ids, start, end):
+        """Return the existing completions for the objects, created between
+        the given dates (oldest first)."""
+        return self.completion_model.objects.filter(
+            user=user,
+            created_on__range=(start, end),
+            **{'{}__in'.format(self.key): ids}
+        ).order_by('created_on')
+
+    def columns(self):
+        if self.model == UserAction:
+            return ['user_id', 'useraction_id', 'action_id']
+        return ['user_id', 'customaction_id', 'customgoal_id', 'goal_id']
+
+    def values(self, obj):
+        if self.model == UserAction:
+            return [obj.user_id, obj.id, obj.action_id]
+        return [obj.user_id, obj.id, obj.customgoal_id, obj.goal_id]
+
+
+KINDS = [
+    _Kind('useraction', UserAction, UserCompletedAction),
+    _Kind('customaction', CustomAction, UserCompletedCustomAction),
+]
+
+
+def _day(user, dt):
+    """The start of the user's local day containing the given datetime."""
+    return local_day_range(user, dt=dt)[0]
+
+
+def complete_batch(user, items):
+    """Record a batch of completions for the given user.
+
+    `items` is a list of dicts (see `v2.CompletionSerializer`) containing:
+
+    * `useraction` or `customaction`: the id of the completed object.
+    * `state`: one of the UserCompletedAction states.
+    * `timestamp`: when the user completed the object (an aware datetime).
+    * `length` (optional): the length of a snooze.
+
+    Returns a list with a result for each item (in the same order), e.g.
+    `{'status': 'created', 'id': 42}`. The status is one of `created`,
+    `updated`, `skipped` (a newer item or completion exists for the same day),
+    or `error` (in which case the result contains an `error` message).
+
+    """
+    results = [None] * len(items)
+    written = {kind.key: [] for kind in KINDS}  # Indexes of written items
+    days = set()
+
+    with transaction.atomic():
+        for kind in KINDS:
+            indexes = [i for i, item in enumerate(items) if item.get(kind.key)]
+            if not indexes:
+                continue
+
+            objects = kind.objects(user, {items[i][kind.key] for i in indexes})
+
+            # Keep the latest item for each object & day.
+            latest = OrderedDict()
+            for i in sorted(indexes, key=lambda i: items[i]['timestamp']):
+                item = items[i]
+                if item[kind.key] not in objects:
+                    results[i] = {'status': ERROR, 'error': 'Not found'}
+                    continue
+                key = (item[kind.key], _day(user, item['timestamp']))
+                if key in latest:
+                    results[latest[key]] = {'status': SKIPPED}
+                latest[key] = i
+            if not latest:
+                continue
+
+            # Existing completions for those days (if there are several, the
+            # most recent one is updated).
+            starts = [day for _, day in latest]
+            start, end = min(starts), local_day_range(user, dt=max(starts))[1]
+            existing = {}
+            for obj in kind.existing(user, list(objects), start, end):
+                key = (getattr(obj, kind.fk), _day(user, obj.created_on))
+                existing[key] = obj
+
+            updates, inserts, inserted = [], [], []
+            for key, i in latest.items():
+                item = items[i]
+                obj = existing.get(key)
+                if obj is None:
+                    row = kind.values(objects[item[kind.key]])
+                    inserts.append(row + [item['state'], item['timestamp'], item['timestamp']])
+                    inserted.append(i)
+                elif item['timestamp'] < obj.updated_on:
+                    results[i] = {'status': SKIPPED, 'id': obj.id}
+                    continue
+                else:
+                    updates.append((obj.id, item['state'], item['timestamp']))
+                    results[i] = {'status': UPDATED, 'id': obj.id}
+                written[kind.key].append(i)
+                days.add(key[1])
+
+            _update(kind.completion_model, updates)
+            columns = kind.columns() + ['state', 'created_on', 'updated_on']
+            ids = _insert(kind.completion_model, columns, inserts)
+            for i, pk in zip(inserted, ids):
+                results[i] = {'status': CREATED, 'id': pk}
+
+            if kind.model == UserAction:
+                _useractions_completed(
+                    user, [objects[items[i]['useraction']] for i in written['useraction']
+                           if items[i]['state'] == UserCompletedAction.COMPLETED])
+
+        if any(written.values()):
+            _update_progress(user, days)
+            if written['useraction']:
+                SequenceState.objects.update_for(user)
+
+    # Metrics & the Feed
+    indexes = [i for kind in KINDS for i in written[kind.key]]
+    if indexes:
+        states = Counter(items[i]['state'] for i in written['useraction'])
+        for state, num in states.items():
+            metric("action-{}".format(state), num=num, category="User Interactions")
+        snoozes = Counter(
+            items[i].get('length') or 'undefined' for i in indexes
+            if items[i]['state'] == UserCompletedAction.SNOOZED
+        )
+        for length, num in snoozes.items():
+            metric("snooze-{0}".format(length), num=num, category='Snoozed Reminders')
+        invalidate_feed.send(sender=complete_batch, user=user)
+
+    return results
+
+
+def _useractions_completed(user, useractions):
+    """Do the work of the `action_completed` signal handler for a number of
+    completed UserActions: remove the queued notifications for those whose
+    trigger should stop on completion, and complete the UserGoals in which
+    every UserAction has been completed."""
+    if not useractions:
+        return
+
+    stopped = [
+        ua.action_id for ua in useractions
+        if ua.trigger and ua.trigger.stop_on_complete
+    ]
+    if stopped:
+        user.gcmmessage_set.filter(
+            object_id__in=stopped,
+            content_type=ContentType.objects.get_for_model(Action)
+        ).delete()
+
+    goals = {ua.primary_goal_id for ua in useractions if ua.primary_goal_id}
+    if goals:
+        # Goals that still have uncompleted UserActions.
+        incomplete = UserAction.objects.filter(
+            user=user,
+            primary_goal__in=goals,
+            usercompletedaction=None
+        ).values_list('primary_goal', flat=True).distinct()
+        goals = goals - set(incomplete)
+    for ug in UserGoal.objects.filter(user=user, goal__in=goals, completed=False):
+        ug.complete()
+        ug.save()
+
+
+def _update_progress(user, days):
+    """Update the user's DailyProgress for each of the given days (the starts
+    of the user's local days). Today's is created if necessary (or marked as
+    dirty if updates are debounced); earlier days are only updated if they
+    already exist."""
+    today = _day(user, None)
+    for day in sorted(days):
+        if day == today and progress_queue.enabled():
+            progress_queue.mark_dirty(user.id)
+            continue
+        elif day == today:
+            dp = DailyProgress.objects.for_today(user)
+        else:
+            dp = DailyProgress.objects.filter(
+                user=user,
+                created_on__range=local_day_range(user, dt=day)
+            ).first()
+        if dp is not None:
+            dp.update_stats()
+            dp.save()
@@ -0,0 +1,229 @@
+"""
+Bulk duplication of a Category's content.
+
+`Category.duplicate_content` used to copy every Goal, Action, and default
+Trigger with its own `save()` (firing its signals, slugifying its title,
+serializing its trigger, etc), which took minutes for a large category.
+
+`duplicate_category` instead:
+
+1. Reads the category's Goals, their Actions (with default triggers), and
+   the Action-Goal links in a few queries.
+2. Reserves primary keys for all of the copies from each table's sequence,
+   so the copies can be linked to each other in memory.
+3. Writes the copies with one `bulk_create` per model, then bulk-inserts the
+   Goal-Category and Action-Goal links.
+
+The copies reuse the originals' rendered markdown (see `goals.rendering`).
+Copies are created as drafts, so the signals that `save()` would've fired
+(which deal with published content and user data) have nothing to do.
+
+`duplicate_in_background` runs this as an RQ job, recording its progress in
+the cache (see `get_progress`).
+
+"""
+import uuid
+
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.utils.text import slugify
+from django_rq import job
+
+from utils.db import get_max_order
+
+from .models import Action, Category, Goal, Trigger
+
+
+PROGRESS_KEY = "duplicate-content-progress-{job_id}"
+PROGRESS_TIMEOUT = 60 * 60 * 24  # 24 hours
+
+# The steps of a duplication, in order (for progress reporting).
+STEPS = ['reading', 'triggers', 'goals', 'actions', 'links']
+
+
+def reserve_ids(model, count):
+    """Reserve `count` primary key values from the model's sequence. Returns
+    a list of ids."""
+    if not count:
+        return []
+    sql = "SELECT nextval(pg_get_serial_sequence(%s, %s)) FROM generate_series(1, %s)"
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [model._meta.db_table, model._meta.pk.column, count])
+        return [row[0] for row in cursor.fetchall()]
+
+
+def _copy_trigger(trigger, pk, prefix):
+    values = {
+        f.attname: getattr(trigger, f.attname)
+        for f in Trigger._meta.concrete_fields if not f.primary_key
+    }
+    copy = Trigger(**values)
+    copy.pk = pk
+    copy.name = "{} {}".format(prefix, trigger.name)
+    copy.name_slug = slugify(copy.name)
+    return copy
+
+
+def _copy_goal(goal, pk, prefix):
+    copy = Goal(
+        pk=pk,
+        title="{} {}".format(prefix, goal.title),
+        description=goal.description,
+        subtitle=goal.subtitle,
+        notes=goal.notes,
+        more_info=goal.more_info,
+        icon=goal.icon,
+        keywords=goal.keywords,
+        description_html=goal.description_html,
+        markdown_hash=goal.markdown_hash,
+    )
+    copy.title_slug = slugify(copy.title)
+    return copy
+
+
+def _copy_action(action, pk, default_trigger):
+    copy = Action(
+        pk=pk,
+        title=action.title,
+        title_slug=slugify(action.title),
+        action_type=action.action_type,
+        sequence_order=action.sequence_order,
+        source_link=action.source_link,
+        source_notes=action.source_notes,
+        notes=action.notes,
+        more_info=action.more_info,
+        description=action.description,
+        external_resource=action.external_resource,
+        external_resource_name=action.external_resource_name,
+        notification_text=action.notification_text,
+        icon=action.icon,
+        default_trigger=default_trigger,
+        description_html=action.description_html,
+        more_info_html=action.more_info_html,
+        markdown_hash=action.markdown_hash,
+    )
+    # Do what Action.save() would.
+    copy._set_notification_text()
+    copy._serialize_default_trigger()
+    copy._set_external_resource_type()
+    return copy
+
+
+def _progress_key(job_id):
+    return PROGRESS_KEY.format(job_id=job_id)
+
+
+def _set_progress(job_id, **values):
+    if job_id:
+        progress = get_progress(job_id) or {}
+        progress.update(values)
+        cache.set(_progress_key(job_id), progress, PROGRESS_TIMEOUT)
+
+
+def get_progress(job_id):
+    """Return a dict describing the progress of a duplication: its `state`
+    (pending, running, complete, or failed), the current `step`, the number
+    of steps `done` out of `total`, and (once complete) the new category's
+    `category_id` and `url`. Returns None for an unknown job."""
+    return cache.get(_progress_key(job_id))
+
+
+def duplicate_category(category, prefix="Copy of", job_id=None):
+    """Duplicate the category and all of its Goals, their Actions, and their
+    default Triggers. Goal (and Trigger) titles get the given prefix. Returns
+    the new Category.
+
+    """
+    def step(name):
+        _set_progress(job_id, state='running', step=name, done=STEPS.index(name))
+
+    step('reading')
+    goals = list(category.goals)
+    goal_ids = [goal.id for goal in goals]
+    actions = Action.objects.filter(goals__in=goal_ids).distinct()
+    actions = list(actions.select_related('default_trigger'))
+    links = Action.goals.through.objects.filter(goal_id__in=goal_ids)
+    links = list(links.values_list('action_id', 'goal_id'))
+
+    with transaction.atomic():
+        new_category = Category.objects.create(
+            order=get_max_order(Category),
+            title="{} {}".format(prefix, category.title),
+            description=category.description,
+            icon=category.icon,
+            image=category.image,
+            notes=category.notes,
+            color=category.color,
+            secondary_color=category.secondary_color,
+            packaged_content=category.packaged_content,
+            consent_summary=category.consent_summary,
+            consent_more=category.consent_more,
+            prevent_custom_triggers_default=category.prevent_custom_triggers_default,
+            display_prevent_custom_triggers_option=category.display_prevent_custom_triggers_option,
+        )
+
+        step('triggers')
+        originals = [a.default_trigger for a in actions if a.default_trigger_id]
+        ids = reserve_ids(Trigger, len(originals))
+        triggers = {
+            trigger.id: _copy_trigger(trigger, pk, prefix)
+            for trigger, pk in zip(originals, ids)
+        }
+        Trigger.objects.bulk_create(triggers.values())
+
+        step('goals')
+        ids = reserve_ids(Goal, len(goals))
+        goal_map = {
+            goal.id: _copy_goal(goal, pk, prefix) for goal, pk in zip(goals, ids)
+        }
+        Goal.objects.bulk_create(goal_map.values())
+
+        step('actions')
+        ids = reserve_ids(Action, len(actions))
+        action_map = {
+            action.id: _copy_action(action, pk, triggers.get(action.default_trigger_id))
+            for action, pk in zip(actions, ids)
+        }
+        Action.objects.bulk_create(action_map.values())
+
+        step('links')
+        GoalCategories = Goal.categories.through
+        GoalCategories.objects.bulk_create([
+            GoalCategories(goal_id=goal.id, category_id=new_category.id)
+            for goal in goal_map.values()
+        ])
+        ActionGoals = Action.goals.through
+        ActionGoals.objects.bulk_create([
+            ActionGoals(
+                action_id=action_map[action_id].id,
+                goal_id=goal_map[goal_id].id
+            )
+            for action_id, goal_id in links
+        ])
+
+    _set_progress(
+        job_id,
+        state='complete',
+        step=None,
+        done=len(STEPS),
+        category_id=new_category.id,
+        url=new_category.get_absolute_url()
+    )
+    return new_category
+
+
+def new_job_id():
+    """Create an id for a background duplication, and its progress record."""
+    job_id = uuid.uuid4().hex
+    _set_progress(job_id, state='pending', step=None, done=0, total=len(STEPS))
+    return job_id
+
+
+@job
+def duplicate_in_background(category_id, prefix, job_id):
+    """Duplicate the content of a Category in an RQ job."""
+    try:
+        duplicate_category(Category.objects.get(pk=category_id), prefix, job_id)
+    except Exception:
+        _set_progress(job_id, state='failed')
+        raise
@@ -0,0 +1,151 @@
+"""
+Bulk enrollment of a user in Goals and their Actions.
+
+`Category.enroll` and `Goal.enroll` used to loop over every Goal and Action,
+calling `get_or_create` then `save()` for each UserGoal and UserAction. Each
+new UserAction computed its own trigger dates (re-querying the user's
+sequence of actions) and fired its `post_save` signals, so enrolling a user
+in a large package took hundreds of queries.
+
+`enroll_in_goals` instead:
+
+1. Diffs the desired set of UserGoals and UserActions against the user's
+   existing rows (one query each).
+2. Creates the missing rows with `bulk_create`, and updates the primary goal
+   and category of existing rows with a few bulk UPDATEs.
+3. Does the work of the (skipped) `post_save` signals once: updating the
+   user's SequenceState and DailyProgress and recording metrics.
+4. Computes trigger dates for all of the UserActions in memory and writes
+   them with the bulk refresh engine (see `goals.refresh`).
+5. Invalidates the user's cached feed (and the cached sections of their
+   User Data; see userprofile.data_sections).
+
+"""
+from collections import defaultdict, namedtuple
+
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+from redis_metrics import metric
+from userprofile import data_sections
+
+from . import progress_queue
+from .models import Action, DailyProgress, SequenceState, UserAction, UserGoal
+from .refresh import refresh_useractions
+
+
+# The result of a call to `enroll_in_goals`: the number of UserGoals and
+# UserActions that were created.
+EnrollResult = namedtuple('EnrollResult', ['goals_created', 'actions_created'])
+
+
+def _primary_goals(goal_ids):
+    """Return a dict mapping the ids of the published Actions in the given
+    Goals to the id of their primary Goal. When an Action is in more than one
+    of the Goals, the last one wins (as it did when Goals were enrolled one
+    at a time)."""
+    order = {goal_id: i for i, goal_id in enumerate(goal_ids)}
+    pairs = Action.goals.through.objects.filter(
+        goal_id__in=goal_ids,
+        action__state='published'
+    ).values_list('action_id', 'goal_id')
+
+    primary_goals = {}
+    for action_id, goal_id in sorted(pairs, key=lambda pair: order[pair[1]]):
+        primary_goals[action_id] = goal_id
+    return primary_goals
+
+
+def _create_usergoals(user, goal_ids, primary_category):
+    existing = set(
+        UserGoal.objects.filter(user=user, goal_id__in=goal_ids)
+        .values_list('goal_id', flat=True)
+    )
+    UserGoal.objects.filter(user=user, goal_id__in=existing).update(
+        primary_category=primary_category
+    )
+    created = [
+        UserGoal(user=user, goal_id=goal_id, primary_category=primary_category)
+        for goal_id in goal_ids if goal_id not in existing
+    ]
+    UserGoal.objects.bulk_create(created)
+    return len(created)
+
+
+def _create_useractions(user, primary_goals, primary_category):
+    existing = dict(
+        UserAction.objects.filter(user=user, action_id__in=primary_goals.keys())
+        .values_list('action_id', 'id')
+    )
+    by_goal = defaultdict(list)
+    for action_id, useraction_id in existing.items():
+        by_goal[primary_goals[action_id]].append(useraction_id)
+    for goal_id, ids in by_goal.items():
+        UserAction.objects.filter(id__in=ids).update(
+            primary_goal_id=goal_id,
+            primary_category=primary_category
+        )
+
+    created = [
+        UserAction(
+            user=user,
+            action_id=action_id,
+            primary_goal_id=goal_id,
+            primary_category=primary_category
+        )
+        for action_id, goal_id in primary_goals.items() if action_id not in existing
+    ]
+    UserAction.objects.bulk_create(created)
+    return len(created)
+
+
+def _update_daily_progress(user):
+    """Do what `create_or_update_daily_progress` does for new UserActions."""
+    if progress_queue.enabled():
+        progress_queue.mark_dirty(user.id)
+    else:
+        dp = DailyProgress.objects.for_today(user)
+        dp.update_stats()
+        dp.save()
+
+
+def enroll_in_goals(user, goals, primary_category=None):
+    """Enroll the user in the given Goals and all of their published Actions,
+    setting `primary_category` (a Category or None) on every UserGoal and
+    UserAction. Returns an EnrollResult.
+
+    """
+    from .user_feed import FEED_DATA_KEY  # Avoid a circular import.
+
+    goal_ids = [goal.id for goal in goals]
+    if not goal_ids:
+        return EnrollResult(0, 0)
+    primary_goals = _primary_goals(goal_ids)
+
+    # If the user is being enrolled concurrently (e.g. by a background job),
+    # a bulk insert may clash with the other's rows; diff again and retry.
+    for attempt in range(2):
+        try:
+            with transaction.atomic():
+                goals_created = _create_usergoals(user, goal_ids, primary_category)
+                actions_created = _create_useractions(
+                    user, primary_goals, primary_category)
+            break
+        except IntegrityError:
+            if attempt:
+                raise
+
+    if goals_created or actions_created:
+        SequenceState.objects.update_for(user)
+    if goals_created:
+        metric('usergoal-created', num=goals_created, category="User Interactions")
+    if actions_created:
+        metric('useraction-created', num=actions_created, category="User Interactions")
+        _update_daily_progress(user)
+
+    # Set trigger dates (this also creates any relative reminders).
+    refresh_useractions(
+        UserAction.objects.filter(user=user, action_id__in=primary_goals.keys())
+    )
+    cache.delete(FEED_DATA_KEY.format(userid=user.id))
+    data_sections.bump(user.id, ['user_goals', 'user_actions'])
+    return EnrollResult(goals_created, actions_created)
@@ -0,0 +1,224 @@
+"""
+Tools for delivering messages to our Facebook Messenger bot.
+
+The messenger bot exposes a single endpoint per user (see FB_MESSENGER_URL),
+and historically we POSTed to it serially with a new connection for every
+message. The `MessengerSender` class in this module instead:
+
+- re-uses keep-alive connections from a pooled `requests.Session`,
+- sends a bounded number of messages concurrently (a thread pool),
+- throttles the overall send rate with a simple `RateLimiter`,
+- records a `Delivery` (status, error, elapsed time) for every recipient.
+
+There's also a `StandInServer`; a tiny, local http server that mimics the
+messenger bot's `/send/<user_id>` endpoint. It's used by the test suite and
+the `benchmark_fb_messenger` management command so we never have to hit the
+real bot to exercise this code.
+
+"""
+import threading
+import time
+
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from socketserver import ThreadingMixIn
+
+import requests
+
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+
+
+if settings.DEBUG:
+    FB_MESSENGER_URL = 'https://brad.ngrok.io/send/{user_id}'
+else:
+    FB_MESSENGER_URL = 'https://compass-fb-messenger.herokuapp.com/send/{user_id}'
+
+# Default number of simultaneous requests & the max number of requests per
+# second that we'll send to the messenger bot.
+DEFAULT_CONCURRENCY = 8
+DEFAULT_RATE = 20
+DEFAULT_TIMEOUT = 10  # seconds
+
+
+# A single message for a single recipient.
+Message = namedtuple('Message', ['user_id', 'text', 'useraction_id'])
+
+# The result of attempting to deliver a Message. `status` is the HTTP status
+# code of the response (or None if the request failed outright).
+Delivery = namedtuple('Delivery', ['message', 'status', 'error', 'elapsed'])
+
+
+def delivered(delivery):
+    """Return True if the given Delivery was accepted by the server."""
+    return delivery.status is not None and 200 <= delivery.status < 300
+
+
+class RateLimiter:
+    """A thread-safe rate limiter. Calling `wait()` blocks until the caller
+    is allowed to proceed, so that no more than `rate` calls go through per
+    second (allowing an initial burst of up to `rate` calls). A rate of None
+    disables limiting.
+
+    Each call reserves the next available time slot while holding the lock,
+    then sleeps (outside of the lock) until that slot arrives.
+
+    """
+    def __init__(self, rate=DEFAULT_RATE, clock=time.monotonic, sleep=time.sleep):
+        self.rate = rate
+        self._clock = clock
+        self._sleep = sleep
+        self._lock = threading.Lock()
+        self._next = None
+
+    def wait(self):
+        if not self.rate:
+            return
+        interval = 1.0 / self.rate
+        with self._lock:
+            now = self._clock()
+            # Unused slots from the past second may still be claimed (a burst)
+            earliest = now - 1.0 + interval
+            slot = earliest if self._next is None else max(self._next, earliest)
+            self._next = slot + interval
+        if slot > now:
+            self._sleep(slot - now)
+
+
+class MessengerSender:
+    """Deliver messages to the messenger bot concurrently.
+
+    Usage:
+
+        sender = MessengerSender(concurrency=8, rate=20)
+        deliveries = sender.send_all([Message(user_id, text, ua_id), ...])
+
+    Every message results in exactly one Delivery, returned in the same order
+    as the given messages; exceptions are captured rather than raised, so one
+    bad recipient never stops the rest of the batch.
+
+    """
+    def __init__(self, url=FB_MESSENGER_URL, concurrency=DEFAULT_CONCURRENCY,
+                 rate=DEFAULT_RATE, timeout=DEFAULT_TIMEOUT, session=None):
+        self.url = url
+        self.concurrency = max(1, concurrency)
+        self.timeout = timeout
+        self.rate_limiter = RateLimiter(rate)
+        self.session = session or self._create_session()
+
+    def _create_session(self):
+        """Create a Session whose connection pool is large enough that each
+        worker thread can keep its own connection alive."""
+        session = requests.Session()
+        adapter = HTTPAdapter(
+            pool_connections=1,
+            pool_maxsize=self.concurrency,
+        )
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+        return session
+
+    def send(self, message):
+        """Send a single message. Returns a Delivery."""
+        self.rate_limiter.wait()
+        payload = {'message': message.text, 'id': message.useraction_id}
+        start = time.time()
+        try:
+            resp = self.session.post(
+                self.url.format(user_id=message.user_id),
+                data=payload,
+                timeout=self.timeout
+            )
+            return Delivery(message, resp.status_code, None, time.time() - start)
+        except requests.RequestException as e:
+            return Delivery(message, None, str(e), time.time() - start)
+
+    def send_all(self, messages):
+        """Send all of the given messages, at most `concurrency` at a time.
+        Returns a list of Delivery objects."""
+        messages = list(messages)
+        if not messages:
+            return []
+        with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+            return list(executor.map(self.send, messages))
+
+    def close(self):
+        self.session.close()
+
+
+# -----------------------------------------------------------------------------
+# A local stand-in for the messenger bot. Used in tests & benchmarks.
+# -----------------------------------------------------------------------------
+class _StandInHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'  # Support keep-alive connections.
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length', 0))
+        body = self.rfile.read(length).decode('utf8')
+        if self.server.latency:
+            time.sleep(self.server.latency)
+
+        user_id = self.path.rstrip('/').split('/')[-1]
+        with self.server.lock:
+            self.server.received.append((user_id, body))
+
+        status = 404 if user_id in self.server.fail_for else 200
+        self.send_response(status)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    def log_message(self, *args, **kwargs):
+        pass  # Keep the test/benchmark output clean.
+
+
+class _ThreadingHTTPServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+class StandInServer:
+    """A local http server that accepts POSTs to `/send/<user_id>`.
+
+    - `latency`: seconds to wait before responding (simulates round-trips)
+    - `fail_for`: a collection of user ids for which we'll respond with a 404
+
+    Usage:
+
+        with StandInServer(latency=0.05) as server:
+            sender = MessengerSender(url=server.url)
+            sender.send_all(messages)
+            server.received  # list of (user_id, request_body) tuples.
+
+    """
+    def __init__(self, latency=0, fail_for=None):
+        self.httpd = _ThreadingHTTPServer(('127.0.0.1', 0), _StandInHandler)
+        self.httpd.latency = latency
+        self.httpd.fail_for = set(fail_for or [])
+        self.httpd.received = []
+        self.httpd.lock = threading.Lock()
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self.httpd.server_address
+        return 'http://{}:{}/send/{{user_id}}'.format(host, port)
+
+    @property
+    def received(self):
+        return self.httpd.received
+
+    def start(self):
+        self._thread = threading.Thread(target=self.httpd.serve_forever)
+        self._thread.daemon = True
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *args):
+        self.stop()
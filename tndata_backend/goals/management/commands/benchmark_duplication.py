@@ -0,0 +1,120 @@
+from datetime import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+
+from goals.duplication import duplicate_category
+from goals.models import Action, Category, Goal, Trigger
+from utils.db import get_max_order
+from utils.decorators import timed
+
+
+class Rollback(Exception):
+    pass
+
+
+def duplicate_each(category, prefix):
+    """Duplicate the content one object at a time (this is roughly how
+    `Category.duplicate_content` used to work)."""
+    new_category = Category.objects.create(
+        order=get_max_order(Category),
+        title="{} {}".format(prefix, category.title)
+    )
+    for goal in category.goals:
+        actions = list(goal.action_set.select_related('default_trigger'))
+        goal.pk = None
+        goal.title = "{} {}".format(prefix, goal.title)
+        goal.state = 'draft'
+        goal.save()
+        goal.categories.add(new_category)
+
+        for action in actions:
+            trigger = action.default_trigger
+            if trigger:
+                trigger.pk = None
+                trigger.name = "{} {}".format(prefix, trigger.name)
+                trigger.save()
+            action.pk = None
+            action.state = 'draft'
+            action.default_trigger = trigger
+            action.save()
+            action.goals.add(goal)
+
+
+class Command(BaseCommand):
+    help = (
+        'Creates a category, then compares the number of queries used to '
+        'duplicate its content one object at a time and with the bulk '
+        'duplication engine. All changes are rolled back.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--goals',
+            action='store',
+            dest='goals',
+            default=50,
+            type=int,
+            help="Number of Goals in the category"
+        )
+        parser.add_argument(
+            '--actions',
+            action='store',
+            dest='actions',
+            default=500,
+            type=int,
+            help="Total number of Actions in the category"
+        )
+
+    def _create_category(self, num_goals, num_actions):
+        category = Category.objects.create(
+            order=get_max_order(Category),
+            title="Duplication Benchmark",
+            state='published'
+        )
+        goals = []
+        for i in range(num_goals):
+            goal = Goal.objects.create(
+                title="Duplication Benchmark Goal {}".format(i),
+                state='published'
+            )
+            goal.categories.add(category)
+            goals.append(goal)
+        for i in range(num_actions):
+            trigger = Trigger.objects.create(
+                name="Duplication Benchmark {}".format(i),
+                time=time(9, 0),
+                recurrences="RRULE:FREQ=DAILY"
+            )
+            action = Action.objects.create(
+                title="Duplication Benchmark Action {}".format(i),
+                state='published',
+                default_trigger=trigger
+            )
+            action.goals.add(goals[i % num_goals])
+        return category
+
+    def _measure(self, func):
+        """Return a tuple of (number of queries, elapsed time)."""
+        with CaptureQueriesContext(connection) as queries:
+            with timed() as t:
+                func()
+        return len(queries), t.elapsed
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                category = self._create_category(options['goals'], options['actions'])
+                before = self._measure(lambda: duplicate_each(category, "Each"))
+                after = self._measure(lambda: duplicate_category(category, "Bulk"))
+                raise Rollback
+        except Rollback:
+            pass
+
+        self.stdout.write(
+            "{} Goals, {} Actions: {} queries ({:.2f}s) -> {} queries ({:.2f}s)".format(
+                options['goals'], options['actions'],
+                before[0], before[1], after[0], after[1]
+            )
+        )
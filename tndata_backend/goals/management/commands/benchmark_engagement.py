@@ -0,0 +1,146 @@
+import random
+
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from goals.models import Action, DailyProgress, UserAction, UserCompletedAction
+from goals.snapshots import snapshot_daily_progress
+from utils.decorators import timed
+from utils.user_utils import local_day_range
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = (
+        'Generates UserCompletedActions for a number of users and days, then '
+        'compares calculating their engagement one user at a time with the '
+        'set-based DailyProgress snapshots (see goals.snapshots). All changes '
+        'are rolled back.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--users',
+            action='store',
+            dest='users',
+            default=100000,
+            type=int,
+            help="Number of users to generate"
+        )
+        parser.add_argument(
+            '--days',
+            action='store',
+            dest='days',
+            default=60,
+            type=int,
+            help="Number of days of completions (one per user per day)"
+        )
+        parser.add_argument(
+            '--sample',
+            action='store',
+            dest='sample',
+            default=1000,
+            type=int,
+            help=("Number of users for which engagement is calculated one at "
+                  "a time (the time for all users is extrapolated)")
+        )
+
+    def _generate(self, num_users, num_days):
+        User = get_user_model()
+        prefix = 'engagement-benchmark-'
+        User.objects.bulk_create([
+            User(username='{}{}'.format(prefix, i), email='{}{}@example.com'.format(prefix, i))
+            for i in range(num_users)
+        ], batch_size=5000)
+        users = User.objects.filter(username__startswith=prefix)
+
+        action = Action.objects.create(title=prefix, state='published')
+        UserAction.objects.bulk_create([
+            UserAction(user_id=uid, action=action)
+            for uid in users.values_list('id', flat=True)
+        ], batch_size=5000)
+        useractions = list(
+            UserAction.objects.filter(action=action).values_list('id', 'user_id')
+        )
+
+        now = timezone.now()
+        states = [
+            UserCompletedAction.COMPLETED,
+            UserCompletedAction.SNOOZED,
+            UserCompletedAction.DISMISSED,
+        ]
+        for day in range(num_days):
+            ucas = UserCompletedAction.objects.filter(action=action)
+            last_id = ucas.order_by('-id').values_list('id', flat=True).first() or 0
+            ucas.bulk_create([
+                UserCompletedAction(
+                    user_id=user_id,
+                    useraction_id=ua_id,
+                    action=action,
+                    state=random.choice(states)
+                )
+                for ua_id, user_id in useractions
+            ], batch_size=5000)
+            # created_on is an auto_now_add field, so set it afterwards.
+            ucas.filter(id__gt=last_id).update(
+                created_on=now - timedelta(days=day, hours=1)
+            )
+        return users
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                self.stdout.write("Generating data...")
+                users = self._generate(options['users'], options['days'])
+                count = users.count()
+                sample = list(users[:options['sample']])
+                fields = ['engagement_15_days', 'engagement_30_days', 'engagement_60_days']
+
+                with timed() as before:
+                    expected = {}
+                    for user in sample:
+                        progress = DailyProgress.objects.for_today(user)
+                        progress.calculate_engagement(days=15)
+                        progress.calculate_engagement(days=30)
+                        progress.calculate_engagement(days=60)
+                        expected[user.id] = [getattr(progress, f) for f in fields]
+                with timed() as after:
+                    snapshot_daily_progress(users)
+
+                results = {}
+                for user in sample:
+                    progress = DailyProgress.objects.get(
+                        user=user,
+                        created_on__range=local_day_range(user)
+                    )
+                    results[user.id] = [getattr(progress, f) for f in fields]
+
+                mismatched = [
+                    uid for uid, values in expected.items()
+                    if results[uid] != values
+                ]
+                raise Rollback
+        except Rollback:
+            pass
+
+        per_user = before.elapsed / len(sample) if sample else 0
+        self.stdout.write(
+            "{} users x {} days: {:.2f}s (estimated, one at a time) -> "
+            "{:.2f}s (all at once)".format(
+                count, options['days'], per_user * count, after.elapsed
+            )
+        )
+        if mismatched:
+            self.stdout.write(
+                "Results differ for {} of {} sampled users".format(
+                    len(mismatched), len(sample))
+            )
+        else:
+            self.stdout.write("Results match for all sampled users.")
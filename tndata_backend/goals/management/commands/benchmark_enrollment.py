@@ -0,0 +1,120 @@
+from datetime import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+
+from goals.enrollment import enroll_in_goals
+from goals.models import Action, Category, Goal, Trigger
+from utils.db import get_max_order
+from utils.decorators import timed
+
+
+class Rollback(Exception):
+    pass
+
+
+def enroll_each(user, category):
+    """Enroll the user one object at a time (this is how `Category.enroll`
+    used to work)."""
+    user.usercategory_set.get_or_create(category=category)
+    for goal in category.goal_set.filter(state='published'):
+        ug, _ = user.usergoal_set.get_or_create(user=user, goal=goal)
+        ug.primary_category = category
+        ug.save()
+        for action in goal.action_set.published():
+            ua, _ = user.useraction_set.get_or_create(action=action)
+            ua.primary_category = category
+            ua.primary_goal = goal
+            ua.save()
+
+
+class Command(BaseCommand):
+    help = (
+        'Creates a package, then compares the number of queries used to '
+        'enroll a user in it one object at a time and with the bulk '
+        'enrollment engine. All changes are rolled back.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--goals',
+            action='store',
+            dest='goals',
+            default=10,
+            type=int,
+            help="Number of Goals in the package"
+        )
+        parser.add_argument(
+            '--actions',
+            action='store',
+            dest='actions',
+            default=200,
+            type=int,
+            help="Total number of Actions in the package"
+        )
+
+    def _create_package(self, num_goals, num_actions):
+        category = Category.objects.create(
+            order=get_max_order(Category),
+            title="Enrollment Benchmark",
+            state='published',
+            packaged_content=True
+        )
+        trigger = Trigger.objects.create(
+            name="Enrollment Benchmark",
+            time=time(9, 0),
+            recurrences="RRULE:FREQ=DAILY"
+        )
+        goals = []
+        for i in range(num_goals):
+            goal = Goal.objects.create(
+                title="Enrollment Benchmark Goal {}".format(i),
+                state='published'
+            )
+            goal.categories.add(category)
+            goals.append(goal)
+        for i in range(num_actions):
+            action = Action.objects.create(
+                title="Enrollment Benchmark Action {}".format(i),
+                state='published',
+                default_trigger=trigger
+            )
+            action.goals.add(goals[i % num_goals])
+        return category
+
+    def _measure(self, func):
+        """Return a tuple of (number of queries, elapsed time)."""
+        with CaptureQueriesContext(connection) as queries:
+            with timed() as t:
+                func()
+        return len(queries), t.elapsed
+
+    def handle(self, *args, **options):
+        User = get_user_model()
+        try:
+            with transaction.atomic():
+                category = self._create_package(options['goals'], options['actions'])
+                before_user = User.objects.create_user(
+                    'enrollment-benchmark-1', 'enrollment-benchmark-1@example.com')
+                after_user = User.objects.create_user(
+                    'enrollment-benchmark-2', 'enrollment-benchmark-2@example.com')
+
+                before = self._measure(lambda: enroll_each(before_user, category))
+
+                def bulk():
+                    after_user.usercategory_set.get_or_create(category=category)
+                    goals = category.goal_set.filter(state='published')
+                    enroll_in_goals(after_user, goals, primary_category=category)
+                after = self._measure(bulk)
+                raise Rollback
+        except Rollback:
+            pass
+
+        self.stdout.write(
+            "{} Goals, {} Actions: {} queries ({:.2f}s) -> {} queries ({:.2f}s)".format(
+                options['goals'], options['actions'],
+                before[0], before[1], after[0], after[1]
+            )
+        )
@@ -0,0 +1,75 @@
+import requests
+
+from django.core.management.base import BaseCommand
+
+from goals.fb_messenger import (
+    DEFAULT_CONCURRENCY,
+    Message,
+    MessengerSender,
+    StandInServer,
+)
+from utils.decorators import timed
+
+
+class Command(BaseCommand):
+    help = (
+        'Compare the throughput of serial, one-connection-per-message '
+        'delivery with the pooled MessengerSender (against a local stand-in '
+        'for the FB messenger bot).'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--messages',
+            action='store',
+            dest='messages',
+            default=200,
+            type=int,
+            help="Number of messages to send"
+        )
+        parser.add_argument(
+            '--latency',
+            action='store',
+            dest='latency',
+            default=0.05,
+            type=float,
+            help="Simulated server latency (in seconds) per request"
+        )
+        parser.add_argument(
+            '--concurrency',
+            action='store',
+            dest='concurrency',
+            default=DEFAULT_CONCURRENCY,
+            type=int,
+            help="Concurrency used by the MessengerSender"
+        )
+
+    def _report(self, label, count, elapsed):
+        self.stdout.write("{}: {} messages in {:.2f}s ({:.1f} msg/s)".format(
+            label, count, elapsed, count / elapsed if elapsed else 0))
+
+    def handle(self, *args, **options):
+        count = options['messages']
+        messages = [
+            Message(str(i).zfill(16), "Benchmark message", i)
+            for i in range(count)
+        ]
+
+        with StandInServer(latency=options['latency']) as server:
+            # Before: a new connection for every message, one at a time.
+            with timed() as t:
+                for m in messages:
+                    payload = {'message': m.text, 'id': m.useraction_id}
+                    requests.post(server.url.format(user_id=m.user_id), payload)
+            self._report("Serial", count, t.elapsed)
+
+            # After: pooled, concurrent delivery (without rate limiting).
+            sender = MessengerSender(
+                url=server.url,
+                concurrency=options['concurrency'],
+                rate=None
+            )
+            with timed() as t:
+                sender.send_all(messages)
+            sender.close()
+            self._report("MessengerSender", count, t.elapsed)
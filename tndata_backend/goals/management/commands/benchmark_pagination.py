@@ -0,0 +1,111 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from django.utils.text import slugify
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from goals.api import UserActionPagination, UserActionViewSet
+from goals.models import Action, Category, Goal, UserAction
+from utils.db import get_max_order
+from utils.decorators import timed
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = (
+        'Creates a user with many UserActions, then compares fetching the '
+        'first and a deep page of /api/users/actions/ with page numbers and '
+        'with cursors (keyset pagination). All changes are rolled back.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--page',
+            action='store',
+            dest='page',
+            default=200,
+            type=int,
+            help="The deep page to fetch"
+        )
+        parser.add_argument(
+            '--page-size',
+            action='store',
+            dest='page_size',
+            default=25,
+            type=int,
+            help="Number of UserActions per page"
+        )
+
+    def _create_user(self, num_actions):
+        user = get_user_model().objects.create_user(
+            'pagination-benchmark', 'pagination-benchmark@example.com', 'pass')
+        category = Category.objects.create(
+            order=get_max_order(Category),
+            title="Pagination Benchmark",
+            state='published'
+        )
+        goal = Goal.objects.create(title="Pagination Benchmark", state='published')
+        goal.categories.add(category)
+
+        titles = ["Pagination Benchmark {}".format(i) for i in range(num_actions)]
+        Action.objects.bulk_create([
+            Action(title=title, title_slug=slugify(title), state='published')
+            for title in titles
+        ])
+        actions = list(Action.objects.filter(title__in=titles))
+        Action.goals.through.objects.bulk_create([
+            Action.goals.through(action_id=action.id, goal_id=goal.id)
+            for action in actions
+        ])
+        UserAction.objects.bulk_create([
+            UserAction(user=user, action=action, primary_goal=goal,
+                       primary_category=category)
+            for action in actions
+        ])
+        return user
+
+    def _fetch(self, user, params):
+        """Fetch a page of the user's actions; returns a tuple of (number of
+        queries, elapsed time)."""
+        view = UserActionViewSet.as_view({'get': 'list'})
+        request = APIRequestFactory().get('/api/users/actions/', params)
+        force_authenticate(request, user=user)
+        with CaptureQueriesContext(connection) as queries:
+            with timed() as t:
+                response = view(request)
+                response.render()
+        assert response.status_code == 200, response.status_code
+        return len(queries), t.elapsed
+
+    def handle(self, *args, **options):
+        page, page_size = options['page'], options['page_size']
+        results = []
+        try:
+            with transaction.atomic():
+                user = self._create_user(page * page_size)
+
+                # The key of the last item before the deep page.
+                offset = (page - 1) * page_size - 1
+                ids = UserAction.objects.filter(user=user).order_by('id')
+                cursor = UserActionPagination().encode_cursor([ids[offset].id])
+
+                params = {'version': '2', 'page_size': page_size}
+                for label, extra in [
+                    ("page=1", {'page': 1}),
+                    ("page={}".format(page), {'page': page}),
+                    ("cursor (page 1)", {'cursor': ''}),
+                    ("cursor (page {})".format(page), {'cursor': cursor}),
+                ]:
+                    results.append((label, self._fetch(user, dict(params, **extra))))
+                raise Rollback
+        except Rollback:
+            pass
+
+        self.stdout.write("{} UserActions:".format(page * page_size))
+        for label, (num_queries, elapsed) in results:
+            self.stdout.write("  {}: {} queries, {:.3f}s".format(
+                label, num_queries, elapsed))
@@ -0,0 +1,80 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from goals.models import UserAction
+from goals.refresh import DEFAULT_BATCH_SIZE, refresh_useractions
+from utils.decorators import timed
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = (
+        'Compares refreshing UserAction trigger dates with save() and with '
+        'the bulk refresh. All changes are rolled back.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--count',
+            action='store',
+            dest='count',
+            default=10000,
+            type=int,
+            help="Number of (existing) UserActions to refresh"
+        )
+        parser.add_argument(
+            '--batch-size',
+            action='store',
+            dest='batch_size',
+            default=DEFAULT_BATCH_SIZE,
+            type=int,
+            help="Batch size for the bulk refresh"
+        )
+
+    def _rolled_back(self, func):
+        """Run the given function in a transaction that's rolled back. Returns
+        the elapsed time."""
+        try:
+            with transaction.atomic():
+                with timed() as t:
+                    func()
+                raise Rollback
+        except Rollback:
+            pass
+        return t.elapsed
+
+    def handle(self, *args, **options):
+        count = options['count']
+        ids = list(
+            UserAction.objects.order_by('id').values_list('id', flat=True)[:count]
+        )
+        count = len(ids)
+        if not count:
+            self.stdout.write("No UserActions to refresh.")
+            return
+
+        def save_each():
+            for ua in UserAction.objects.filter(id__in=ids):
+                ua.save(update_triggers=True)
+
+        def bulk():
+            refresh_useractions(
+                UserAction.objects.filter(id__in=ids),
+                batch_size=options['batch_size']
+            )
+
+        before = self._rolled_back(save_each)
+        after = self._rolled_back(bulk)
+        self.stdout.write(
+            "{} UserActions: {:.2f}s -> {:.2f}s ({:.1f}x)".format(
+                count, before, after, before / after if after else 0
+            )
+        )
+        self.stdout.write(
+            "Estimated for 1M UserActions: {:.0f}s -> {:.0f}s".format(
+                before / count * 1e6, after / count * 1e6
+            )
+        )
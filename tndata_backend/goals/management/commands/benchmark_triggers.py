@@ -0,0 +1,63 @@
+from datetime import time
+
+from django.core.management.base import BaseCommand
+
+from goals.models import Trigger
+from goals.recurrences import recurrence_cache
+from utils.decorators import timed
+
+
+# The recurrences we benchmark. None of these are saved to the database.
+RRULES = [
+    ('daily', 'RRULE:FREQ=DAILY'),
+    ('weekly', 'RRULE:FREQ=WEEKLY;BYDAY=MO,WE,FR'),
+    ('custom', 'RRULE:FREQ=MONTHLY;BYDAY=+1TU,-1TH;UNTIL=20300101T000000Z'),
+]
+
+
+class Command(BaseCommand):
+    help = 'Micro-benchmarks of Trigger.next() with and without the recurrence cache.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--iterations',
+            action='store',
+            dest='iterations',
+            default=1000,
+            type=int,
+            help="Number of times to call Trigger.next() for each rule"
+        )
+
+    def _run(self, trigger, iterations):
+        with timed() as t:
+            for i in range(iterations):
+                trigger.next()
+        return t.elapsed
+
+    def handle(self, *args, **options):
+        iterations = options['iterations']
+        maxsize = recurrence_cache.maxsize
+
+        for name, rrule in RRULES:
+            trigger = Trigger(name=name, time=time(9, 30), recurrences=rrule)
+            trigger._localize_time()
+
+            # Before: compile & expand the rules on every call.
+            recurrence_cache.maxsize = 0
+            before = self._run(trigger, iterations)
+
+            # After: compiled once, then a bisect on the cached occurrences
+            recurrence_cache.maxsize = maxsize or 2048
+            recurrence_cache.clear()
+            after = self._run(trigger, iterations)
+
+            self.stdout.write(
+                "{:>7}: {:.1f}us -> {:.1f}us per call ({:.1f}x)".format(
+                    name,
+                    before / iterations * 1e6,
+                    after / iterations * 1e6,
+                    before / after if after else 0,
+                )
+            )
+
+        recurrence_cache.maxsize = maxsize
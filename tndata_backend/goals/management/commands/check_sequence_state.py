@@ -0,0 +1,39 @@
+import logging
+
+from django.core.management.base import BaseCommand
+
+from goals.models import SequenceState
+
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = 'Looks for SequenceStates that are out of date (and optionally fixes them).'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--fix',
+            action='store_true',
+            dest='fix',
+            default=False,
+            help="Update any inconsistent SequenceStates"
+        )
+
+    def handle(self, *args, **options):
+        fields = ['goal_order', 'action_order', 'sequence_order']
+        count = 0
+        for state, expected in SequenceState.objects.inconsistencies():
+            count += 1
+            stored = [getattr(state, f) for f in fields]
+            expected_values = [expected[f] for f in fields]
+            self.stdout.write("{} (id={}): {} != {}".format(
+                state.user, state.user_id, stored, expected_values
+            ))
+            if options['fix']:
+                SequenceState.objects.filter(pk=state.pk).update(**expected)
+
+        msg = "Found {} inconsistent SequenceStates".format(count)
+        if count:
+            logger.warning(msg)
+        self.stdout.write(msg)
@@ -12,6 +12,8 @@ import waffle
 
 from goals.models import CustomAction
 from goals.sequence import get_next_useractions_in_sequence
+from goals.shared_triggers import SWITCH as SHARED_TRIGGERS_SWITCH
+from goals.shared_triggers import precompute, shared_next
 from notifications.models import GCMDevice, GCMMessage
 from utils.slack import post_private_message
 from utils.user_utils import to_utc
@@ -186,7 +188,7 @@ class Command(BaseCommand):
             for ua in user.useraction_set.published().distinct():
                 if ua.trigger and not ua.trigger.is_dynamic:
                     # Will be in the user's timezone
-                    deliver_on = to_utc(ua.trigger.next(user=user))
+                    deliver_on = to_utc(shared_next(ua.trigger, user))
                     if deliver_on and deliver_on < self.threshold:
                         self.create_message(
                             user,
@@ -215,6 +217,10 @@ class Command(BaseCommand):
         # Make sure everything is ok before we run this.
         self.check()
 
+        # Warm the cache of shared, per-timezone default trigger dates.
+        if waffle.switch_is_active(SHARED_TRIGGERS_SWITCH):
+            precompute()
+
         # Get the group of users for whom we're creating notifications
         users = self._get_users(options)
 
@@ -7,13 +7,14 @@ from django.core.management.base import BaseCommand, CommandError
 from django.db.models import Q
 from django.utils import timezone
 
-from goals.models import DailyProgress
+from goals.snapshots import snapshot_daily_progress
+from utils.decorators import timed
 
 import logging
 logger = logging.getLogger(__name__)
 
 
-# NOTE: This is a computationall intensive command. So we limit to users
+# NOTE: This is a computationally intensive command. So we limit to users
 # whose info hasn't been updated in a while (so we don't re-calculate too quickly)
 UPDATE_HOURS = 6
 
@@ -71,20 +72,12 @@ class Command(BaseCommand):
         dt = timezone.now() - timedelta(hours=UPDATE_HOURS)
         users = users.exclude(dailyprogress__updated_on__gte=dt).distinct()
 
-        # Create snapshots for those users in the given date range.
+        # Create snapshots for those users (see goals.snapshots)
         count = 0
         try:
-            for user in users:
-                progress = DailyProgress.objects.for_today(user)
-                progress.update_stats()
-
-                # Add methods to calculate engagement
-                progress.calculate_engagement(days=15)
-                progress.calculate_engagement(days=30)
-                progress.calculate_engagement(days=60)
-
-                progress.save()
-                count += 1
+            with timed() as t:
+                count = snapshot_daily_progress(users)
+            logger.info("Snapshots took {:.2f}s".format(t.elapsed))
         except Exception as e:
             logger.exception("Failure in daily_progress_snapshot")
 
@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+
+from goals.shared_triggers import default_triggers, precompute, timezones_in_use
+from utils.decorators import timed
+
+
+class Command(BaseCommand):
+    help = 'Warms the cache of shared, per-timezone dates for default Triggers.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--timezone',
+            action='append',
+            dest='timezones',
+            default=None,
+            help="Only compute dates for the given timezone (may be repeated)"
+        )
+
+    def handle(self, *args, **options):
+        triggers = default_triggers()
+        timezones = options['timezones'] or timezones_in_use()
+        with timed() as t:
+            count = precompute(triggers, timezones)
+        self.stdout.write(
+            "Cached {} dates for {} triggers in {} timezones ({:.2f}s)".format(
+                count, triggers.count(), len(timezones), t.elapsed
+            )
+        )
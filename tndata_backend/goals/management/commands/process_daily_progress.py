@@ -0,0 +1,58 @@
+import logging
+import time
+
+from django.core.management.base import BaseCommand
+
+from goals import progress_queue
+
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = (
+        'Recomputes DailyProgress for users whose progress was marked dirty '
+        '(see goals.progress_queue). Runs until stopped, unless --once is given.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--interval',
+            action='store',
+            dest='interval',
+            default=5,
+            type=float,
+            help="Number of seconds to wait between runs"
+        )
+        parser.add_argument(
+            '--batch-size',
+            action='store',
+            dest='batch_size',
+            default=progress_queue.DEFAULT_BATCH_SIZE,
+            type=int,
+            help="Number of users recomputed at a time"
+        )
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            dest='once',
+            default=False,
+            help="Process the dirty users once, then exit"
+        )
+
+    def process(self, batch_size):
+        try:
+            count = progress_queue.recompute_dirty(batch_size=batch_size)
+        except Exception:
+            logger.exception("Failure in process_daily_progress")
+            return
+        if count:
+            logger.info("Recomputed DailyProgress for {} users".format(count))
+
+    def handle(self, *args, **options):
+        while True:
+            # NOTE: we keep draining the set even if the switch is turned off.
+            self.process(options['batch_size'])
+            if options['once']:
+                break
+            time.sleep(options['interval'])
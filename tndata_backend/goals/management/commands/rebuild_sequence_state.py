@@ -0,0 +1,35 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+
+from goals.models import SequenceState
+from utils.decorators import timed
+
+
+class Command(BaseCommand):
+    help = 'Creates or re-calculates the SequenceState for users.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--user',
+            action='store',
+            dest='user',
+            default=None,
+            help=("Restrict this command to the given User. "
+                  "Accepts a username, email, or id")
+        )
+
+    def handle(self, *args, **options):
+        User = get_user_model()
+        users = User.objects.filter(is_active=True)
+        user = options['user']
+        if user and user.isnumeric():
+            users = users.filter(id=user)
+        elif user:
+            users = users.filter(Q(username=user) | Q(email=user))
+
+        with timed() as t:
+            count = SequenceState.objects.rebuild(users.iterator())
+        self.stdout.write(
+            "Rebuilt {} SequenceStates ({:.2f}s)".format(count, t.elapsed)
+        )
@@ -2,11 +2,14 @@ import logging
 
 from django.conf import settings
 from django.contrib.auth import get_user_model
+from django.core.cache import cache
 from django.core.management.base import BaseCommand, CommandError
 from django.db.models import Q
 
-from goals.sequence import get_next_useractions_in_sequence
 from goals.models import CustomAction, UserAction
+from goals.refresh import DEFAULT_BATCH_SIZE, refresh_useractions
+from goals.sequence import get_next_useractions_in_sequence
+from utils.decorators import timed
 
 logger = logging.getLogger(__name__)
 
@@ -39,6 +42,21 @@ class Command(BaseCommand):
             type=int,
             help="Limit the number of objects that are modified"
         )
+        parser.add_argument(
+            '--batch-size',
+            action='store',
+            dest='batch_size',
+            default=DEFAULT_BATCH_SIZE,
+            type=int,
+            help="Number of UserActions to load & update at a time"
+        )
+        parser.add_argument(
+            '--resume',
+            action='store_true',
+            dest='resume',
+            default=False,
+            help="Resume from the last UserAction id processed by a previous run"
+        )
 
     def _users(self, user):
         """Pull the `user` option and return a QuerySet of active Users."""
@@ -79,6 +97,19 @@ class Command(BaseCommand):
 
         return kwargs
 
+    def _sequenced_ids(self, user):
+        """The set of the user's UserAction ids that are up next in their
+        sequence of Goals & Actions."""
+        useractions = get_next_useractions_in_sequence(user)
+        return set(useractions.values_list('id', flat=True))
+
+    def _refresh(self, useractions, **kwargs):
+        """Refresh the given UserActions, in bulk. Returns a RefreshResult."""
+        last_id = kwargs.get('checkpoint_key') and cache.get(kwargs['checkpoint_key'])
+        if last_id:
+            self.stdout.write("Resuming after UserAction id={}".format(last_id))
+        return refresh_useractions(useractions, **kwargs)
+
     def handle(self, *args, **options):
         # Limit the refreshed objects to those that are at least 2 hours old.
         # (or to an age based on limit option)
@@ -89,32 +120,44 @@ class Command(BaseCommand):
         if options['user'] is not None:
             limit = None
 
-        # 1. Fetch the set of SEQUENCED UserActions to refresh.
-        count = 0
-        for user in self._users(options['user']):
-            useractions = get_next_useractions_in_sequence(user)
-            useractions = useractions.stale(hours=hours).published()
-            for ua in useractions:
-                count += 1
-                ua.save(update_triggers=True)  # fields get refreshed on save.
-
-        msg = "Refreshed Trigger Date for {0} UserActions".format(count)
+        batch_size = options['batch_size']
+        resume = options['resume']
+
+        # 1. Refresh the set of SEQUENCED UserActions.
+        useractions = UserAction.objects.filter(
+            user__in=self._users(options['user'])
+        )
+        useractions = useractions.stale(hours=hours).published()
+        with timed() as t:
+            result = self._refresh(
+                useractions,
+                batch_size=batch_size,
+                include=self._sequenced_ids,
+                checkpoint_key="refresh-useractions-sequenced" if resume else None
+            )
+        msg = "Refreshed Trigger Date for {0} UserActions ({1:.2f}s)".format(
+            result.updated + result.saved, t.elapsed
+        )
         logger.info(msg)
         self.stdout.write(msg)
 
         # 2. Refresh stale UserActions that have a custom trigger
-        count = 0
         kwargs = self._useraction_kwargs(options['user'])
         kwargs['hours'] = hours
         useractions = UserAction.objects.stale(
             hours=hours,
             custom_trigger__isnull=False
         )
-        for ua in useractions.published()[:limit]:
-            count += 1
-            ua.save(update_triggers=True)
-
-        msg = "Refreshed Custom Triggers for {0} UserActions".format(count)
+        with timed() as t:
+            result = self._refresh(
+                useractions.published(),
+                batch_size=batch_size,
+                limit=limit,
+                checkpoint_key="refresh-useractions-custom" if resume else None
+            )
+        msg = "Refreshed Custom Triggers for {0} UserActions ({1:.2f}s)".format(
+            result.updated + result.saved, t.elapsed
+        )
         logger.info(msg)
         self.stdout.write(msg)
 
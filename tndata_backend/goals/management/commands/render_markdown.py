@@ -0,0 +1,49 @@
+from django.core.management.base import BaseCommand
+
+from goals import rendering, response_cache
+from goals.models import Action, Category, Goal
+
+
+class Command(BaseCommand):
+    help = (
+        'Re-renders the stored HTML for the markdown fields of Categories, '
+        'Goals, and Actions whose renders are stale (see goals.rendering).'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--all',
+            action='store_true',
+            dest='all',
+            default=False,
+            help="Re-render every object, not just the stale ones"
+        )
+        parser.add_argument(
+            '--check',
+            action='store_true',
+            dest='check',
+            default=False,
+            help="Only report the number of stale objects"
+        )
+
+    def handle(self, *args, **options):
+        updated = 0
+        for model in [Category, Goal, Action]:
+            fields = rendering.MARKDOWN_FIELDS[model.__name__]
+            objects = model.objects.only('markdown_hash', *fields).iterator()
+            stale = [
+                obj for obj in objects
+                if options['all'] or rendering.is_stale(obj, fields)
+            ]
+            if not options['check']:
+                for obj in stale:
+                    update_fields = rendering.render(obj, fields)
+                    model.objects.filter(pk=obj.pk).update(
+                        **{name: getattr(obj, name) for name in update_fields}
+                    )
+                updated += len(stale)
+            verb = "stale" if options['check'] else "re-rendered"
+            self.stdout.write("{}: {} {}".format(model.__name__, len(stale), verb))
+
+        if updated:
+            response_cache.bump_content_version()
@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+
+from goals import program_enrollment
+
+
+class Command(BaseCommand):
+    help = (
+        'Re-queues the failed (or stalled) chunks of program enrollments (see '
+        'goals.program_enrollment). Chunks that already completed are not redone.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch',
+            action='store',
+            dest='batch',
+            default=None,
+            help="Only retry chunks from this batch"
+        )
+
+    def handle(self, *args, **options):
+        count = program_enrollment.retry_failed(batch=options['batch'])
+        self.stdout.write("Queued {} chunks".format(count))
@@ -1,26 +1,26 @@
 import logging
-import requests
 import waffle
 
-from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.core.management.base import BaseCommand, CommandError
 from django.db.models import Q
 from django.utils import timezone
 
+from goals.fb_messenger import (
+    DEFAULT_CONCURRENCY,
+    DEFAULT_RATE,
+    Message,
+    MessengerSender,
+    delivered,
+)
 from goals.sequence import get_next_useractions_in_sequence
+from redis_metrics import metric
 from utils.user_utils import to_utc
 
 
 logger = logging.getLogger(__name__)
 
 
-if settings.DEBUG:
-    FB_MESSENGER_URL = 'https://brad.ngrok.io/send/{user_id}'
-else:
-    FB_MESSENGER_URL = 'https://compass-fb-messenger.herokuapp.com/send/{user_id}'
-
-
 # -----------------------------------------------------------------------------
 #
 # NOTICE:
@@ -42,6 +42,22 @@ class Command(BaseCommand):
             help=("Restrict this command to the given User. "
                   "Accepts a username, email, or id")
         )
+        parser.add_argument(
+            '--concurrency',
+            action='store',
+            dest='concurrency',
+            default=DEFAULT_CONCURRENCY,
+            type=int,
+            help="Maximum number of messages that are sent at the same time"
+        )
+        parser.add_argument(
+            '--rate',
+            action='store',
+            dest='rate',
+            default=DEFAULT_RATE,
+            type=int,
+            help="Maximum number of messages sent per second"
+        )
 
     def _get_users(self, options):
         User = get_user_model()
@@ -68,26 +84,9 @@ class Command(BaseCommand):
             gcmdevice__isnull=True
         ).distinct()
 
-    def send(self, user_id, message, useraction_id):
-        payload = {'message': message, 'id': useraction_id}
-        requests.post(FB_MESSENGER_URL.format(user_id=user_id), payload)
-        self.stdout.write("Sent to {}: {}".format(user_id, message))
-
-    def handle(self, *args, **options):
-        # This switch allows us to completely disable creation of notifications
-        if not waffle.switch_is_active('goals-fb-messenger'):
-            return None
-
-        now = timezone.now()
-
-        # XXX: Assume we're all in central time, don't send at night.
-        if now.hour < 12 or now.hour > 23:
-            self.stderr.write("not running during evening/early morning")
-            return None
-
-        users = self._get_users(options)
-        self.stdout.write("Found {} users".format(len(users)))
-
+    def _get_messages(self, users, now):
+        """Build the list of Messages to send; at most one per user."""
+        messages = []
         for user in users:
             # Only support Sequenced Goals, Actions
             for ua in get_next_useractions_in_sequence(user):
@@ -103,5 +102,62 @@ class Command(BaseCommand):
                         ua.get_notification_text(),
                         ua.action.description
                     )
-                    self.send(user.username, text, ua.id)
+                    messages.append(Message(user.username, text, ua.id))
                     break  # only send 1 message.
+        return messages
+
+    def report(self, deliveries):
+        """Write out the status of every delivery and record some metrics.
+        Returns a (sent, failed) tuple."""
+        sent = 0
+        for delivery in deliveries:
+            message = delivery.message
+            if delivered(delivery):
+                sent += 1
+                self.stdout.write("Sent to {}: {}".format(
+                    message.user_id, message.text))
+            else:
+                err = "Failed to send to {} (status: {}) {}".format(
+                    message.user_id,
+                    delivery.status,
+                    delivery.error or ''
+                )
+                logger.warning(err)
+                self.stderr.write(err)
+
+        failed = len(deliveries) - sent
+        if sent:
+            metric('fb-messenger-sent', num=sent, category="FB Messenger")
+        if failed:
+            metric('fb-messenger-failed', num=failed, category="FB Messenger")
+        return sent, failed
+
+    def handle(self, *args, **options):
+        # This switch allows us to completely disable creation of notifications
+        if not waffle.switch_is_active('goals-fb-messenger'):
+            return None
+
+        now = timezone.now()
+
+        # XXX: Assume we're all in central time, don't send at night.
+        if now.hour < 12 or now.hour > 23:
+            self.stderr.write("not running during evening/early morning")
+            return None
+
+        users = self._get_users(options)
+        self.stdout.write("Found {} users".format(len(users)))
+
+        messages = self._get_messages(users, now)
+        sender = MessengerSender(
+            concurrency=options['concurrency'],
+            rate=options['rate']
+        )
+        try:
+            deliveries = sender.send_all(messages)
+        finally:
+            sender.close()
+
+        sent, failed = self.report(deliveries)
+        msg = "Sent {} messages, {} failed".format(sent, failed)
+        logger.info(msg)
+        self.stdout.write(msg)
@@ -18,32 +18,16 @@ class Command(BaseCommand):
                   "Accepts ONLY a user ID")
         )
 
-    def _get_usergoals(self, options):
-        if options.get('user'):
-            return UserGoal.objects.latest_items(user=options['user'])
-        else:
-            return UserGoal.objects.latest_items()
-
     def handle(self, *args, **options):
         # Check to see if we've disabled this, prior to expiring anything.
         if not waffle.switch_is_active('goals-daily-progress-snapshot'):
             return None
 
+        # Engagement & rank are calculated for all UserGoals at once; see
+        # UserGoalManager.update_engagement
+        count = 0
         try:
-            # WANT: the latest set of userGoal objects per user.
-            count = 0
-            for ug in self._get_usergoals(options):
-                # Update the rank...
-                rank = UserGoal.objects.engagement_rank(ug.user, ug.goal)
-                ug.engagement_rank = rank
-
-                # And the engagement fields
-                ug.calculate_engagement(days=15)
-                ug.calculate_engagement(days=30)
-                ug.calculate_engagement(days=60)
-
-                ug.save()
-                count += 1
+            count = UserGoal.objects.update_engagement(user=options.get('user'))
         except Exception:
             logger.exception("Failure in update_usergoal_engagement")
 
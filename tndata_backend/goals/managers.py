@@ -1,9 +1,10 @@
+from collections import defaultdict
 from datetime import datetime, timedelta
+from decimal import Decimal, ROUND_HALF_UP
 
 import logging
-from django.contrib.auth import get_user_model
-from django.db import models
-from django.db.models import Min, Q
+from django.db import connection, models
+from django.db.models import F, Min, Q
 from django.template.defaultfilters import slugify
 from django.utils import timezone
 
@@ -16,6 +17,7 @@ from .settings import (
     DEFAULT_EVENING_GOAL_TRIGGER_RRULE,
 )
 
+from userprofile import data_sections
 from utils import dateutils, user_utils
 
 
@@ -45,8 +47,51 @@ class CustomActionManager(models.Manager):
         return qs
 
 
+# Counts for DailyProgress.update_stats. The totals include all of a user's
+# (custom) actions created up to the end of the day, while the states are
+# counted for completions created during the day. Parameters are:
+# [user_id, end] * 2 then [start, end, user_id] * 2
+DAILY_PROGRESS_STATS_SQL = """
+SELECT
+    (SELECT COUNT(*) FROM goals_useraction
+     WHERE user_id = %s AND created_on <= %s) AS actions_total,
+    ucas.completed AS actions_completed,
+    ucas.snoozed AS actions_snoozed,
+    ucas.dismissed AS actions_dismissed,
+    (SELECT COUNT(*) FROM goals_customaction
+     WHERE user_id = %s AND created_on <= %s) AS customactions_total,
+    uccas.completed AS customactions_completed,
+    uccas.snoozed AS customactions_snoozed,
+    uccas.dismissed AS customactions_dismissed
+FROM
+    (SELECT
+        COUNT(CASE WHEN state = 'completed' THEN 1 END) AS completed,
+        COUNT(CASE WHEN state = 'snoozed' THEN 1 END) AS snoozed,
+        COUNT(CASE WHEN state = 'dismissed' THEN 1 END) AS dismissed
+     FROM goals_usercompletedaction
+     WHERE created_on BETWEEN %s AND %s AND user_id = %s) AS ucas,
+    (SELECT
+        COUNT(CASE WHEN state = 'completed' THEN 1 END) AS completed,
+        COUNT(CASE WHEN state = 'snoozed' THEN 1 END) AS snoozed,
+        COUNT(CASE WHEN state = 'dismissed' THEN 1 END) AS dismissed
+     FROM goals_usercompletedcustomaction
+     WHERE created_on BETWEEN %s AND %s AND user_id = %s) AS uccas
+"""
+
+
 class DailyProgressManager(models.Manager):
 
+    def stats(self, user, start, end):
+        """Count a user's (custom) actions and their completion states for the
+        day between `start` and `end`. This is done in a single query using
+        conditional aggregation, and returns a dict of DailyProgress field
+        names and values."""
+        params = [user.id, end, user.id, end, start, end, user.id, start, end, user.id]
+        with connection.cursor() as cursor:
+            cursor.execute(DAILY_PROGRESS_STATS_SQL, params)
+            columns = [col[0] for col in cursor.description]
+            return dict(zip(columns, cursor.fetchone()))
+
     def exists_today(self, user):
         """Check to see if there's already a progress object for today. If so,
         return it's ID (or None)"""
@@ -102,6 +147,75 @@ class DailyProgressManager(models.Manager):
             return 0.0
 
 
+class CheckinStreakManager(models.Manager):
+
+    def _yesterdays_streak(self, user, dt):
+        """Look up the checkin streak on the user's DailyProgress for the day
+        before `dt` (this is how streaks were calculated before we kept track
+        of them in CheckinStreak)."""
+        from .models import DailyProgress  # Avoid a circular import.
+        yesterday = user_utils.local_day_range(user, dt - timedelta(days=1))
+        streaks = DailyProgress.objects.filter(user=user, created_on__range=yesterday)
+        streaks = streaks.order_by('-checkin_streak')
+        return streaks.values_list('checkin_streak', flat=True).first() or 0
+
+    def checkin(self, user, dt=None):
+        """Record a check-in for the user on the (local) day containing `dt`
+        (default is now), and return their current streak. Checking in again
+        on the same day has no effect.
+
+        If the user doesn't yet have a CheckinStreak, one is created using the
+        streak from yesterday's DailyProgress.
+
+        """
+        dt = dt or timezone.now()
+        day = user_utils.to_localtime(dt, user).date()
+        yesterday = day - timedelta(days=1)
+        try:
+            obj = self.get(user=user)
+        except self.model.DoesNotExist:
+            streak = self._yesterdays_streak(user, dt)
+            obj = self.model(
+                user=user,
+                current_streak=streak,
+                last_checkin=yesterday if streak else None
+            )
+
+        if obj.last_checkin == day:
+            return obj.current_streak
+        elif obj.last_checkin and obj.last_checkin > day:
+            # A check-in for some day in the past; leave the streak alone.
+            return self._yesterdays_streak(user, dt) + 1
+        elif obj.last_checkin == yesterday:
+            obj.current_streak += 1
+        else:
+            obj.current_streak = 1
+        obj.last_checkin = day
+        obj.save()
+        return obj.current_streak
+
+    def bulk_checkin(self, streaks, day):
+        """Given a dict of {user_id: streak} values (e.g. for DailyProgress
+        rows that were created in bulk), record those streaks as the users'
+        check-ins for the given day."""
+        existing = set(
+            self.filter(user_id__in=streaks.keys()).values_list('user_id', flat=True)
+        )
+        by_value = defaultdict(list)
+        for user_id, streak in streaks.items():
+            if user_id in existing:
+                by_value[streak].append(user_id)
+        for streak, user_ids in by_value.items():
+            self.filter(user_id__in=user_ids).update(
+                current_streak=streak,
+                last_checkin=day
+            )
+        self.bulk_create([
+            self.model(user_id=user_id, current_streak=streak, last_checkin=day)
+            for user_id, streak in streaks.items() if user_id not in existing
+        ])
+
+
 class UserCategoryManager(models.Manager):
 
     def published(self, *args, **kwargs):
@@ -116,6 +230,56 @@ class UserCategoryManager(models.Manager):
         return qs.filter(**kwargs).distinct()
 
 
+# Per-goal engagement for UserGoal.engagement_{15,30,60}_days. The parameters
+# are the start of the 15, 30, and 60-day periods (then optionally a user id).
+USERGOAL_ENGAGEMENT_SQL = """
+UPDATE goals_usergoal AS ug SET
+    engagement_15_days = CASE WHEN e.completed_15 > 0
+        THEN ROUND(100.0 * e.completed_15 / e.total_15, 2)
+        ELSE ug.engagement_15_days END,
+    engagement_30_days = CASE WHEN e.completed_30 > 0
+        THEN ROUND(100.0 * e.completed_30 / e.total_30, 2)
+        ELSE ug.engagement_30_days END,
+    engagement_60_days = CASE WHEN e.completed_60 > 0
+        THEN ROUND(100.0 * e.completed_60 / e.total_60, 2)
+        ELSE ug.engagement_60_days END
+FROM (
+    SELECT uca.user_id, ua.primary_goal_id AS goal_id,
+        COUNT(CASE WHEN uca.created_on >= p.since_15 THEN 1 END) AS total_15,
+        COUNT(CASE WHEN uca.created_on >= p.since_15 AND uca.state = 'completed'
+              THEN 1 END) AS completed_15,
+        COUNT(CASE WHEN uca.created_on >= p.since_30 THEN 1 END) AS total_30,
+        COUNT(CASE WHEN uca.created_on >= p.since_30 AND uca.state = 'completed'
+              THEN 1 END) AS completed_30,
+        COUNT(*) AS total_60,
+        COUNT(CASE WHEN uca.state = 'completed' THEN 1 END) AS completed_60
+    FROM goals_usercompletedaction AS uca
+        JOIN goals_useraction AS ua ON ua.id = uca.useraction_id,
+        (SELECT %s::timestamptz AS since_15, %s::timestamptz AS since_30,
+                %s::timestamptz AS since_60) AS p
+    WHERE uca.created_on >= p.since_60 {user_filter}
+    GROUP BY uca.user_id, ua.primary_goal_id
+) AS e
+WHERE ug.user_id = e.user_id AND ug.goal_id = e.goal_id
+"""
+
+# UserGoal.engagement_rank: the percentile of a UserGoal's 15-day engagement
+# among all UserGoals for the same goal. As before, goals with only one or two
+# UserGoals get a rank of 90.
+USERGOAL_RANK_SQL = """
+UPDATE goals_usergoal AS ug SET engagement_rank = r.engagement_rank
+FROM (
+    SELECT id,
+        CASE WHEN COUNT(*) OVER (PARTITION BY goal_id) < 3 THEN 90.0
+        ELSE ROUND(CAST(100 * PERCENT_RANK() OVER (
+            PARTITION BY goal_id ORDER BY engagement_15_days
+        ) AS numeric), 2) END AS engagement_rank
+    FROM goals_usergoal
+) AS r
+WHERE ug.id = r.id {user_filter}
+"""
+
+
 class UserGoalManager(models.Manager):
 
     def published(self, *args, **kwargs):
@@ -166,41 +330,51 @@ class UserGoalManager(models.Manager):
             )
         return self.raw(sql, params)
 
-    def engagement_rank(self, user, goal):
-        """Given a user and a goal, find out how their 15-day engagement stats
-        compare with other users within that goal.
+    def update_engagement(self, user=None):
+        """Calculate and store the 15, 30, and 60-day engagement values and
+        the engagement rank for UserGoals (optionally, only those belonging
+        to the given user or user ID). This is done with two UPDATE statements:
 
-        Strategy for doing this:
+        1. Engagement is calculated for every (user, goal) pair with grouped
+           aggregates over the user's completions; as with
+           `UserGoal.calculate_engagement`, values are only changed when the
+           user completed something during the period.
+        2. Ranks are calculated with `percent_rank()` over the UserGoals for
+           each goal, ordered by their 15-day engagement.
 
-        1. Get the user's latest UserGoal object
-        2. Get all other UserGoal objects within that date range.
-        3. Calculate the user's engagement_15_days value compared with others
-           on the same day. To do this, we count the number of values below
-           the user's divided by the total number of values
+        Returns the number of UserGoals whose rank was updated.
 
         """
-        try:
-            ug = self.filter(user=user, goal=goal).latest('created_on')
+        user_id = getattr(user, 'id', user)
+        now = timezone.now()
+        since = [now - timedelta(days=days) for days in [15, 30, 60]]
+
+        with connection.cursor() as cursor:
+            if user_id is None:
+                cursor.execute(USERGOAL_ENGAGEMENT_SQL.format(user_filter=''), since)
+                cursor.execute(USERGOAL_RANK_SQL.format(user_filter=''))
+            else:
+                cursor.execute(
+                    USERGOAL_ENGAGEMENT_SQL.format(user_filter='AND uca.user_id = %s'),
+                    since + [user_id]
+                )
+                cursor.execute(
+                    USERGOAL_RANK_SQL.format(user_filter='AND ug.user_id = %s'),
+                    [user_id]
+                )
+            count = cursor.rowcount
+        if user_id is not None:
+            data_sections.bump(user_id, ['user_goals'])
+        return count
 
-            daterange = dateutils.date_range(ug.created_on)
-            # XXX: let's pull in a couple days worth of data, because it's
-            # likely that we may not get enough values to compare.
-            daterange = (daterange[0] - timedelta(days=2), daterange[1])
-            values = self.filter(goal=goal, created_on__range=daterange)
-            total = values.count()
-            values = values.values_list('engagement_15_days', flat=True)
-            values = sorted(values, reverse=True)  # Sort biggest -> smallest
+    def engagement_rank(self, user, goal):
+        """Given a user and a goal, return the user's (stored) engagement rank
+        within that goal: a percentile of their 15-day engagement compared
+        with others who've selected the goal. See `update_engagement`.
 
-            # Find the first occurance of the user's value, and count the rest.
-            if len(values) > 2:
-                num_lower = len(values[values.index(ug.engagement_15_days) + 1:])
-                return round((num_lower / total) * 100, 2)
-            # If there's only 1 or 2 values, let's fudge this a bit. 1 value
-            # would put us at 100, but 2 at 50. 90% seems a good compromise in
-            # those cases.
-            return 90.0
-        except (self.model.DoesNotExist, IndexError, ZeroDivisionError):
-            return 0.0
+        """
+        rank = self.filter(user=user, goal=goal).order_by('-created_on')
+        return rank.values_list('engagement_rank', flat=True).first() or 0.0
 
 
 class UserActionQuerySet(models.QuerySet):
@@ -216,6 +390,42 @@ class UserActionQuerySet(models.QuerySet):
     def upcoming(self):
         return self.filter(next_trigger_date__gte=timezone.now())
 
+    def in_sequence(self, goals=True):
+        """Return UserActions that are 'up next' according to their user's
+        SequenceState. This is a join rather than a per-user aggregate, so it
+        works across any number of users (those without a SequenceState are
+        excluded).
+
+        * goals: If True (the default), only include actions within the
+          user's next Goals in sequence, like `get_next_useractions_in_sequence`.
+          Otherwise, this matches `UserAction.next_in_sequence`.
+
+        """
+        from .models import UserCompletedAction as UCA
+        qs = self.filter(action__state='published')
+        qs = qs.exclude(usercompletedaction__state=UCA.COMPLETED)
+        if not goals:
+            qs = qs.filter(
+                action__sequence_order=F('user__sequence_state__action_order')
+            )
+            return qs.distinct()
+
+        qs = qs.filter(
+            action__sequence_order=F('user__sequence_state__sequence_order')
+        )
+        # When a user has no Goals in sequence, their actions aren't filtered
+        # by goal at all.
+        qs = qs.filter(
+            Q(user__sequence_state__goal_order__isnull=True) |
+            Q(
+                primary_goal__state='published',
+                primary_goal__sequence_order=F('user__sequence_state__goal_order'),
+                primary_goal__usergoal__user=F('user'),
+                primary_goal__usergoal__completed=False,
+            )
+        )
+        return qs.distinct()
+
     def stale(self, **kwargs):
         """Returns UserAction objects whose `next_trigger_date` is in the past.
 
@@ -261,6 +471,11 @@ class UserActionManager(models.Manager):
         stale or None."""
         return self.get_queryset().stale(**kwargs)
 
+    def in_sequence(self, goals=True):
+        """Return a queryset of UserActions that are up next in sequence. See
+        `UserActionQuerySet.in_sequence`."""
+        return self.get_queryset().in_sequence(goals=goals)
+
     def with_custom_triggers(self):
         """Returns a queryset of UserAction objets whose custom_trigger field
         meets the followign criteria:
@@ -320,6 +535,83 @@ class UserActionManager(models.Manager):
         return qs.filter(action__sequence_order=min_order)
 
 
+class SequenceStateManager(models.Manager):
+    """Maintains the SequenceState table. The orders stored there are computed
+    exactly as they are by `UserGoalManager.next_in_sequence` and
+    `UserActionManager.next_in_sequence`."""
+
+    def compute(self, user):
+        """Calculate (but don't store) a user's current sequence orders.
+        Returns a dict of field values for a SequenceState."""
+        from .models import UserCompletedAction as UCA
+
+        usergoals = user.usergoal_set.filter(
+            goal__state='published',
+            completed=False
+        )
+        goal_order = usergoals.aggregate(Min('goal__sequence_order'))
+        goal_order = goal_order.get('goal__sequence_order__min')
+
+        useractions = user.useraction_set.filter(action__state='published')
+        useractions = useractions.exclude(usercompletedaction__state=UCA.COMPLETED)
+        action_order = useractions.aggregate(Min('action__sequence_order'))
+        action_order = action_order.get('action__sequence_order__min') or 0
+
+        sequence_order = action_order
+        if goal_order is not None:
+            goals = usergoals.filter(goal__sequence_order=goal_order)
+            useractions = useractions.filter(
+                primary_goal__in=goals.values_list('goal', flat=True)
+            )
+            sequence_order = useractions.aggregate(Min('action__sequence_order'))
+            sequence_order = sequence_order.get('action__sequence_order__min') or 0
+
+        return {
+            'goal_order': goal_order,
+            'action_order': action_order,
+            'sequence_order': sequence_order,
+        }
+
+    def for_user(self, user):
+        """Return the user's SequenceState, creating it if necessary."""
+        try:
+            return self.get(user=user)
+        except self.model.DoesNotExist:
+            obj, _ = self.update_or_create(user=user, defaults=self.compute(user))
+            return obj
+
+    def update_for(self, user):
+        """Re-calculate the user's existing SequenceState (if any). This never
+        creates a new row; those are created lazily by `for_user` or by the
+        `rebuild_sequence_state` command."""
+        if user is not None and self.filter(user=user).exists():
+            self.filter(user=user).update(
+                updated_on=timezone.now(),
+                **self.compute(user)
+            )
+
+    def rebuild(self, users):
+        """Create or re-calculate the SequenceState for each of the given
+        users. Returns the number of rows written."""
+        count = 0
+        for user in users:
+            self.update_or_create(user=user, defaults=self.compute(user))
+            count += 1
+        return count
+
+    def inconsistencies(self, users=None):
+        """Compare stored SequenceStates with freshly computed values. Yields
+        a tuple of (state, expected_values) for each one that's out of date."""
+        states = self.select_related('user')
+        if users is not None:
+            states = states.filter(user__in=users)
+        fields = ['goal_order', 'action_order', 'sequence_order']
+        for state in states.iterator():
+            expected = self.compute(state.user)
+            if any(getattr(state, f) != expected[f] for f in fields):
+                yield (state, expected)
+
+
 class TriggerManager(models.Manager):
     """A simple manager for the Trigger model. This class adds a few convenience
     methods to the regular api:
@@ -510,50 +802,17 @@ class PackageEnrollmentManager(models.Manager):
         """Given a list of email addresses, get or create PackageEnrollments
         for them. Returns a QuerySet of PackageEnrollment objects.
 
+        See `goals.cohorts.import_cohort`, which does the work in bulk (and
+        returns an id that can be used to check on its progress).
+
         """
+        from .cohorts import import_cohort  # Avoid a circular import.
+
         # NOTE: this doesn't create duplicate PackageEnrollments, but it does
         # udpate a user's goals.
-        created_objects = []
-        User = get_user_model()
-
-        for email in emails:
-            email = email.strip().lower()
-            try:
-                user = User.objects.get(email__iexact=email)
-            except User.DoesNotExist:
-                # Create an inactive user. This will:
-                #
-                # - Ensure they still go thru onboarding in the app.
-                # - Allow them to later set their password and user fields.
-                user = user_utils.create_inactive_user(email)
-
-            try:
-                enrollment = self.get(user=user, category=category)
-                enrollment.enrolled_by = by
-                enrollment.prevent_custom_triggers = prevent_triggers
-                enrollment.save()
-            except self.model.DoesNotExist:
-                enrollment = self.create(
-                    user=user,
-                    category=category,
-                    enrolled_by=by,
-                    prevent_custom_triggers=prevent_triggers
-                )
-
-            # Will add new goals or update the existing relationships.
-            for goal in goals:
-                enrollment.goals.add(goal)
-            enrollment.save()
-
-            # If a user has accepted this package already, go ahead and add
-            # their content. They'll receive an email notifying them about the
-            # new goals, but they won't have to accept them.
-            if enrollment.accepted:
-                enrollment.create_user_mappings()
-
-            created_objects.append(enrollment.id)
-
-        return self.get_queryset().filter(pk__in=created_objects)
+        enrollments, batch_id = import_cohort(
+            emails, category, goals, by, prevent_triggers=prevent_triggers)
+        return enrollments
 
 
 class UserCompletedActionManager(models.Manager):
@@ -581,6 +840,10 @@ class UserCompletedActionManager(models.Manager):
         total = qs.count()
         if total > 0:
             completed = qs.filter(state=self.model.COMPLETED).count()
-            result = round((completed / total) * 100, 2)
+            # Round halves up (rather than using round() on a float), which
+            # is what PostgreSQL's ROUND does for the engagement values that
+            # are calculated in SQL (see goals.snapshots).
+            result = Decimal(completed * 100) / Decimal(total)
+            result = float(result.quantize(Decimal('0.01'), rounding=ROUND_HALF_UP))
 
         return result
@@ -0,0 +1,32 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('goals', '0179_auto_20161017_1723'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SequenceState',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('goal_order', models.IntegerField(blank=True, help_text="The lowest sequence_order of the user's published, incomplete Goals (None if they have no such Goals).", null=True)),
+                ('action_order', models.IntegerField(default=0, help_text="The lowest sequence_order of the user's published, incomplete Actions.")),
+                ('sequence_order', models.IntegerField(default=0, help_text="The lowest sequence_order of the user's published, incomplete Actions within their next Goals in sequence.")),
+                ('updated_on', models.DateTimeField(auto_now=True)),
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='sequence_state', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Sequence State',
+                'verbose_name_plural': 'Sequence States',
+            },
+        ),
+    ]
@@ -0,0 +1,31 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('goals', '0180_sequencestate'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CheckinStreak',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('current_streak', models.IntegerField(default=0, help_text='Number of consecutive days the user has checked in.')),
+                ('last_checkin', models.DateField(blank=True, help_text="The date (in the user's timezone) of the latest check-in.", null=True)),
+                ('updated_on', models.DateTimeField(auto_now=True)),
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='checkin_streak', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Checkin Streak',
+                'verbose_name_plural': 'Checkin Streaks',
+            },
+        ),
+    ]
@@ -0,0 +1,36 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+import django.contrib.postgres.fields
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('goals', '0181_checkinstreak'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProgramEnrollmentChunk',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(help_text='Idempotency key for this chunk: {batch}-{index}', max_length=128, unique=True)),
+                ('batch', models.CharField(db_index=True, help_text='Identifies all of the chunks for a single enrollment.', max_length=32)),
+                ('user_ids', django.contrib.postgres.fields.ArrayField(base_field=models.IntegerField(), default=list, help_text='IDs of the users to enroll.', size=None)),
+                ('state', models.CharField(choices=[('pending', 'Pending'), ('running', 'Running'), ('done', 'Done'), ('failed', 'Failed')], db_index=True, default='pending', max_length=32)),
+                ('attempts', models.IntegerField(default=0)),
+                ('error', models.TextField(blank=True)),
+                ('created_on', models.DateTimeField(auto_now_add=True)),
+                ('updated_on', models.DateTimeField(auto_now=True)),
+                ('goal', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='goals.Goal')),
+            ],
+            options={
+                'ordering': ['created_on', 'key'],
+                'verbose_name': 'Program Enrollment Chunk',
+                'verbose_name_plural': 'Program Enrollment Chunks',
+            },
+        ),
+    ]
@@ -0,0 +1,72 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+def render_markdown(apps, schema_editor):
+    from goals.rendering import MARKDOWN_FIELDS, render
+
+    for model_name, fields in MARKDOWN_FIELDS.items():
+        Model = apps.get_model("goals", model_name)
+        for obj in Model.objects.only(*fields).iterator():
+            update_fields = render(obj, fields)
+            Model.objects.filter(pk=obj.pk).update(
+                **{name: getattr(obj, name) for name in update_fields}
+            )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('goals', '0182_programenrollmentchunk'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='action',
+            name='description_html',
+            field=models.TextField(blank=True, editable=False),
+        ),
+        migrations.AddField(
+            model_name='action',
+            name='markdown_hash',
+            field=models.CharField(blank=True, editable=False, max_length=32),
+        ),
+        migrations.AddField(
+            model_name='action',
+            name='more_info_html',
+            field=models.TextField(blank=True, editable=False),
+        ),
+        migrations.AddField(
+            model_name='category',
+            name='consent_more_html',
+            field=models.TextField(blank=True, editable=False),
+        ),
+        migrations.AddField(
+            model_name='category',
+            name='consent_summary_html',
+            field=models.TextField(blank=True, editable=False),
+        ),
+        migrations.AddField(
+            model_name='category',
+            name='description_html',
+            field=models.TextField(blank=True, editable=False),
+        ),
+        migrations.AddField(
+            model_name='category',
+            name='markdown_hash',
+            field=models.CharField(blank=True, editable=False, max_length=32),
+        ),
+        migrations.AddField(
+            model_name='goal',
+            name='description_html',
+            field=models.TextField(blank=True, editable=False),
+        ),
+        migrations.AddField(
+            model_name='goal',
+            name='markdown_hash',
+            field=models.CharField(blank=True, editable=False, max_length=32),
+        ),
+        migrations.RunPython(render_markdown, reverse_code=migrations.RunPython.noop),
+    ]
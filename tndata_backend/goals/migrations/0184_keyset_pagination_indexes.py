@@ -0,0 +1,24 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.conf import settings
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('goals', '0183_rendered_markdown'),
+    ]
+
+    operations = [
+        migrations.AlterIndexTogether(
+            name='useraction',
+            index_together=set([('user', 'id')]),
+        ),
+        migrations.AlterIndexTogether(
+            name='dailyprogress',
+            index_together=set([('user', 'updated_on', 'id')]),
+        ),
+    ]
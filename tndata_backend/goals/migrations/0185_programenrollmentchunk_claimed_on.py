@@ -0,0 +1,19 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('goals', '0184_keyset_pagination_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='programenrollmentchunk',
+            name='claimed_on',
+            field=models.DateTimeField(blank=True, help_text='When a job last started enrolling this chunk.', null=True),
+        ),
+    ]
@@ -2,6 +2,8 @@
 This module contains Mixins.
 
 """
+import time
+
 from django.conf import settings
 from django.contrib import messages
 from django.contrib.auth.decorators import user_passes_test
@@ -15,6 +17,7 @@ from rest_framework import status
 from rest_framework.response import Response
 from utils.db import get_model_name
 
+from . import response_cache
 from . permissions import (
     ContentPermissions,
     is_contributor,
@@ -49,6 +52,34 @@ class DeleteMultipleMixin:
         return Response(status=status.HTTP_400_BAD_REQUEST)
 
 
+class ResponseCacheMixin:
+    """A Mixin for the public content ViewSets that caches their responses
+    for anonymous users (see goals.response_cache).
+
+    The cache is checked once the request has been authenticated and its api
+    version determined; on a hit, the cached data is returned without running
+    the viewset's action (so there are no queries and no serialization).
+
+    """
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        self.response_cache_started = time.time()
+        self.response_cache_key = response_cache.get_key(self, request)
+        if self.response_cache_key:
+            data = response_cache.get_response(self, self.response_cache_key)
+            if data is not None:
+                self.response_cache_key = None  # Don't re-cache it.
+                # Replace the `list` or `retrieve` handler for this request.
+                self.get = lambda request, *args, **kwargs: Response(data)
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        key = getattr(self, 'response_cache_key', None)
+        if key and response.status_code == status.HTTP_200_OK:
+            elapsed = (time.time() - self.response_cache_started) * 1000
+            response_cache.set_response(key, response.data, elapsed)
+        return super().finalize_response(request, response, *args, **kwargs)
+
+
 class StateFilterMixin:
     """A mixin that provides a default filter for objects with a `state`."""
 
@@ -10,9 +10,13 @@ from .misc import (  # NOQA
     popular_categories
 )
 from .organizations import Organization  # NOQA
-from .packages import Program, PackageEnrollment  # NOQA
+from .packages import Program, PackageEnrollment, ProgramEnrollmentChunk  # NOQA
 from .public import Action, Category, Goal  # NOQA
-from .progress import DailyProgress, UserCompletedAction  # NOQA
+from .progress import (  # NOQA
+    CheckinStreak,
+    DailyProgress,
+    UserCompletedAction,
+)
 from .path import (  # NOQA -- we need these to satisfy old migrations.
     _category_icon_path,
     _catetgory_image_path,
@@ -22,9 +26,12 @@ from .path import (  # NOQA -- we need these to satisfy old migrations.
     _behavior_img_path,
     _behavior_icon_path,
 )
+from .sequence import SequenceState  # NOQA
 from .signals import (  # NOQA
     action_completed,
     auto_enroll,
+    bump_content_version,
+    bump_user_data_sections,
     bust_feed_cache,
     clean_content,
     create_or_update_daily_progress,
@@ -32,12 +39,17 @@ from .signals import (  # NOQA
     custom_trigger_updated,
     delete_category_child_goals,
     delete_model_images,
+    invalidate_package_calendar,
+    invalidate_package_calendar_for_trigger,
     notify_for_new_package,
     program_goals_changed,
     remove_action_reminders,
     remove_queued_messages,
+    render_content_markdown,
     reset_next_trigger_date_when_snoozed,
     set_dp_checkin_streak,
+    sync_sequence_state,
+    reset_sequence_state,
     update_daily_progress,
     user_adopted_content,
 )
@@ -3,6 +3,7 @@ Models for Packages.
 
 """
 from django.conf import settings
+from django.contrib.postgres.fields import ArrayField
 from django.core.urlresolvers import reverse
 from django.db import models
 from django.utils.text import slugify
@@ -97,6 +98,67 @@ class Program(models.Model):
             cat.unenroll(user)
 
 
+class ProgramEnrollmentChunk(models.Model):
+    """A chunk of a Program's members that should be enrolled in a Goal.
+
+    When a Goal is published (or added to a Program's auto-enrolled goals),
+    its program members are split into chunks that are enrolled by separate
+    background jobs (see `goals.program_enrollment`). Each chunk records its
+    progress, so a failed chunk can be retried without redoing the others.
+
+    """
+    PENDING = 'pending'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATE_CHOICES = (
+        (PENDING, 'Pending'),
+        (RUNNING, 'Running'),
+        (DONE, 'Done'),
+        (FAILED, 'Failed'),
+    )
+
+    key = models.CharField(
+        max_length=128,
+        unique=True,
+        help_text="Idempotency key for this chunk: {batch}-{index}"
+    )
+    batch = models.CharField(
+        max_length=32,
+        db_index=True,
+        help_text="Identifies all of the chunks for a single enrollment."
+    )
+    goal = models.ForeignKey(Goal)
+    user_ids = ArrayField(
+        models.IntegerField(),
+        default=list,
+        help_text="IDs of the users to enroll."
+    )
+    state = models.CharField(
+        max_length=32,
+        choices=STATE_CHOICES,
+        default=PENDING,
+        db_index=True
+    )
+    attempts = models.IntegerField(default=0)
+    error = models.TextField(blank=True)
+    claimed_on = models.DateTimeField(
+        blank=True,
+        null=True,
+        help_text="When a job last started enrolling this chunk."
+    )
+    created_on = models.DateTimeField(auto_now_add=True)
+    updated_on = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['created_on', 'key']
+        verbose_name = "Program Enrollment Chunk"
+        verbose_name_plural = "Program Enrollment Chunks"
+
+    def __str__(self):
+        return "{} ({})".format(self.key, self.state)
+
+
 class PackageEnrollment(models.Model):
     """A mapping of users who've been enrolled in various *Packaged Content*
     e.g. Categories. This model tracks when they were enrolled, which categories
@@ -2,12 +2,15 @@
 """
 from django.conf import settings
 from django.db import models
-from django.db.models import Min
 from jsonfield import JSONField
 
 from .public import Action
 from .users import UserAction
-from ..managers import DailyProgressManager, UserCompletedActionManager
+from ..managers import (
+    CheckinStreakManager,
+    DailyProgressManager,
+    UserCompletedActionManager,
+)
 
 from utils.user_utils import local_day_range
 
@@ -153,7 +156,8 @@ class DailyProgress(models.Model):
         help_text="User feedback on their progress toward achieving goals"
     )
 
-    # NOTE: This value gets set by the `set_dp_checkin_streak` signal handler.
+    # NOTE: This value gets set by the `set_dp_checkin_streak` signal handler
+    # when the object is created (see CheckinStreak).
     checkin_streak = models.IntegerField(
         default=0,
         blank=True,
@@ -175,6 +179,8 @@ class DailyProgress(models.Model):
 
     class Meta:
         ordering = ['-updated_on', 'user']
+        # For keyset pagination of a user's history (see utils.pagination).
+        index_together = [("user", "updated_on", "id")]
         verbose_name = 'Daily Progress'
         verbose_name_plural = 'Daily Progresses'
         get_latest_by = 'updated_on'
@@ -205,48 +211,12 @@ class DailyProgress(models.Model):
             self.goal_status[key] = value
         return self.goal_status
 
-    def _update_useraction_stats(self):
-        start, end = local_day_range(self.user, dt=self.created_on)
-        from_date = self.user.useraction_set.aggregate(Min('created_on'))
-        from_date = from_date['created_on__min'] or start
-
-        # Count the total number of UserActions selected (ever)
-        self.actions_total = self.user.useraction_set.filter(
-            created_on__range=(from_date, end)).count()
-
-        # Count the stats for today's UserCompletedActions
-        ucas = self.user.usercompletedaction_set.filter(
-            created_on__range=(start, end))
-        self.actions_completed = ucas.filter(
-            state=UserCompletedAction.COMPLETED).count()
-        self.actions_snoozed = ucas.filter(
-            state=UserCompletedAction.SNOOZED).count()
-        self.actions_dismissed = ucas.filter(
-            state=UserCompletedAction.DISMISSED).count()
-
-    def _update_customaction_stats(self):
-        start, end = local_day_range(self.user, dt=self.created_on)
-        from_date = self.user.customaction_set.aggregate(Min('created_on'))
-        from_date = from_date['created_on__min'] or start
-
-        # Count the total number of CustomAction objects (ever)
-        self.customactions_total = self.user.customaction_set.filter(
-            created_on__range=(from_date, end)).count()
-
-        # Count status of UserCompletedAction data for today
-        uccas = self.user.usercompletedcustomaction_set.filter(
-            created_on__range=(start, end)
-        )
-        self.customactions_completed = uccas.filter(
-            state=UserCompletedAction.COMPLETED).count()
-        self.customactions_snoozed = uccas.filter(
-            state=UserCompletedAction.SNOOZED).count()
-        self.customactions_dismissed = uccas.filter(
-            state=UserCompletedAction.DISMISSED).count()
-
     def update_stats(self):
-        self._update_useraction_stats()
-        self._update_customaction_stats()
+        """Update the counts of (custom) actions and their completions for the
+        day on which this object was created (in a single query)."""
+        start, end = local_day_range(self.user, dt=self.created_on)
+        for field, value in DailyProgress.objects.stats(self.user, start, end).items():
+            setattr(self, field, value)
 
     def usercompletedactions(self):
         """Return a queryset of UserCompletedAction objects that were updated
@@ -267,3 +237,35 @@ class DailyProgress(models.Model):
     # The DailyProgress manager has custom convenience methods:
     # - for_user(user) -- Gets or creates an instance for "today"
     objects = DailyProgressManager()
+
+
+class CheckinStreak(models.Model):
+    """A user's current check-in streak (the number of consecutive days on
+    which they've had a DailyProgress), along with the (local) date of their
+    most recent check-in. This lets us update a streak without looking up
+    yesterday's DailyProgress; see `CheckinStreakManager.checkin`.
+
+    """
+    user = models.OneToOneField(
+        settings.AUTH_USER_MODEL,
+        related_name="checkin_streak"
+    )
+    current_streak = models.IntegerField(
+        default=0,
+        help_text="Number of consecutive days the user has checked in."
+    )
+    last_checkin = models.DateField(
+        blank=True,
+        null=True,
+        help_text="The date (in the user's timezone) of the latest check-in."
+    )
+    updated_on = models.DateTimeField(auto_now=True)
+
+    objects = CheckinStreakManager()
+
+    class Meta:
+        verbose_name = "Checkin Streak"
+        verbose_name_plural = "Checkin Streaks"
+
+    def __str__(self):
+        return "{}".format(self.user)
@@ -12,7 +12,6 @@ import re
 
 import django.dispatch
 from django.conf import settings
-from django.contrib.auth import get_user_model
 from django.contrib.contenttypes.models import ContentType
 from django.contrib.postgres.fields import ArrayField
 from django.core.urlresolvers import reverse
@@ -22,7 +21,6 @@ from django.utils.text import slugify
 from django_fsm import FSMField, transition
 from django_rq import job
 from jsonfield import JSONField
-from markdown import markdown
 from notifications.models import GCMMessage
 from utils import colors
 from utils.db import get_max_order
@@ -221,6 +219,12 @@ class Category(ModifiedMixin, StateMixin, URLMixin, models.Model):
     )
     # -------------------------------------------------------------------------
 
+    # Pre-rendered markdown (see goals.rendering)
+    description_html = models.TextField(blank=True, editable=False)
+    consent_summary_html = models.TextField(blank=True, editable=False)
+    consent_more_html = models.TextField(blank=True, editable=False)
+    markdown_hash = models.CharField(max_length=32, blank=True, editable=False)
+
     # TIMESTAMPS
     created_on = models.DateTimeField(auto_now_add=True)
     updated_on = models.DateTimeField(auto_now=True)
@@ -253,18 +257,18 @@ class Category(ModifiedMixin, StateMixin, URLMixin, models.Model):
 
     @property
     def rendered_description(self):
-        """Render the description markdown"""
-        return markdown(self.description)
+        """The rendered description markdown"""
+        return self.description_html
 
     @property
     def rendered_consent_summary(self):
-        """Render the consent_summary markdown"""
-        return markdown(self.consent_summary)
+        """The rendered consent_summary markdown"""
+        return self.consent_summary_html
 
     @property
     def rendered_consent_more(self):
-        """Render the consent_more markdown"""
-        return markdown(self.consent_more)
+        """The rendered consent_more markdown"""
+        return self.consent_more_html
 
     @property
     def goals(self):
@@ -345,22 +349,14 @@ class Category(ModifiedMixin, StateMixin, URLMixin, models.Model):
     def enroll(self, user):
         """Enroll the user in this category and all of the published content
         contained within it."""
+        from ..enrollment import enroll_in_goals  # Avoid a circular import.
+
         # Enroll the user in this category...
         user.usercategory_set.get_or_create(category=self)
 
-        # Then enroll the user in all of the published Goals
+        # Then enroll the user in all of the published Goals & their Actions
         goals = self.goal_set.filter(state='published')
-        for goal in goals:
-            ug, _ = user.usergoal_set.get_or_create(user=user, goal=goal)
-            ug.primary_category = self
-            ug.save()
-
-            # Finally, enroll the user in the Actions
-            for action in goal.action_set.published():
-                ua, _ = user.useraction_set.get_or_create(action=action)
-                ua.primary_category = self
-                ua.primary_goal = goal
-                ua.save()
+        enroll_in_goals(user, goals, primary_category=self)
 
     def unenroll(self, user):
         """Removes the user in this category and all of the published content
@@ -378,69 +374,13 @@ class Category(ModifiedMixin, StateMixin, URLMixin, models.Model):
         Every newly created object will be a clone, except for the title, which
         will be prefixed with the given text.
 
-        XXX: This is a potentially slow & inefficient method! Handle with care.
+        See `goals.duplication` (the copies are created in bulk).
 
         Returns a copy of the new category.
 
         """
-        new_category = Category.objects.create(
-            order=get_max_order(Category),
-            title="{} {}".format(prefix, self.title),
-            description=self.description,
-            icon=self.icon,
-            image=self.image,
-            notes=self.notes,
-            color=self.color,
-            secondary_color=self.secondary_color,
-            packaged_content=self.packaged_content,
-            consent_summary=self.consent_summary,
-            consent_more=self.consent_more,
-            prevent_custom_triggers_default=self.prevent_custom_triggers_default,
-            display_prevent_custom_triggers_option=self.display_prevent_custom_triggers_option,
-        )
-
-        for goal in self.goals:
-            new_goal, _ = Goal.objects.update_or_create(
-                title="{} {}".format(prefix, goal.title),
-                description=goal.description,
-                subtitle=goal.subtitle,
-                notes=goal.notes,
-                more_info=goal.more_info,
-                icon=goal.icon,
-                keywords=goal.keywords,
-            )
-            new_goal.categories.add(new_category)
-            new_goal.save()
-
-            for action in goal.action_set.all():
-                default_trigger = None
-                if action.default_trigger:
-                    default_trigger = action.default_trigger
-                    default_trigger.pk = None  # HACK to get a new object.
-                    default_trigger.name = "{} {}".format(
-                        prefix,
-                        action.default_trigger.name
-                    )
-                    default_trigger.save()
-
-                new_action = Action.objects.create(
-                    title=action.title,
-                    action_type=action.action_type,
-                    sequence_order=action.sequence_order,
-                    source_link=action.source_link,
-                    source_notes=action.source_notes,
-                    notes=action.notes,
-                    more_info=action.more_info,
-                    description=action.description,
-                    external_resource=action.external_resource,
-                    external_resource_name=action.external_resource_name,
-                    notification_text=action.notification_text,
-                    icon=action.icon,
-                    default_trigger=default_trigger,
-                )
-                new_action.goals.add(goal)
-
-        return new_category
+        from ..duplication import duplicate_category  # Avoid a circular import.
+        return duplicate_category(self, prefix)
 
     objects = CategoryManager()
 
@@ -449,11 +389,14 @@ class Category(ModifiedMixin, StateMixin, URLMixin, models.Model):
 def _enroll_program_members(goal):
     """When we publish a Goal, we need to look up the programs in which it
     is listed (e.g. it's a member of Program.auto_enrolled_goals). Then, enroll
-    all program members in this goal."""
-    User = get_user_model()
-    members = goal.program_set.values_list('members', flat=True)
-    for user in User.objects.filter(pk__in=members):
-        goal.enroll(user)
+    all program members in this goal.
+
+    The members are enrolled in chunks, by separate jobs; see
+    `goals.program_enrollment`.
+
+    """
+    from ..program_enrollment import enroll_program_members  # Avoid a circular import.
+    enroll_program_members(goal)
 
 
 class Goal(ModifiedMixin, StateMixin, URLMixin, models.Model):
@@ -533,6 +476,10 @@ class Goal(ModifiedMixin, StateMixin, URLMixin, models.Model):
         help_text="Add keywords for this goal. These will be used to generate "
                   "suggestions for the user."
     )
+    # Pre-rendered markdown (see goals.rendering)
+    description_html = models.TextField(blank=True, editable=False)
+    markdown_hash = models.CharField(max_length=32, blank=True, editable=False)
+
     created_on = models.DateTimeField(auto_now_add=True)
     updated_on = models.DateTimeField(auto_now=True)
 
@@ -564,8 +511,8 @@ class Goal(ModifiedMixin, StateMixin, URLMixin, models.Model):
 
     @property
     def rendered_description(self):
-        """Render the description markdown"""
-        return markdown(self.description)
+        """The rendered description markdown"""
+        return self.description_html
 
     def save(self, *args, **kwargs):
         """This method ensurse we always perform a few tasks prior to saving
@@ -637,6 +584,8 @@ class Goal(ModifiedMixin, StateMixin, URLMixin, models.Model):
           as the primary category on all UserGoals and UserActions.
 
         """
+        from ..enrollment import enroll_in_goals  # Avoid a circular import.
+
         if primary_category is None:
             primary_category = self.get_parent_category_for_user(user)
 
@@ -644,17 +593,8 @@ class Goal(ModifiedMixin, StateMixin, URLMixin, models.Model):
         if not user.usercategory_set.filter(category=primary_category).exists():
             user.usercategory_set.create(category=primary_category)
 
-        ug, _ = user.usergoal_set.get_or_create(goal=self)
-        ug.primary_category = primary_category
-        ug.save()
-
-        # Finally, enroll the user in the Actions
-        actions = self.action_set.filter(state='published').distinct()
-        for action in actions:
-            ua, _ = user.useraction_set.get_or_create(action=action)
-            ua.primary_category = primary_category
-            ua.primary_goal = self
-            ua.save()
+        # Finally, enroll the user in this goal and its Actions
+        enroll_in_goals(user, [self], primary_category=primary_category)
 
     objects = GoalManager()
 
@@ -837,6 +777,10 @@ class Action(URLMixin, ModifiedMixin, StateMixin, models.Model):
         default=dict,
         dump_kwargs=dump_kwargs
     )
+    # Pre-rendered markdown (see goals.rendering)
+    description_html = models.TextField(blank=True, editable=False)
+    more_info_html = models.TextField(blank=True, editable=False)
+    markdown_hash = models.CharField(max_length=32, blank=True, editable=False)
 
     updated_by = models.ForeignKey(
         settings.AUTH_USER_MODEL,
@@ -917,13 +861,13 @@ class Action(URLMixin, ModifiedMixin, StateMixin, models.Model):
 
     @property
     def rendered_description(self):
-        """Render the description markdown"""
-        return markdown(self.description)
+        """The rendered description markdown"""
+        return self.description_html
 
     @property
     def rendered_more_info(self):
-        """Render the more_info markdown"""
-        return markdown(self.more_info)
+        """The rendered more_info markdown"""
+        return self.more_info_html
 
     def get_disable_trigger_url(self):
         args = [self.id, self.title_slug]
@@ -0,0 +1,55 @@
+"""
+A materialized view of each user's position in their sequence of Goals and
+Actions.
+
+Figuring out which UserActions are "up next" normally requires a couple of
+aggregate queries per user (see `UserGoalManager.next_in_sequence` and
+`UserActionManager.next_in_sequence`). A SequenceState stores the results of
+those aggregates, so that eligibility becomes a simple join (see
+`UserActionQuerySet.in_sequence`).
+
+States are updated incrementally (see the signal handlers in `.signals`)
+when UserActions, UserGoals, or UserCompletedActions change, and they're
+removed (then lazily re-created) when an Action or Goal is saved. Use the
+`rebuild_sequence_state` and `check_sequence_state` management commands to
+(re-)populate the table or look for inconsistencies.
+
+"""
+from django.conf import settings
+from django.db import models
+
+from ..managers import SequenceStateManager
+
+
+class SequenceState(models.Model):
+    """Where a user currently is in their sequence of content."""
+    user = models.OneToOneField(
+        settings.AUTH_USER_MODEL,
+        related_name="sequence_state"
+    )
+    goal_order = models.IntegerField(
+        blank=True,
+        null=True,
+        help_text="The lowest sequence_order of the user's published, "
+                  "incomplete Goals (None if they have no such Goals)."
+    )
+    action_order = models.IntegerField(
+        default=0,
+        help_text="The lowest sequence_order of the user's published, "
+                  "incomplete Actions."
+    )
+    sequence_order = models.IntegerField(
+        default=0,
+        help_text="The lowest sequence_order of the user's published, "
+                  "incomplete Actions within their next Goals in sequence."
+    )
+    updated_on = models.DateTimeField(auto_now=True)
+
+    objects = SequenceStateManager()
+
+    class Meta:
+        verbose_name = "Sequence State"
+        verbose_name_plural = "Sequence States"
+
+    def __str__(self):
+        return "{}".format(self.user)
@@ -2,7 +2,6 @@
 Signal Handlers for our models.
 
 """
-from datetime import timedelta
 from django.conf import settings
 from django.contrib.contenttypes.models import ContentType
 from django.core.cache import cache
@@ -19,17 +18,19 @@ from django.utils.text import slugify
 from django_rq import job
 from notifications.signals import notification_snoozed
 from redis_metrics import metric
+from userprofile import data_sections
 from utils.slack import post_private_message
-from utils.user_utils import local_day_range
 
-from .custom import CustomAction
+from .custom import CustomAction, CustomGoal, UserCompletedCustomAction
 from .packages import PackageEnrollment, Program
-from .progress import DailyProgress, UserCompletedAction
+from .progress import CheckinStreak, DailyProgress, UserCompletedAction
+from .sequence import SequenceState
 from .public import Action, Category, Goal, action_unpublished
 from .public import _enroll_program_members
 from .users import UserAction, UserCategory, UserGoal
 from .triggers import Trigger
 
+from .. import progress_queue, rendering, response_cache
 from ..utils import clean_title, clean_notification, strip
 
 
@@ -91,12 +92,21 @@ def auto_enroll(sender, **kwargs):
 @receiver(post_save, sender=CustomAction, dispatch_uid="coru_daily_progress")
 @receiver(post_save, sender=UserAction, dispatch_uid="coru_daily_progress")
 @receiver(post_save, sender=UserCompletedAction, dispatch_uid="coru_daily_progress")
+@receiver(post_save, sender=UserCompletedCustomAction, dispatch_uid="coru_daily_progress")
 def create_or_update_daily_progress(sender, instance, created, raw, using, **kwargs):
     """When a CustomAction, UserAction, or UserCompletedAction
     is created, we want to create (if necessary) or update the day's
     DailyProgress for the user.
+
+    If DailyProgress updates are debounced (see goals.progress_queue), we just
+    mark the user's progress as dirty (this includes UserCompletedCustomActions).
     """
-    if created:
+    if not created:
+        return None
+
+    if progress_queue.enabled():
+        progress_queue.mark_dirty(instance.user_id)
+    elif sender != UserCompletedCustomAction:
         dp = DailyProgress.objects.for_today(instance.user)
         dp.update_stats()
         dp.save()
@@ -140,23 +150,15 @@ def program_goals_changed(sender, instance, **kwargs):
 
 @receiver(pre_save, sender=DailyProgress, dispatch_uid='set_dp_checkin_streak')
 def set_dp_checkin_streak(sender, instance, raw, using, **kwargs):
-    """Query for yesterday's checkin streak value and add 1 whenever a
-    DailyProgress object is saved."""
-    if instance.created_on:
-        yesterday = instance.created_on - timedelta(days=1)
-    else:
-        yesterday = timezone.now() - timedelta(days=1)
-    yesterday = local_day_range(instance.user, yesterday)
-
-    # See what "yesterday's streak value was"
-    try:
-        streak = DailyProgress.objects.exclude(pk=instance.id).get(
-            user=instance.user,
-            created_on__range=yesterday
-        ).checkin_streak
-    except DailyProgress.DoesNotExist:
-        streak = 0
-    instance.checkin_streak = streak + 1
+    """When a DailyProgress object is created, record the user's check-in
+    for the day and store their current streak. Subsequent saves of the same
+    object don't change the streak."""
+    if raw or instance.pk is not None:
+        return
+    instance.checkin_streak = CheckinStreak.objects.checkin(
+        instance.user,
+        instance.created_on or timezone.now()
+    )
 
 
 @receiver(post_save, sender=Trigger, dispatch_uid="custom-trigger-updated")
@@ -194,6 +196,73 @@ def clean_content(sender, instance, raw, using, **kwargs):
             setattr(instance, field, func(getattr(instance, field)))
 
 
+# NOTE: This must be connected after `clean_content`, so we render the cleaned
+# markdown.
+@receiver(pre_save, sender=Action, dispatch_uid="render-content-markdown")
+@receiver(pre_save, sender=Goal, dispatch_uid="render-content-markdown")
+@receiver(pre_save, sender=Category, dispatch_uid="render-content-markdown")
+def render_content_markdown(sender, instance, raw, using, **kwargs):
+    """Store the rendered HTML for the object's markdown fields, if they've
+    changed since they were last rendered.
+
+    NOTE: a save with `update_fields` won't write the HTML unless it's listed;
+    the `render_markdown` command finds (and fixes) those stale renders.
+
+    """
+    if not raw and rendering.is_stale(instance):
+        rendering.render(instance)
+
+
+@receiver(post_save, sender=Trigger, dispatch_uid="trigger-content-version")
+@receiver(post_delete, sender=Trigger, dispatch_uid="trigger-content-version")
+@receiver(post_save, sender=Action, dispatch_uid="action-content-version")
+@receiver(post_delete, sender=Action, dispatch_uid="action-content-version")
+@receiver(post_save, sender=Goal, dispatch_uid="goal-content-version")
+@receiver(post_delete, sender=Goal, dispatch_uid="goal-content-version")
+@receiver(post_save, sender=Category, dispatch_uid="category-content-version")
+@receiver(post_delete, sender=Category, dispatch_uid="category-content-version")
+@receiver(m2m_changed, sender=Action.goals.through, dispatch_uid="action-goals-content-version")
+@receiver(m2m_changed, sender=Goal.categories.through, dispatch_uid="goal-categories-content-version")
+@receiver(m2m_changed, sender=Category.organizations.through, dispatch_uid="category-organizations-content-version")
+@receiver(m2m_changed, sender=Category.hidden_from_organizations.through, dispatch_uid="category-hidden-content-version")
+@receiver(post_save, sender=Program, dispatch_uid="program-content-version")
+@receiver(post_delete, sender=Program, dispatch_uid="program-content-version")
+@receiver(m2m_changed, sender=Program.categories.through, dispatch_uid="program-categories-content-version")
+def bump_content_version(sender, instance, **kwargs):
+    """Public content has changed, so bump the content version (which
+    invalidates the cached API responses; see goals.response_cache).
+
+    Custom (user-owned) Triggers aren't public content, so they're ignored.
+    Organizations and Programs aren't either, but the public list of
+    Categories is filtered on them.
+
+    """
+    action = kwargs.get('action')  # For m2m_changed, e.g. pre_add, post_add
+    if sender == Trigger and instance.user_id:
+        return
+    if action is None or action.startswith('post_'):
+        response_cache.bump_content_version()
+
+
+@receiver(post_save, sender=Trigger, dispatch_uid="trigger-user-data")
+@receiver(post_delete, sender=Trigger, dispatch_uid="trigger-user-data")
+@receiver(post_save, sender=CustomAction, dispatch_uid="customaction-user-data")
+@receiver(post_delete, sender=CustomAction, dispatch_uid="customaction-user-data")
+@receiver(post_save, sender=CustomGoal, dispatch_uid="customgoal-user-data")
+@receiver(post_delete, sender=CustomGoal, dispatch_uid="customgoal-user-data")
+@receiver(post_save, sender=UserAction, dispatch_uid="useraction-user-data")
+@receiver(post_delete, sender=UserAction, dispatch_uid="useraction-user-data")
+@receiver(post_save, sender=UserGoal, dispatch_uid="usergoal-user-data")
+@receiver(post_delete, sender=UserGoal, dispatch_uid="usergoal-user-data")
+@receiver(post_save, sender=UserCategory, dispatch_uid="usercategory-user-data")
+@receiver(post_delete, sender=UserCategory, dispatch_uid="usercategory-user-data")
+def bump_user_data_sections(sender, instance, **kwargs):
+    """Invalidate the cached sections of the user's data (for the User Data
+    api; see userprofile.data_sections) that include the changed object."""
+    if instance.user_id:
+        data_sections.bump_for_model(instance.user_id, sender.__name__)
+
+
 @receiver(post_delete, sender=Action)
 @receiver(post_delete, sender=Goal)
 @receiver(post_delete, sender=Category)
@@ -358,6 +427,76 @@ def user_adopted_content(sender, instance, created, raw, using, **kwargs):
         metric(key, category="User Interactions")
 
 
+@receiver(post_save, sender=UserAction, dispatch_uid="sync-sequence-state")
+@receiver(post_delete, sender=UserAction, dispatch_uid="sync-sequence-state")
+@receiver(post_save, sender=UserGoal, dispatch_uid="sync-sequence-state")
+@receiver(post_delete, sender=UserGoal, dispatch_uid="sync-sequence-state")
+@receiver(post_save, sender=UserCompletedAction, dispatch_uid="sync-sequence-state")
+@receiver(post_delete, sender=UserCompletedAction, dispatch_uid="sync-sequence-state")
+def sync_sequence_state(sender, instance, using, **kwargs):
+    """Keep the user's SequenceState up to date when they add or remove
+    content, or when they complete an Action.
+
+    Existing UserActions are saved constantly (e.g. to update their trigger
+    dates) without changing the sequence, so we only care about new ones.
+
+    """
+    if sender == UserAction and kwargs.get('created') is False:
+        return
+    if kwargs.get('raw'):
+        return
+    SequenceState.objects.update_for(instance.user)
+
+
+@receiver(post_save, sender=Action, dispatch_uid="reset-sequence-state")
+@receiver(post_save, sender=Goal, dispatch_uid="reset-sequence-state")
+def reset_sequence_state(sender, instance, created, raw, using, **kwargs):
+    """When an Action or Goal is saved, its state or sequence_order may have
+    changed, so remove the SequenceState for every user that selected it;
+    they're re-created the next time they're needed."""
+    if created or raw:
+        return
+    if sender == Action:
+        users = UserAction.objects.filter(action=instance)
+    else:
+        users = UserGoal.objects.filter(goal=instance)
+    users = users.values_list('user', flat=True)
+    SequenceState.objects.filter(user__in=users).delete()
+
+
+@receiver(post_save, sender=Action, dispatch_uid="invalidate-package-calendar")
+@receiver(pre_delete, sender=Action, dispatch_uid="invalidate-package-calendar")
+@receiver(m2m_changed, sender=Action.goals.through,
+          dispatch_uid="invalidate-package-calendar")
+def invalidate_package_calendar(sender, instance, **kwargs):
+    """Invalidate the cached calendars for packages containing an Action
+    whenever the Action (or its set of Goals) changes."""
+    from goals.package_calendar import invalidate, invalidate_for_action
+    if kwargs.get('raw'):
+        return
+    # For m2m changes, catch goals as they're added, or before they're removed
+    if kwargs.get('action') not in [None, 'post_add', 'pre_remove', 'pre_clear']:
+        return
+    if isinstance(instance, Action):
+        invalidate_for_action(instance)
+    else:
+        # Reverse m2m changes (e.g. goal.action_set.add(...)); this is a Goal.
+        invalidate(instance.categories.values_list('id', flat=True))
+
+
+@receiver(post_save, sender=Trigger, dispatch_uid="invalidate-package-calendar")
+def invalidate_package_calendar_for_trigger(sender, instance, raw, **kwargs):
+    """Invalidate the cached calendars for packages containing the Action for
+    which this is the default trigger."""
+    from goals.package_calendar import invalidate_for_action
+    if raw or instance.user_id:
+        return
+    try:
+        invalidate_for_action(instance.action_default)
+    except ObjectDoesNotExist:
+        pass
+
+
 @receiver(post_save, sender=PackageEnrollment, dispatch_uid="notifiy_for_new_package")
 def notify_for_new_package(sender, instance, created, **kwargs):
     """Create and schedule a GCMMEssage for users that have a device registered,
@@ -365,12 +504,18 @@ def notify_for_new_package(sender, instance, created, **kwargs):
 
     """
     if created and instance.user.gcmdevice_set.exists():
-        from notifications.models import GCMMessage
-        GCMMessage.objects.create(
-            user=instance.user,
-            title="You've been enrolled.",
-            message="Welcome to {0}".format(instance.category.title),
-            deliver_on=timezone.now(),
-            obj=instance,
-            priority=GCMMessage.HIGH
-        )
+        notify_enrolled(instance)
+
+
+def notify_enrolled(enrollment):
+    """Create a GCMMessage telling the user that they've been enrolled in the
+    PackageEnrollment's package; the user must have a registered device."""
+    from notifications.models import GCMMessage
+    GCMMessage.objects.create(
+        user=enrollment.user,
+        title="You've been enrolled.",
+        message="Welcome to {0}".format(enrollment.category.title),
+        deliver_on=timezone.now(),
+        obj=enrollment,
+        priority=GCMMessage.HIGH
+    )
@@ -20,6 +20,7 @@ from recurrence.fields import RecurrenceField
 from utils.user_utils import local_day_range, local_now, to_localtime, user_timezone
 
 from ..managers import TriggerManager
+from ..recurrences import compile_recurrences
 
 
 class Trigger(models.Model):
@@ -343,6 +344,11 @@ class Trigger(models.Model):
         else:
             return None
 
+    def compiled_recurrences(self, dtstart, dtend=None, serialized=None):
+        """Return a (cached) CompiledRecurrence for this trigger's recurrences
+        beginning at `dtstart`. See goals.recurrences."""
+        return compile_recurrences(self.recurrences, dtstart, dtend, serialized)
+
     def recurrences_as_text(self):
         if self.recurrences:
             result = ''
@@ -433,24 +439,20 @@ class Trigger(models.Model):
         if begin is None:
             begin = self.get_alert_time(tz)  # "today's" alert time.
         end = begin + timedelta(days=days)  # alerts a month in the future
-        dates = list(self.recurrences.occurrences(
-            dtstart=begin,
-            dtend=end
-        ))
+        dates = list(self.compiled_recurrences(begin, end))
 
         # Since the dtstart argument to `occurences` means that we _always_
         # include that date in the list, we now need to filter out any dates
         # that shouldn't occur on given days. This is a dirty hack.
-        def _filter_days(d):
-            recurrences_text = self.recurrences_as_text().lower()
-            dow = d.strftime("%A").lower()
-            if recurrences_text.startswith("weekly") and dow not in recurrences_text:
-                return False
-            return True
-        dates = list(filter(_filter_days, dates))
+        recurrences_text = self.recurrences_as_text().lower()
+        if recurrences_text.startswith("weekly"):
+            dates = [
+                d for d in dates
+                if d.strftime("%A").lower() in recurrences_text
+            ]
 
         # IF our recurrences are empty, just keep the first date.
-        if self.recurrences_as_text() == '':
+        if recurrences_text == '':
             dates = dates[0:1]
 
         # Return only dates matching "today" or later.
@@ -511,7 +513,16 @@ class Trigger(models.Model):
         if self.is_dynamic:
             return self.dynamic_trigger_date(user=user)
 
-        tz = self.get_tz(user=user)
+        return self.next_in_timezone(self.get_tz(user=user))
+
+    def next_in_timezone(self, tz):
+        """Generate the next date for this (non-dynamic) Trigger in the given
+        timezone. This is the user-independent part of `next()`: it doesn't
+        check for completed actions, and it ignores dynamic triggers.
+
+        Returns a datetime object in the given timezone, or None.
+
+        """
         alert_on = self.get_alert_time(tz)
         now = timezone.now().astimezone(tz)
         recurrences = self.serialized_recurrences()
@@ -522,10 +533,13 @@ class Trigger(models.Model):
 
         # HACK: If we've stacked a number of RRULEs, let's generate a list of
         # dates in the recurrence (30 days out & starting with the current
-        # time), then pick the earliest one.
+        # day), then pick the earliest one.
         elif recurrences and "\n" in recurrences:
-            # Generate some dates, keeping only the future ones
-            dates = [dt for dt in self.get_occurences(begin=now) if dt > now]
+            # Generate some dates, keeping only the future ones. NOTE: they
+            # start at the beginning of the day (rather than `now`), so the
+            # compiled recurrences are cached for the rest of the day.
+            today = now.replace(hour=0, minute=0, second=0, microsecond=0)
+            dates = [dt for dt in self.get_occurences(begin=today) if dt > now]
             # Then recombine them all with the trigger time. ugh. :(
             dates = [self._combine(self.time, date) for date in dates]
             if len(dates) > 0:
@@ -544,7 +558,8 @@ class Trigger(models.Model):
             # In order to support things like WEEKLY recurrences, we need to
             # generate a large-enough rante of dates.
             end = now + timedelta(days=60)
-            dates = self.recurrences.between(now, end, dtstart=start_date)
+            dates = self.compiled_recurrences(start_date, serialized=recurrences)
+            dates = dates.between(now, end)
             if len(dates) > 0:
                 return dates[0]
             else:
@@ -552,11 +567,10 @@ class Trigger(models.Model):
 
         # Return the next value in the recurrence
         elif recurrences and alert_on:
-            return self.recurrences.after(
-                now,  # The next recurrence after the current time.
-                inc=True,  # return the current time if it matches the recurrence.
-                dtstart=alert_on  # The alert time.
-            )
+            # The next recurrence after the current time (or the current time
+            # if it matches the recurrence), starting from the alert time.
+            compiled = self.compiled_recurrences(alert_on, serialized=recurrences)
+            return compiled.after(now, inc=True)
 
         # No recurrence or not a time-pased Trigger.
         return None
@@ -580,11 +594,7 @@ class Trigger(models.Model):
             today = today.replace(tzinfo=None)
             start = today - timedelta(days=lookback)
 
-            dates = self.recurrences.between(
-                after=start,
-                before=today,
-                dtstart=start,
-            )
+            dates = self.compiled_recurrences(start).between(start, today)
             if len(dates):
                 dt = max(dates)
                 dt = datetime.combine(dt, self.time.replace(tzinfo=None))
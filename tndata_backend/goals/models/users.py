@@ -234,6 +234,8 @@ class UserAction(models.Model):
     class Meta:
         ordering = ['user', 'next_trigger_date', 'action']
         unique_together = ("user", "action")
+        # For keyset pagination of a user's actions (see utils.pagination).
+        index_together = [("user", "id")]
         verbose_name = "User Action"
         verbose_name_plural = "User Actions"
 
@@ -302,8 +304,16 @@ class UserAction(models.Model):
 
     @property
     def next_in_sequence(self):
-        """Is this action the next in sequence. Returns True or False."""
-        next_actions = self.user.useraction_set.next_in_sequence(published=True)
+        """Is this action the next in sequence. Returns True or False.
+
+        NOTE: bulk operations (see `goals.refresh`) may compute this for many
+        objects at once and stash the result in `_next_in_sequence`.
+
+        """
+        if hasattr(self, "_next_in_sequence"):
+            return self._next_in_sequence
+        from ..sequence import get_useractions_in_sequence
+        next_actions = get_useractions_in_sequence(self.user)
         next_actions = next_actions.values_list("pk", flat=True)
         return self.id in next_actions
 
@@ -339,9 +349,11 @@ class UserAction(models.Model):
             # converting it back to the users local timezone
             trigger_times.append(to_localtime(self.next_trigger_date, self.user))
 
-        # For all non-dynamic triggers, we just regenerate a time.
+        # For all non-dynamic triggers, we just regenerate a time (default
+        # triggers may be shared by all users in the same timezone).
         if trigger and not is_dynamic:
-            trigger_times.append(trigger.next(user=self.user))
+            from ..shared_triggers import shared_next
+            trigger_times.append(shared_next(trigger, self.user))
 
         # Pick the "next up" trigger from our list of possibilities.
         try:
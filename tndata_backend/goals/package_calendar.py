@@ -0,0 +1,152 @@
+"""
+Builds (and caches) the data for a package's calendar view.
+
+Rendering `package_calendar` used to generate the occurrences for every
+Action in the package (`Trigger.get_occurences`) and then, in the template,
+loop over all of those occurrences for every day on the calendar. For large
+packages that took seconds.
+
+`build_calendar` instead does the work once, producing a matrix of weeks,
+where each day includes the (already sorted) list of occurrences for that
+day. Results are cached using a key that includes the package's content
+version. That version is bumped (see `invalidate`) whenever an Action in the
+package, its default Trigger, or its set of Goals changes, so cached
+calendars are never stale.
+
+Cached entries are plain dicts (not model instances), so they're cheap to
+store and load.
+
+"""
+from calendar import Calendar
+from collections import defaultdict
+
+from django.core.cache import cache
+from django.utils import timezone
+
+from utils.user_utils import local_now, user_timezone
+
+from .models import Action
+
+
+CACHE_KEY = "package-calendar-{category}-v{version}-{tz}-{start:%Y%m%d}-{today}"
+VERSION_KEY = "package-calendar-version-{category}"
+CACHE_TIMEOUT = 60 * 60 * 24  # 24 hours
+
+
+def content_version(category_id):
+    """Return the current content version for the given package."""
+    key = VERSION_KEY.format(category=category_id)
+    cache.add(key, 1, timeout=None)
+    return cache.get(key) or 1
+
+
+def invalidate(category_ids):
+    """Bump the content version for the given packages, which invalidates
+    all of their cached calendars."""
+    for category_id in set(category_ids):
+        if category_id is None:
+            continue
+        key = VERSION_KEY.format(category=category_id)
+        cache.add(key, 1, timeout=None)
+        try:
+            cache.incr(key)
+        except ValueError:  # The key expired/was evicted in the meantime.
+            cache.set(key, 2, timeout=None)
+
+
+def invalidate_for_action(action):
+    """Invalidate the calendars for every package containing the Action."""
+    invalidate(action.goals.values_list('categories', flat=True))
+
+
+def _entry(action, dt, stop_counter, user):
+    """Describe a single occurrence of an Action's reminder."""
+    trigger = action.default_trigger
+    return {
+        'date': dt.date(),
+        'dt': dt,
+        'stop_counter': stop_counter,
+        'action_id': action.id,
+        'title': "{}".format(action),
+        'update_url': action.get_update_url(),
+        'absolute_url': action.get_absolute_url(),
+        'goal_ids': [goal.id for goal in action.goals.all()],
+        'is_relative': trigger.is_relative,
+        'time': trigger.time,
+        'trigger_date': trigger.trigger_date,
+        'recurrences_text': trigger.recurrences_as_text(),
+        'stop_on_complete': trigger.stop_on_complete,
+    }
+
+
+def occurrences(category, user, start):
+    """Return a list of occurrences (dicts) for every action in the package
+    (that has a valid default trigger), sorted by date."""
+    # Include recurrences for actions that have both a default trigger AND
+    # where those triggers have a time (otherwise they're essentially invalid)
+    actions = Action.objects.filter(
+        goals__categories=category,
+        default_trigger__isnull=False,
+        default_trigger__time__isnull=False  # exclude invalid triggers
+    ).distinct()
+    actions = actions.select_related('default_trigger').prefetch_related('goals')
+
+    results = []
+    stop_on_completes = defaultdict(int)  # Action.id to number of iterations
+    for action in actions:
+        trigger = action.default_trigger
+        if trigger.is_relative:
+            # XXX: Temporarily set the trigger's start date, so this date
+            # gets used when generating recurrences (which is how this will
+            # work when a user selects the action). Additionally, we need to
+            # temporarily assign a user (the logged in user) to make this work.
+            trigger.user = user
+            trigger.trigger_date = trigger.relative_trigger_date(start)
+
+        for dt in trigger.get_occurences(days=31):
+            stop_counter = None  # A counter for the stop_on_complete triggers.
+            if trigger.stop_on_complete:
+                stop_on_completes[action.id] += 1
+                stop_counter = stop_on_completes[action.id]
+            results.append(_entry(action, dt, stop_counter, user))
+
+    return sorted(results, key=lambda e: e['dt'].strftime("%Y%m%d%H%M"))
+
+
+def build_calendar(category, user, start):
+    """Return a dict containing the calendar for the given package, starting
+    with the month containing `start` (a datetime in the user's timezone).
+
+    The `weeks` value is a list of weeks, each of which is a list of
+    (date, list of occurrences) tuples.
+
+    """
+    # Occurrences are limited to those from "today" (in the trigger's tz)
+    # on, so the key includes today's date (UTC and local).
+    today = "{:%Y%m%d}{:%Y%m%d}".format(timezone.now(), local_now(user))
+    key = CACHE_KEY.format(
+        category=category.id,
+        version=content_version(category.id),
+        tz=user_timezone(user),
+        start=start,
+        today=today,
+    )
+    data = cache.get(key)
+    if data is not None:
+        return data
+
+    entries = occurrences(category, user, start)
+    by_date = defaultdict(list)
+    for entry in entries:
+        by_date[entry['date']].append(entry)
+
+    # note: start calendar on suday (6)
+    cal = Calendar(firstweekday=6).monthdatescalendar(start.year, start.month)
+    data = {
+        'weeks': [[(day, by_date.get(day, [])) for day in week] for week in cal],
+        'first_day': cal[0][0],
+        'last_day': cal[-1][-1],
+        'contains_relative_reminders': any(e['is_relative'] for e in entries),
+    }
+    cache.set(key, data, timeout=CACHE_TIMEOUT)
+    return data
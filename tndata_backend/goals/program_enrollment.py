@@ -0,0 +1,130 @@
+"""
+Chunked enrollment of Program members in a Goal.
+
+When a Goal is published (or added to a Program's auto-enrolled goals), all
+of the members of its Programs get enrolled in it. This used to happen in a
+single background job: one failure stopped the whole job, and a large
+program tied up a worker for a long time.
+
+`enroll_program_members` now splits the members into fixed-size chunks. Each
+chunk is stored as a ProgramEnrollmentChunk (whose `key` identifies it) and
+is enrolled by its own job (`enroll_chunk`), so chunks run in parallel
+across workers. A chunk that's already done is never redone, so failed
+chunks (see `retry_failed`, or the `retry_program_enrollments` command) can
+be re-queued without repeating the rest.
+
+A job only claims a chunk that's pending or failed, so a duplicate (or
+re-queued) job can't enroll a chunk that another job is working on. A chunk
+that's been running for longer than `PROGRAM_ENROLLMENT_CHUNK_TIMEOUT`
+seconds is assumed to belong to a job that died, and can be claimed (and is
+re-queued by `retry_failed`) again.
+
+"""
+import logging
+import uuid
+
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.db.models import Count, F, Q
+from django.utils import timezone
+from django_rq import job
+
+from .models import ProgramEnrollmentChunk
+from .settings import (
+    PROGRAM_ENROLLMENT_CHUNK_SIZE,
+    PROGRAM_ENROLLMENT_CHUNK_TIMEOUT,
+)
+
+
+logger = logging.getLogger(__name__)
+
+
+def enroll_program_members(goal, chunk_size=PROGRAM_ENROLLMENT_CHUNK_SIZE):
+    """Create (and queue) the chunks needed to enroll all of the goal's
+    program members in it. Returns the batch id for the chunks."""
+    members = goal.program_set.filter(members__isnull=False)
+    member_ids = sorted(set(members.values_list('members', flat=True)))
+
+    batch = uuid.uuid4().hex
+    chunks = [
+        ProgramEnrollmentChunk(
+            key="{}-{}".format(batch, i // chunk_size),
+            batch=batch,
+            goal=goal,
+            user_ids=member_ids[i:i + chunk_size]
+        )
+        for i in range(0, len(member_ids), chunk_size)
+    ]
+    ProgramEnrollmentChunk.objects.bulk_create(chunks)
+    for chunk in chunks:
+        enroll_chunk.delay(chunk.key)
+    return batch
+
+
+def _stalled():
+    """Chunks that have been running for too long (their job likely died)."""
+    stale = timezone.now() - timedelta(seconds=PROGRAM_ENROLLMENT_CHUNK_TIMEOUT)
+    return Q(state=ProgramEnrollmentChunk.RUNNING, claimed_on__lt=stale)
+
+
+@job
+def enroll_chunk(key):
+    """Enroll the users in the given chunk in its goal. This does nothing if
+    the chunk has already been completed, or is being enrolled by another
+    job."""
+    # Claim the chunk.
+    claimable = Q(state__in=[
+        ProgramEnrollmentChunk.PENDING,
+        ProgramEnrollmentChunk.FAILED
+    ]) | _stalled()
+    claimed = ProgramEnrollmentChunk.objects.filter(claimable, key=key).update(
+        state=ProgramEnrollmentChunk.RUNNING,
+        attempts=F('attempts') + 1,
+        claimed_on=timezone.now()
+    )
+    if not claimed:
+        return
+
+    chunk = ProgramEnrollmentChunk.objects.select_related('goal').get(key=key)
+    try:
+        User = get_user_model()
+        for user in User.objects.filter(pk__in=chunk.user_ids).order_by('pk'):
+            chunk.goal.enroll(user)
+    except Exception as e:
+        logger.exception("Failed to enroll program chunk {}".format(key))
+        ProgramEnrollmentChunk.objects.filter(key=key).update(
+            state=ProgramEnrollmentChunk.FAILED,
+            error=str(e)
+        )
+        raise
+
+    ProgramEnrollmentChunk.objects.filter(key=key).update(
+        state=ProgramEnrollmentChunk.DONE,
+        error=''
+    )
+
+
+def get_progress(batch):
+    """Return a dict mapping each chunk state to the number of chunks (in the
+    given batch) in that state."""
+    progress = {state: 0 for state, _ in ProgramEnrollmentChunk.STATE_CHOICES}
+    counts = ProgramEnrollmentChunk.objects.filter(batch=batch)
+    counts = counts.values_list('state').annotate(Count('id')).order_by()
+    progress.update(dict(counts))
+    return progress
+
+
+def retry_failed(batch=None):
+    """Re-queue failed (or stalled) chunks, optionally only those in the given
+    batch. Returns the number of chunks that were queued."""
+    chunks = ProgramEnrollmentChunk.objects.filter(
+        Q(state=ProgramEnrollmentChunk.FAILED) | _stalled())
+    if batch:
+        chunks = chunks.filter(batch=batch)
+
+    keys = list(chunks.values_list('key', flat=True))
+    for key in keys:
+        enroll_chunk.delay(key)
+    return len(keys)
+
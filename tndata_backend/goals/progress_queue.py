@@ -0,0 +1,70 @@
+"""
+Debounced DailyProgress updates.
+
+When a user completes an action, `create_or_update_daily_progress` updates
+their DailyProgress (running `update_stats`) synchronously, in the API
+request. When the `goals-debounced-daily-progress` switch is active, the
+signal handler instead adds the user's id to a Redis set of "dirty" users
+(see `mark_dirty`).
+
+`recompute_dirty` (run every few seconds by the `process_daily_progress`
+management command) then takes the whole set and recomputes those users'
+DailyProgress in batches, using the set-based code in `goals.snapshots`.
+A user that completes many actions in a short period of time is recomputed
+once.
+
+The set is swapped out with a RENAME before it's processed, so users marked
+dirty in the meantime are kept for the next run. If a run fails, whatever it
+was working on is put back into the set by the next one.
+
+"""
+import waffle
+
+from django.contrib.auth import get_user_model
+from django_rq import get_connection
+from redis.exceptions import ResponseError
+
+
+SWITCH = 'goals-debounced-daily-progress'
+DIRTY_KEY = 'goals:dailyprogress:dirty'
+PROCESSING_KEY = 'goals:dailyprogress:processing'
+DEFAULT_BATCH_SIZE = 500
+
+
+def enabled():
+    return waffle.switch_is_active(SWITCH)
+
+
+def mark_dirty(user_id):
+    """Flag the user's DailyProgress as needing to be recomputed."""
+    get_connection('default').sadd(DIRTY_KEY, user_id)
+
+
+def take_dirty():
+    """Remove and return the list of dirty user ids (sorted)."""
+    conn = get_connection('default')
+
+    # Anything left over from a run that failed is still dirty.
+    if conn.exists(PROCESSING_KEY):
+        conn.sunionstore(DIRTY_KEY, DIRTY_KEY, PROCESSING_KEY)
+        conn.delete(PROCESSING_KEY)
+
+    try:
+        conn.rename(DIRTY_KEY, PROCESSING_KEY)
+    except ResponseError:  # There's nothing in the set.
+        return []
+    return sorted(int(user_id) for user_id in conn.smembers(PROCESSING_KEY))
+
+
+def recompute_dirty(batch_size=DEFAULT_BATCH_SIZE):
+    """Recompute today's DailyProgress for every dirty user. Returns the
+    number of users that were recomputed."""
+    from .snapshots import snapshot_daily_progress  # Avoid a circular import.
+
+    user_ids = take_dirty()
+    User = get_user_model()
+    for i in range(0, len(user_ids), batch_size):
+        users = User.objects.filter(id__in=user_ids[i:i + batch_size])
+        snapshot_daily_progress(users)
+    get_connection('default').delete(PROCESSING_KEY)
+    return len(user_ids)
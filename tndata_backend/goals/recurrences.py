@@ -0,0 +1,177 @@
+"""
+A process-local cache of compiled recurrence rules.
+
+Every call to a django-recurrence `Recurrence`'s `occurrences`, `after`, or
+`between` methods builds a brand new `dateutil.rrule.rruleset` and expands it
+from scratch. Triggers do this constantly (`Trigger.next`, `Trigger.previous`,
+`Trigger.get_occurences`), and most of the time they're expanding the *same*
+rules: thousands of users share an Action's default trigger, and they only
+differ by timezone.
+
+This module caches the compiled rruleset for a serialized set of rules and a
+starting date (`dtstart`, which carries the timezone) along with a sorted
+list of its occurrences for a rolling horizon (`RECURRENCE_CACHE_HORIZON`
+days past `dtstart`). Lookups within that horizon are just a bisect on the
+sorted list; anything beyond it falls back to the rruleset itself.
+
+Usage:
+
+    compiled = compile_recurrences(trigger.recurrences, dtstart=alert_on)
+    compiled.after(now, inc=True)
+    compiled.between(now, now + timedelta(days=30))
+
+Because the key includes a hash of the serialized rules, editing a Trigger's
+recurrences never returns stale results; old entries simply age out of the
+(LRU) cache. Setting `RECURRENCE_CACHE_SIZE = 0` disables caching entirely.
+
+"""
+import bisect
+import hashlib
+import threading
+
+from collections import OrderedDict
+from datetime import timedelta
+from itertools import islice, takewhile
+
+from recurrence import serialize as serialize_recurrences
+
+from .settings import RECURRENCE_CACHE_HORIZON, RECURRENCE_CACHE_SIZE
+
+
+# Never precompute more than this many occurrences for a single rruleset (this
+# keeps very frequent rules, e.g. FREQ=MINUTELY, from eating memory).
+MAX_PRECOMPUTED = 1000
+
+
+class CompiledRecurrence:
+    """A compiled rruleset plus a sorted list of its precomputed occurrences.
+
+    * If the rruleset has an end (`dtend`), *all* of its occurrences are
+      precomputed, and `horizon` is None.
+    * Otherwise, occurrences up to `horizon` are precomputed (or the first
+      `MAX_PRECOMPUTED` occurrences, in which case the horizon is pulled in
+      to the last of those).
+    * If `precompute` is False, nothing is precomputed and every lookup goes
+      straight to the rruleset (this is the uncached behavior).
+
+    The `after` and `between` methods have the same semantics as those on
+    `dateutil.rrule.rruleset`.
+
+    """
+    def __init__(self, recurrence, dtstart, dtend=None,
+                 horizon_days=RECURRENCE_CACHE_HORIZON, precompute=True):
+        self.rruleset = recurrence.to_dateutil_rruleset(dtstart, dtend)
+        self.dates = None
+        self.horizon = None
+        if precompute and dtend is not None:
+            self.dates = list(self.rruleset)
+        elif precompute:
+            self.horizon = dtstart + timedelta(days=horizon_days)
+            dates = takewhile(lambda d: d <= self.horizon, self.rruleset)
+            self.dates = list(islice(dates, MAX_PRECOMPUTED + 1))
+            if len(self.dates) > MAX_PRECOMPUTED:
+                self.dates = self.dates[:MAX_PRECOMPUTED]
+                self.horizon = self.dates[-1]
+
+    def _covers(self, dt):
+        """Are all occurrences up to the given date precomputed?"""
+        return self.dates is not None and (self.horizon is None or dt <= self.horizon)
+
+    def __iter__(self):
+        if self.dates is not None and self.horizon is None:
+            return iter(self.dates)
+        return iter(self.rruleset)
+
+    def after(self, dt, inc=False):
+        """Return the first occurrence after `dt` (or None)."""
+        if self._covers(dt):
+            if inc:
+                index = bisect.bisect_left(self.dates, dt)
+            else:
+                index = bisect.bisect_right(self.dates, dt)
+            if index < len(self.dates):
+                return self.dates[index]
+            elif self.horizon is None:
+                return None
+        return self.rruleset.after(dt, inc)
+
+    def between(self, after, before, inc=False):
+        """Return a list of the occurrences between `after` and `before`."""
+        if self._covers(before):
+            if inc:
+                start = bisect.bisect_left(self.dates, after)
+                end = bisect.bisect_right(self.dates, before)
+            else:
+                start = bisect.bisect_right(self.dates, after)
+                end = bisect.bisect_left(self.dates, before)
+            return self.dates[start:end]
+        return self.rruleset.between(after, before, inc)
+
+
+class RecurrenceCache:
+    """A thread-safe LRU cache of CompiledRecurrence objects.
+
+    Keys are (hash of the serialized rules, timezone, dtstart, dtend).
+
+    """
+    def __init__(self, maxsize=RECURRENCE_CACHE_SIZE,
+                 horizon_days=RECURRENCE_CACHE_HORIZON):
+        self.maxsize = maxsize
+        self.horizon_days = horizon_days
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._data)
+
+    def key(self, serialized, dtstart, dtend=None):
+        digest = hashlib.md5(serialized.encode('utf8')).hexdigest()
+        tzname = None
+        if dtstart.tzinfo is not None:
+            tzname = getattr(dtstart.tzinfo, 'zone', None) or str(dtstart.tzinfo)
+        return (digest, tzname, dtstart, dtend)
+
+    def get(self, recurrence, dtstart, dtend=None, serialized=None):
+        """Return a CompiledRecurrence for the given Recurrence object."""
+        if not self.maxsize:
+            return CompiledRecurrence(recurrence, dtstart, dtend, precompute=False)
+
+        if serialized is None:
+            serialized = serialize_recurrences(recurrence)
+        key = self.key(serialized, dtstart, dtend)
+
+        with self._lock:
+            compiled = self._data.get(key)
+            if compiled is not None:
+                self._data.move_to_end(key)
+                self.hits += 1
+                return compiled
+            self.misses += 1
+
+        # Compile outside of the lock; worst case two threads both do the work.
+        compiled = CompiledRecurrence(
+            recurrence, dtstart, dtend, horizon_days=self.horizon_days
+        )
+        with self._lock:
+            self._data[key] = compiled
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+        return compiled
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self.hits = 0
+            self.misses = 0
+
+
+# NOTE: This module-level cache is shared by all Triggers in the process.
+recurrence_cache = RecurrenceCache()
+
+
+def compile_recurrences(recurrence, dtstart, dtend=None, serialized=None):
+    """Return a (possibly cached) CompiledRecurrence for the given recurrence
+    starting at `dtstart`."""
+    return recurrence_cache.get(recurrence, dtstart, dtend, serialized=serialized)
@@ -0,0 +1,167 @@
+"""
+Bulk refreshing of UserAction trigger dates.
+
+Historically, `refresh_useractions` called `save()` on every stale UserAction.
+Each save re-queried the user's sequence of actions (`next_in_sequence`),
+re-computed the trigger dates, wrote every column of the row, and fired all
+of the UserAction `post_save` signals.
+
+The `refresh_useractions` function in this module instead works through a
+queryset in batches (ordered by id):
+
+1. Each batch is loaded with its related objects (`select_related`).
+2. The set of "next in sequence" UserActions is computed once per user per
+   batch, rather than once per UserAction.
+3. The new `next_trigger_date` / `prev_trigger_date` values are computed in
+   memory using the same code as `UserAction.save` (`_set_next_trigger_date`).
+4. Rows are written with a single UPDATE per distinct pair of values, which
+   are often shared: UserActions whose default trigger is the same and whose
+   users are in the same timezone end up with identical dates.
+
+Signals are skipped: for UserActions that already exist, the only `post_save`
+receiver that does any work is `create_relative_reminder`, so UserActions
+whose default trigger is relative (and have no custom trigger yet) are still
+saved the usual way.
+
+Progress can be checkpointed (the last processed id is kept in the cache) so
+an interrupted run can be resumed.
+
+"""
+from collections import defaultdict, namedtuple
+
+from django.core.cache import cache
+from django.utils import timezone
+from userprofile import data_sections
+
+from .models import UserAction
+from .sequence import get_useractions_in_sequence
+
+
+DEFAULT_BATCH_SIZE = 1000
+
+# The result of a call to `refresh_useractions`:
+# - processed: the number of UserActions that were examined
+# - updated: the number of UserActions written with a bulk UPDATE
+# - saved: the number of UserActions that were saved individually
+# - last_id: the id of the last processed UserAction (or None)
+RefreshResult = namedtuple('RefreshResult', ['processed', 'updated', 'saved', 'last_id'])
+
+
+def requires_save(useraction):
+    """Does this UserAction rely on its `post_save` signals when refreshed?
+    This is the case for relative reminders (see `create_relative_reminder`)
+    that haven't yet been given a custom trigger."""
+    default_trigger = useraction.default_trigger
+    return (
+        useraction.custom_trigger_id is None and
+        default_trigger is not None and
+        default_trigger.is_relative
+    )
+
+
+def _sequenced_ids(user):
+    """Return the set of UserAction ids that are next in sequence for the
+    given user; this is what `UserAction.next_in_sequence` checks."""
+    ids = get_useractions_in_sequence(user)
+    return set(ids.values_list('pk', flat=True))
+
+
+def refresh_batch(useractions, include=None):
+    """Refresh the trigger dates for a list of UserAction objects.
+
+    * include: (optional) a function that's given a User and returns the set
+      of that user's UserAction ids that should be refreshed. All others in
+      the list are skipped.
+
+    Returns a tuple of (updated, saved) counts.
+
+    """
+    now = timezone.now()
+    sequenced = {}  # user_id -> set of next-in-sequence UserAction ids
+    included = {}  # user_id -> set of ids to refresh
+    values = defaultdict(list)  # (next, prev) -> list of UserAction ids
+    user_ids = set()  # users whose UserActions are updated
+    saved = 0
+
+    for ua in useractions:
+        if include is not None:
+            if ua.user_id not in included:
+                included[ua.user_id] = include(ua.user)
+            if ua.id not in included[ua.user_id]:
+                continue
+
+        if requires_save(ua):
+            ua.save(update_triggers=True)
+            saved += 1
+            continue
+
+        if ua.user_id not in sequenced:
+            sequenced[ua.user_id] = _sequenced_ids(ua.user)
+        ua._next_in_sequence = ua.id in sequenced[ua.user_id]
+
+        ua._set_next_trigger_date()
+        values[(ua.next_trigger_date, ua.prev_trigger_date)].append(ua.id)
+        user_ids.add(ua.user_id)
+
+    updated = 0
+    for (next_date, prev_date), ids in values.items():
+        # NOTE: update() doesn't touch auto_now fields, but `stale()` relies
+        # on `updated_on`, so we set it explicitly (as save() would).
+        updated += UserAction.objects.filter(id__in=ids).update(
+            next_trigger_date=next_date,
+            prev_trigger_date=prev_date,
+            updated_on=now
+        )
+    for user_id in user_ids:
+        data_sections.bump(user_id, ['user_actions'])
+    return (updated, saved)
+
+
+def refresh_useractions(queryset, batch_size=DEFAULT_BATCH_SIZE, start_id=None,
+                        limit=None, include=None, checkpoint_key=None):
+    """Refresh `next_trigger_date` and `prev_trigger_date` for every
+    UserAction in the given queryset, working in batches ordered by id.
+
+    * batch_size: the number of UserActions loaded (and updated) at a time.
+    * start_id: only refresh UserActions whose id is greater than this value.
+    * limit: stop after examining this many UserActions.
+    * include: see `refresh_batch`.
+    * checkpoint_key: if given, the id of the last processed UserAction is
+      stored in the cache under this key after every batch (and removed once
+      the queryset is exhausted). When `start_id` is None, a stored
+      checkpoint is used as the starting point.
+
+    Returns a RefreshResult.
+
+    """
+    if start_id is None and checkpoint_key:
+        start_id = cache.get(checkpoint_key)
+
+    queryset = queryset.select_related(
+        'user__userprofile',
+        'action__default_trigger',
+        'custom_trigger',
+    ).order_by('id')
+
+    last_id = start_id
+    processed = updated = saved = 0
+    while limit is None or processed < limit:
+        size = batch_size if limit is None else min(batch_size, limit - processed)
+        batch = queryset
+        if last_id is not None:
+            batch = batch.filter(id__gt=last_id)
+        batch = list(batch[:size])
+        if not batch:
+            if checkpoint_key:
+                cache.delete(checkpoint_key)
+            break
+
+        num_updated, num_saved = refresh_batch(batch, include=include)
+        processed += len(batch)
+        updated += num_updated
+        saved += num_saved
+        last_id = batch[-1].id
+        if checkpoint_key:
+            cache.set(checkpoint_key, last_id, timeout=None)
+
+    return RefreshResult(processed, updated, saved, last_id)
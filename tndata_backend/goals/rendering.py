@@ -0,0 +1,52 @@
+"""
+Pre-rendered HTML for the markdown fields of Categories, Goals and Actions.
+
+Each markdown field (e.g. `description`) has a `<field>_html` column holding
+its rendered HTML, which is what the models' `rendered_<field>` properties
+(and so the serializers and templates) return. The HTML is rendered when the
+object is saved (see the `render_content_markdown` signal handler), so the
+markdown engine never runs while serving a request.
+
+Every object also stores a hash of its markdown source (`markdown_hash`). A
+render is stale when that no longer matches the source, e.g. after a bulk
+`update()` of a description; the `render_markdown` management command finds
+and re-renders those objects.
+
+"""
+from hashlib import md5
+
+from markdown import markdown
+
+
+# The markdown fields for each model.
+MARKDOWN_FIELDS = {
+    'Category': ('description', 'consent_summary', 'consent_more'),
+    'Goal': ('description', ),
+    'Action': ('description', 'more_info'),
+}
+
+
+def markdown_fields(obj):
+    return MARKDOWN_FIELDS[obj.__class__.__name__]
+
+
+def markdown_hash(obj, fields=None):
+    """Return a hash of the object's markdown source."""
+    fields = fields or markdown_fields(obj)
+    source = "\x00".join(getattr(obj, field) or '' for field in fields)
+    return md5(source.encode('utf8')).hexdigest()
+
+
+def is_stale(obj, fields=None):
+    """Is the object's rendered HTML out of date?"""
+    return obj.markdown_hash != markdown_hash(obj, fields)
+
+
+def render(obj, fields=None):
+    """Render the object's markdown fields into their `_html` columns (this
+    doesn't save the object). Returns a list of the updated field names."""
+    fields = fields or markdown_fields(obj)
+    for field in fields:
+        setattr(obj, "{}_html".format(field), markdown(getattr(obj, field) or ''))
+    obj.markdown_hash = markdown_hash(obj, fields)
+    return ["{}_html".format(field) for field in fields] + ['markdown_hash']
@@ -0,0 +1,121 @@
+"""
+A versioned cache of whole API responses for public content.
+
+The public Category, Goal, and Action endpoints return the same data to every
+anonymous user, so their serialized responses are cached (see
+`goals.mixins.ResponseCacheMixin`), keyed by:
+
+- the endpoint (the viewset and its action, e.g. `GoalViewSet.list`),
+- the api version,
+- the requested url (including its normalized query params), and
+- the current *content version*.
+
+The content version is a global counter that's bumped whenever public
+content changes: the signal handlers in `goals.models.signals` bump it when
+a Category, Goal, Action or default Trigger is saved or deleted (or when
+their relationships change), and so do the bulk state transitions in
+`goals.transitions`. Bumping the version invalidates every cached response
+at once; the stale entries simply expire.
+
+Cache hits & misses, and the time each hit saved (i.e. how long the cached
+response originally took to build), are recorded as metrics for each
+endpoint.
+
+Caching is enabled with the `goals-response-cache` switch.
+
+"""
+import time
+from hashlib import md5
+
+import waffle
+
+from django.core.cache import cache
+from redis_metrics import metric
+
+from . import settings
+
+
+RESPONSE_CACHE_SWITCH = 'goals-response-cache'
+CONTENT_VERSION_KEY = 'goals-content-version'
+RESPONSE_KEY = 'goals-response-{version}-{endpoint}-v{api_version}-{url}'
+METRICS_CATEGORY = 'Response Cache'
+
+
+def is_enabled():
+    return waffle.switch_is_active(RESPONSE_CACHE_SWITCH)
+
+
+def content_version():
+    """Return the current content version."""
+    version = cache.get(CONTENT_VERSION_KEY)
+    if version is None:
+        # Start from the current time, so a counter that's been evicted from
+        # the cache never restarts at a version that's already been used.
+        cache.add(CONTENT_VERSION_KEY, int(time.time()), None)
+        version = cache.get(CONTENT_VERSION_KEY)
+    return version
+
+
+def bump_content_version():
+    """Public content has changed; invalidate all of the cached responses."""
+    try:
+        cache.incr(CONTENT_VERSION_KEY)
+    except ValueError:  # No version yet (or a cache that doesn't do incr).
+        content_version()
+
+
+def endpoint_name(view):
+    return "{}.{}".format(view.__class__.__name__, view.action)
+
+
+def get_key(view, request):
+    """Return the cache key for the view's response to the given request, or
+    None if the response should not be cached.
+
+    Only GET requests from anonymous users are cached; authenticated users
+    may see content (e.g. packages) that's not public.
+
+    """
+    if request.method != 'GET' or request.user.is_authenticated():
+        return None
+    if not is_enabled():
+        return None
+
+    # Ignore the order of the query params.
+    params = sorted(
+        (name, sorted(values)) for name, values in request.query_params.lists()
+    )
+    url = "{}?{}".format(request.build_absolute_uri(request.path), params)
+    return RESPONSE_KEY.format(
+        version=content_version(),
+        endpoint=endpoint_name(view),
+        api_version=request.version,
+        url=md5(url.encode('utf8')).hexdigest(),
+    )
+
+
+def get_response(view, key):
+    """Return the cached response data for the key (or None), and record the
+    hit or miss."""
+    endpoint = endpoint_name(view)
+    cached = cache.get(key)
+    if cached is None:
+        metric('response-cache-miss', category=METRICS_CATEGORY)
+        metric('response-cache-miss {}'.format(endpoint), category=METRICS_CATEGORY)
+        return None
+
+    metric('response-cache-hit', category=METRICS_CATEGORY)
+    metric('response-cache-hit {}'.format(endpoint), category=METRICS_CATEGORY)
+    metric(
+        'response-cache-ms-saved {}'.format(endpoint),
+        num=cached['elapsed'],
+        category=METRICS_CATEGORY
+    )
+    return cached['data']
+
+
+def set_response(key, data, elapsed):
+    """Cache the response data. `elapsed` is the time it took to build the
+    response, in milliseconds."""
+    value = {'data': data, 'elapsed': int(elapsed)}
+    cache.set(key, value, settings.RESPONSE_CACHE_TIMEOUT)
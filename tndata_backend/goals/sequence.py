@@ -3,7 +3,28 @@ Tools/utils/playground for Goal/Action sequences
 
 """
 from collections import defaultdict
-from goals.models import UserCompletedAction
+
+import waffle
+
+from goals.models import SequenceState, UserCompletedAction
+
+
+# When active, sequences are looked up using the SequenceState table.
+SEQUENCE_STATE_SWITCH = 'goals-sequence-state'
+
+
+def use_sequence_state():
+    return waffle.switch_is_active(SEQUENCE_STATE_SWITCH)
+
+
+def get_useractions_in_sequence(user):
+    """Return a queryset of the user's UserActions that are up next in their
+    sequence of Actions (regardless of Goals). This is the set of objects for
+    which `UserAction.next_in_sequence` is True."""
+    if use_sequence_state():
+        SequenceState.objects.for_user(user)
+        return user.useraction_set.in_sequence(goals=False)
+    return user.useraction_set.next_in_sequence(published=True)
 
 
 def get_next_useractions_in_sequence(user, goal=None, category=None):
@@ -12,6 +33,10 @@ def get_next_useractions_in_sequence(user, goal=None, category=None):
     has completed the Action or all actions within the Goal.
 
     """
+    if goal is None and category is None and use_sequence_state():
+        SequenceState.objects.for_user(user)
+        return user.useraction_set.in_sequence()
+
     # Goals that are 'up next' (lowest sequence number that is not completed)
     if category:
         goals = user.usergoal_set.next_in_sequence(
@@ -1,6 +1,8 @@
 from django.conf import settings
+from django.utils import timezone
 from rest_framework import serializers
 from utils.mixins import TombstoneMixin
+from utils.prefetch import PrefetchPlan
 from utils.serializers import ObjectTypeModelSerializer
 from utils.serializer_fields import ReadOnlyDatetimeField
 
@@ -13,6 +15,7 @@ from ..models import (
     Program,
     Trigger,
     UserAction,
+    UserCompletedAction,
     UserGoal,
     UserCategory,
 )
@@ -113,6 +116,8 @@ class ActionSerializer(ObjectTypeModelSerializer):
     html_description = serializers.ReadOnlyField(source="rendered_description")
     html_more_info = serializers.ReadOnlyField(source="rendered_more_info")
 
+    prefetch_plan = PrefetchPlan(prefetch_related=['goals'])
+
     class Meta:
         model = Action
         fields = (
@@ -141,6 +146,8 @@ class UserGoalSerializer(ObjectTypeModelSerializer):
     editable = serializers.ReadOnlyField(source='custom_triggers_allowed')
     engagement_rank = serializers.SerializerMethodField(read_only=True)
 
+    prefetch_plan = PrefetchPlan(select_related=['user', 'goal'])
+
     class Meta:
         model = UserGoal
         fields = (
@@ -153,9 +160,7 @@ class UserGoalSerializer(ObjectTypeModelSerializer):
     def to_representation(self, obj):
         """Include a serialized Goal object in the result."""
         results = super().to_representation(obj)
-        goal_id = results.get('goal', None)
-        goal = Goal.objects.get(pk=goal_id)
-        results['goal'] = GoalSerializer(goal).data
+        results['goal'] = GoalSerializer(obj.goal).data
         return results
 
     def get_engagement_rank(self, obj):
@@ -172,6 +177,21 @@ class UserActionSerializer(ObjectTypeModelSerializer):
     next_reminder = ReadOnlyDatetimeField()
     primary_usergoal = serializers.SerializerMethodField(read_only=True)
 
+    prefetch_plan = PrefetchPlan(
+        select_related=[
+            'user__userprofile', 'custom_trigger', 'action__default_trigger',
+            'primary_goal',
+        ],
+        extra_select={
+            # The id of the user's UserGoal for the primary goal.
+            'primary_usergoal_id': (
+                "SELECT ug.id FROM goals_usergoal ug "
+                "WHERE ug.user_id = goals_useraction.user_id "
+                "AND ug.goal_id = goals_useraction.primary_goal_id"
+            ),
+        },
+    ) + ActionSerializer.prefetch_plan.nested('action')
+
     class Meta:
         model = UserAction
         fields = (
@@ -187,6 +207,8 @@ class UserActionSerializer(ObjectTypeModelSerializer):
         super().__init__(*args, **kwargs)
 
     def get_primary_usergoal(self, obj):
+        if hasattr(obj, 'primary_usergoal_id'):  # See prefetch_plan
+            return obj.primary_usergoal_id
         result = obj.get_primary_usergoal(only='id')
         if result:
             return result.id
@@ -208,3 +230,30 @@ class UserActionSerializer(ObjectTypeModelSerializer):
         if primary_goal:
             validated_data['primary_goal'] = primary_goal
         return super().create(validated_data)
+
+
+class CompletionSerializer(serializers.Serializer):
+    """Validates a single item in a batch of completions (see
+    `goals.completions.complete_batch`). Each item includes either a
+    `useraction` or a `customaction` id, and optionally a `state` (which
+    defaults to `completed`), the `timestamp` at which the user completed the
+    object (which defaults to now), and the `length` of a snooze."""
+    useraction = serializers.IntegerField(required=False)
+    customaction = serializers.IntegerField(required=False)
+    state = serializers.ChoiceField(
+        choices=UserCompletedAction.STATE_CHOICES,
+        default=UserCompletedAction.COMPLETED
+    )
+    timestamp = serializers.DateTimeField(required=False)
+    length = serializers.CharField(required=False, max_length=32)
+
+    def validate(self, data):
+        if bool(data.get('useraction')) == bool(data.get('customaction')):
+            raise serializers.ValidationError(
+                "Include either a useraction or a customaction"
+            )
+        # Completions can't happen in the future.
+        now = timezone.now()
+        if data.get('timestamp') is None or data['timestamp'] > now:
+            data['timestamp'] = now
+        return data
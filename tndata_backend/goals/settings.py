@@ -59,3 +59,47 @@ DEFAULT_EVENING_GOAL_NOTIFICATION_TEXT = getattr(
     'DEFAULT_EVENING_GOAL_TRIGGER_RRULE',
     'Check in to track your progress'
 )
+
+# -----------------------------------------------------------------------------
+# Compiled recurrence cache (see goals.recurrences). The maximum number of
+# compiled rulesets kept per process (0 disables the cache), and the number of
+# days of occurrences that are precomputed for each.
+# -----------------------------------------------------------------------------
+RECURRENCE_CACHE_SIZE = getattr(
+    default_settings,
+    'RECURRENCE_CACHE_SIZE',
+    2048
+)
+RECURRENCE_CACHE_HORIZON = getattr(
+    default_settings,
+    'RECURRENCE_CACHE_HORIZON',
+    90
+)
+
+# -----------------------------------------------------------------------------
+# Program enrollment (see goals.program_enrollment). The number of program
+# members enrolled by each background job.
+# -----------------------------------------------------------------------------
+PROGRAM_ENROLLMENT_CHUNK_SIZE = getattr(
+    default_settings,
+    'PROGRAM_ENROLLMENT_CHUNK_SIZE',
+    100
+)
+
+# Seconds after which a chunk that's still running is assumed to belong to a
+# job that died, so it can be claimed again (e.g. by `retry_failed`).
+PROGRAM_ENROLLMENT_CHUNK_TIMEOUT = getattr(
+    default_settings,
+    'PROGRAM_ENROLLMENT_CHUNK_TIMEOUT',
+    3600
+)
+
+# -----------------------------------------------------------------------------
+# Public content response cache (see goals.response_cache). The number of
+# seconds a cached API response is kept.
+# -----------------------------------------------------------------------------
+RESPONSE_CACHE_TIMEOUT = getattr(
+    default_settings,
+    'RESPONSE_CACHE_TIMEOUT',
+    60 * 60
+)
@@ -0,0 +1,183 @@
+"""
+Shared, per-timezone trigger dates for default (non-custom) Triggers.
+
+Most UserActions use their Action's `default_trigger`, so thousands of users
+evaluate exactly the same rules and time; the only thing that differs is their
+timezone. Rather than evaluating `Trigger.next` once per UserAction, we
+evaluate each default Trigger once per timezone and store the result in the
+cache, where it's shared by every user in that timezone.
+
+Each cached entry is a tuple of `(valid_from, valid_until, next_date)`. The
+next date for a trigger only changes once that date has passed or when the
+(local) day rolls over, so an entry is valid from the time it was computed
+until the earliest of:
+
+- the next date itself,
+- the end of the day in the trigger's timezone,
+- the end of the day in UTC.
+
+Keys include a fingerprint of the trigger's schedule, so editing a Trigger
+never returns stale dates. Entries are populated lazily (on a miss) and by
+the `precompute_default_triggers` management command, which warms the cache
+for every default Trigger and every timezone in use.
+
+Only triggers whose schedule doesn't depend on the user are shared: dynamic
+triggers (and those with a `time_of_day`) get per-user randomization, and
+custom triggers belong to a single user. Those (and everything else, when the
+`goals-shared-default-triggers` switch is off) fall back to `Trigger.next`.
+
+"""
+import hashlib
+import pytz
+
+from datetime import datetime, time
+
+from django.core.cache import cache
+from django.utils import timezone
+
+import waffle
+
+from utils.user_utils import user_timezone
+
+from .models import Trigger
+
+
+SWITCH = 'goals-shared-default-triggers'
+CACHE_KEY = "default-trigger-{id}-{fingerprint}-{tz}"
+
+# NOTE: Entries carry their own validity window (see above), so the cache
+# timeout only needs to be long enough to outlast that window.
+CACHE_TIMEOUT = 24 * 60 * 60  # 24 hours
+
+
+def is_shareable(trigger):
+    """Can this trigger's next date be shared by all users in a timezone?"""
+    return (
+        trigger is not None and
+        trigger.user_id is None and
+        not trigger.time_of_day and
+        not trigger.frequency
+    )
+
+
+def fingerprint(trigger):
+    """A hash of the fields that define a trigger's schedule."""
+    value = "{}|{}|{}|{}|{}".format(
+        trigger.time,
+        trigger.trigger_date,
+        trigger.serialized_recurrences(),
+        trigger.disabled,
+        trigger.start_when_selected,
+    )
+    return hashlib.md5(value.encode('utf8')).hexdigest()
+
+
+def _cache_key(trigger, tz):
+    return CACHE_KEY.format(id=trigger.id, fingerprint=fingerprint(trigger), tz=tz)
+
+
+def _end_of_day(dt):
+    return datetime.combine(dt.date(), time.max).replace(tzinfo=None)
+
+
+def compute(trigger, tz):
+    """Evaluate a trigger for the given timezone. Returns a tuple of the form
+    (valid_from, valid_until, next_date), where all values are aware datetimes
+    and `next_date` may be None."""
+    if isinstance(tz, str):
+        tz = pytz.timezone(tz)
+    next_date = None if trigger.disabled else trigger.next_in_timezone(tz)
+
+    # NOTE: Calculate `now` *after* generating the date, so it's always
+    # later than the time used by the Trigger.
+    now = timezone.now()
+    local_now = now.astimezone(tz)
+    candidates = [
+        tz.localize(_end_of_day(local_now)),
+        timezone.make_aware(_end_of_day(now), timezone.utc),
+    ]
+    if next_date is not None:
+        candidates.append(next_date)
+    return (now, min(candidates), next_date)
+
+
+def next_in_timezone(trigger, tz):
+    """Return the shared next date for a default trigger in the given timezone
+    (a timezone name), computing & caching it if necessary."""
+    key = _cache_key(trigger, tz)
+    now = timezone.now()
+    entry = cache.get(key)
+    if entry is not None:
+        valid_from, valid_until, next_date = entry
+        if valid_from <= now < valid_until:
+            return next_date
+
+    entry = compute(trigger, tz)
+    if entry[0] < entry[1]:
+        cache.set(key, entry, timeout=CACHE_TIMEOUT)
+    return entry[2]
+
+
+def shared_next(trigger, user):
+    """A drop-in replacement for `trigger.next(user=user)` that uses the
+    shared, per-timezone dates when possible.
+
+    Returns a datetime in the user's timezone or None.
+
+    """
+    if not (waffle.switch_is_active(SWITCH) and is_shareable(trigger)):
+        return trigger.next(user=user)
+
+    # Completions are still specific to the user.
+    if trigger._stopped_by_completion(user):
+        return None
+    return next_in_timezone(trigger, user_timezone(user))
+
+
+def timezones_in_use():
+    """Return the set of distinct timezones in our users' profiles."""
+    from userprofile.models import UserProfile
+    timezones = UserProfile.objects.filter(user__is_active=True)
+    timezones = timezones.values_list('timezone', flat=True).distinct()
+    return set(tz for tz in timezones if tz in pytz.all_timezones_set)
+
+
+def default_triggers():
+    """Return a queryset of the shareable default triggers on published
+    Actions."""
+    triggers = Trigger.objects.default(disabled=False).filter(
+        action_default__state='published',
+        time_of_day__isnull=True,
+        frequency__isnull=True,
+    )
+    return triggers.distinct()
+
+
+def precompute(triggers=None, timezones=None):
+    """Evaluate each default trigger once per timezone, and cache the results.
+
+    Returns the number of (trigger, timezone) pairs that were cached.
+
+    """
+    if triggers is None:
+        triggers = default_triggers()
+    if timezones is None:
+        timezones = timezones_in_use()
+
+    count = 0
+    values = {}
+    for trigger in triggers:
+        if not is_shareable(trigger):
+            continue
+        for tz in timezones:
+            entry = compute(trigger, tz)
+            if entry[0] < entry[1]:
+                values[_cache_key(trigger, tz)] = entry
+                count += 1
+        # Set these in batches so we don't wait on one round-trip per value.
+        if len(values) >= 500:
+            cache.set_many(values, timeout=CACHE_TIMEOUT)
+            values = {}
+    if values:
+        cache.set_many(values, timeout=CACHE_TIMEOUT)
+    return count
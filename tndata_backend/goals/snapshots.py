@@ -0,0 +1,251 @@
+"""
+Set-based DailyProgress snapshots.
+
+The `daily_progress_snapshot` command used to loop over every user, fetching
+or creating their DailyProgress for the day, then running `update_stats` and
+`calculate_engagement` (several queries each) before saving it.
+
+`snapshot_daily_progress` does the same work for a whole queryset of users
+with a handful of statements. The only thing that's done in Python is
+figuring out day boundaries: a user's "today" depends on their timezone, so
+users are grouped by timezone, and for each group we run:
+
+1. An UPDATE ... FROM that fills in every counter and the 15/30/60-day
+   engagement (computed from grouped aggregates) for users that already
+   have a DailyProgress for the day.
+2. An INSERT ... SELECT that creates today's DailyProgress (using the same
+   aggregates) for users in the group that don't yet have one. The checkin
+   streaks for those new rows come from (and are then recorded in) each
+   user's CheckinStreak.
+
+The number of statements depends on the number of distinct timezones (and
+distinct streak values), not on the number of users.
+
+NOTE: The SQL here uses PostgreSQL's UPDATE ... FROM syntax.
+
+"""
+import pytz
+
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.db import connection, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from userprofile.models import UserProfile
+
+from .models import CheckinStreak
+
+
+# Users without a UserProfile get the same default as `user_timezone`.
+DEFAULT_TIMEZONE = "America/Chicago"
+
+# Counts completion states for a table of completions (within a date range).
+_STATES_SQL = """
+    SELECT user_id,
+        COUNT(CASE WHEN state = 'completed' THEN 1 END) AS completed,
+        COUNT(CASE WHEN state = 'snoozed' THEN 1 END) AS snoozed,
+        COUNT(CASE WHEN state = 'dismissed' THEN 1 END) AS dismissed
+    FROM {table}
+    WHERE created_on BETWEEN %s AND %s AND user_id IN ({users})
+    GROUP BY user_id
+"""
+
+# Counts all of the objects in a table created before some date.
+_TOTALS_SQL = """
+    SELECT user_id, COUNT(*) AS total
+    FROM {table}
+    WHERE created_on <= %s AND user_id IN ({users})
+    GROUP BY user_id
+"""
+
+# All of the DailyProgress values for a set of users, one row per user.
+STATS_SQL = """
+SELECT u.id AS user_id,
+    COALESCE(ua.total, 0) AS actions_total,
+    COALESCE(uca.completed, 0) AS actions_completed,
+    COALESCE(uca.snoozed, 0) AS actions_snoozed,
+    COALESCE(uca.dismissed, 0) AS actions_dismissed,
+    COALESCE(ca.total, 0) AS customactions_total,
+    COALESCE(ucca.completed, 0) AS customactions_completed,
+    COALESCE(ucca.snoozed, 0) AS customactions_snoozed,
+    COALESCE(ucca.dismissed, 0) AS customactions_dismissed,
+    CASE
+        WHEN cs.last_checkin = %s THEN cs.current_streak
+        WHEN cs.last_checkin = %s THEN cs.current_streak + 1
+        WHEN cs.id IS NULL THEN COALESCE(yesterday.checkin_streak, 0) + 1
+        ELSE 1
+    END AS checkin_streak,
+    CASE WHEN eng.total_15 > 0
+        THEN ROUND(100.0 * eng.completed_15 / eng.total_15, 2)
+        ELSE 0 END AS engagement_15_days,
+    CASE WHEN eng.total_30 > 0
+        THEN ROUND(100.0 * eng.completed_30 / eng.total_30, 2)
+        ELSE 0 END AS engagement_30_days,
+    CASE WHEN eng.total_60 > 0
+        THEN ROUND(100.0 * eng.completed_60 / eng.total_60, 2)
+        ELSE 0 END AS engagement_60_days
+FROM {user_table} AS u
+    LEFT JOIN goals_checkinstreak AS cs ON cs.user_id = u.id
+    LEFT JOIN ({ua_totals}) AS ua ON ua.user_id = u.id
+    LEFT JOIN ({uca_states}) AS uca ON uca.user_id = u.id
+    LEFT JOIN ({ca_totals}) AS ca ON ca.user_id = u.id
+    LEFT JOIN ({ucca_states}) AS ucca ON ucca.user_id = u.id
+    LEFT JOIN (
+        SELECT user_id, MAX(checkin_streak) AS checkin_streak
+        FROM goals_dailyprogress
+        WHERE created_on BETWEEN %s AND %s AND user_id IN ({users})
+        GROUP BY user_id
+    ) AS yesterday ON yesterday.user_id = u.id
+    LEFT JOIN (
+        SELECT user_id,
+            COUNT(CASE WHEN created_on >= %s THEN 1 END) AS total_15,
+            COUNT(CASE WHEN created_on >= %s AND state = 'completed'
+                  THEN 1 END) AS completed_15,
+            COUNT(CASE WHEN created_on >= %s THEN 1 END) AS total_30,
+            COUNT(CASE WHEN created_on >= %s AND state = 'completed'
+                  THEN 1 END) AS completed_30,
+            COUNT(*) AS total_60,
+            COUNT(CASE WHEN state = 'completed' THEN 1 END) AS completed_60
+        FROM goals_usercompletedaction
+        WHERE created_on >= %s AND user_id IN ({users})
+        GROUP BY user_id
+    ) AS eng ON eng.user_id = u.id
+WHERE u.id IN ({users})
+"""
+
+FIELDS = [
+    'actions_total', 'actions_completed', 'actions_snoozed',
+    'actions_dismissed', 'customactions_total', 'customactions_completed',
+    'customactions_snoozed', 'customactions_dismissed', 'checkin_streak',
+    'engagement_15_days', 'engagement_30_days', 'engagement_60_days',
+]
+
+# Update the users' existing DailyProgress rows for the day. As with save(),
+# this doesn't change the checkin streak.
+UPDATE_SQL = """
+UPDATE goals_dailyprogress AS dp SET
+    {assignments},
+    updated_on = %s
+FROM ({stats}) AS s
+WHERE dp.user_id = s.user_id AND dp.created_on BETWEEN %s AND %s
+""".format(
+    assignments=",\n    ".join(
+        "{0} = s.{0}".format(f) for f in FIELDS if f != 'checkin_streak'
+    ),
+    stats="{stats}"
+)
+
+# Create rows for users that don't yet have a DailyProgress for the day.
+INSERT_SQL = """
+INSERT INTO goals_dailyprogress (
+    user_id, {fields}, goal_status, created_on, updated_on
+)
+SELECT s.user_id, {values}, '{{}}', %s, %s
+FROM ({stats}) AS s
+WHERE NOT EXISTS (
+    SELECT 1 FROM goals_dailyprogress AS dp
+    WHERE dp.user_id = s.user_id AND dp.created_on BETWEEN %s AND %s
+)
+RETURNING user_id, checkin_streak
+""".replace('{fields}', ", ".join(FIELDS)).replace(
+    '{values}', ", ".join("s." + f for f in FIELDS))
+
+
+def day_range(tzname, dt):
+    """Return a (start, end) tuple of UTC datetimes for the day containing
+    `dt` in the given timezone; this mirrors `utils.user_utils.local_day_range`
+    (an empty timezone means the day is in UTC)."""
+    if tzname:
+        dt = dt.astimezone(pytz.timezone(tzname))
+    start = dt.replace(hour=0, minute=0, second=0, microsecond=0)
+    end = dt.replace(hour=23, minute=59, second=59, microsecond=999999)
+    return (start.astimezone(timezone.utc), end.astimezone(timezone.utc))
+
+
+def timezones_for(users):
+    """Return the set of timezones used by the given queryset of users. Users
+    without a profile are assumed to be in the DEFAULT_TIMEZONE."""
+    timezones = UserProfile.objects.filter(user__in=users)
+    timezones = set(timezones.values_list('timezone', flat=True).distinct())
+    if users.filter(userprofile__isnull=True).exists():
+        timezones.add(DEFAULT_TIMEZONE)
+    return timezones
+
+
+def _users_in_timezone(users, tzname):
+    """Return (sql, params) for a subquery selecting the ids of the users in
+    the given timezone."""
+    users = users.order_by()
+    if tzname == DEFAULT_TIMEZONE:
+        users = users.filter(
+            Q(userprofile__timezone=tzname) | Q(userprofile__isnull=True)
+        )
+    else:
+        users = users.filter(userprofile__timezone=tzname)
+    return users.values('id').query.sql_with_params()
+
+
+def snapshot_timezone(users, tzname, now=None):
+    """Create or update today's DailyProgress for every user in the queryset
+    whose timezone is `tzname`. Returns the number of rows written."""
+    now = now or timezone.now()
+    start, end = day_range(tzname, now)
+    yesterday = day_range(tzname, now - timedelta(days=1))
+    today = now.astimezone(pytz.timezone(tzname)).date() if tzname else now.date()
+    users_sql, users_params = _users_in_timezone(users, tzname)
+    users_params = list(users_params)
+
+    stats_sql = STATS_SQL.format(
+        user_table=get_user_model()._meta.db_table,
+        users=users_sql,
+        ua_totals=_TOTALS_SQL.format(table='goals_useraction', users=users_sql),
+        uca_states=_STATES_SQL.format(
+            table='goals_usercompletedaction', users=users_sql),
+        ca_totals=_TOTALS_SQL.format(table='goals_customaction', users=users_sql),
+        ucca_states=_STATES_SQL.format(
+            table='goals_usercompletedcustomaction', users=users_sql),
+    )
+    # NOTE: params must be given in the order their placeholders appear.
+    since = {days: now - timedelta(days=days) for days in [15, 30, 60]}
+    stats_params = (
+        [today, today - timedelta(days=1)] +  # checkin streak
+        [end] + users_params +  # ua_totals
+        [start, end] + users_params +  # uca_states
+        [end] + users_params +  # ca_totals
+        [start, end] + users_params +  # ucca_states
+        list(yesterday) + users_params +  # yesterday's DailyProgress
+        [since[15], since[15], since[30], since[30], since[60]] +
+        users_params +  # engagement
+        users_params
+    )
+
+    # Update existing rows first; those users then have a recently updated
+    # DailyProgress, so they may drop out of the `users` subquery (which is
+    # fine, since they don't need a new row).
+    with transaction.atomic():
+        with connection.cursor() as cursor:
+            cursor.execute(
+                UPDATE_SQL.format(stats=stats_sql),
+                [now] + stats_params + [start, end]
+            )
+            count = cursor.rowcount
+            cursor.execute(
+                INSERT_SQL.format(stats=stats_sql),
+                [now, now] + stats_params + [start, end]
+            )
+            created = dict(cursor.fetchall())
+        CheckinStreak.objects.bulk_checkin(created, today)
+        count += len(created)
+    return count
+
+
+def snapshot_daily_progress(users, now=None):
+    """Create or update today's DailyProgress snapshot for every user in the
+    given queryset. Returns the number of snapshots that were written."""
+    now = now or timezone.now()
+    count = 0
+    for tzname in timezones_for(users):
+        count += snapshot_timezone(users, tzname, now=now)
+    return count
@@ -4,7 +4,9 @@ from unittest.mock import patch
 from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.core.urlresolvers import reverse
+from django.db import connection
 from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
 from django.utils import timezone
 
 from model_mommy import mommy
@@ -1483,6 +1485,64 @@ class TestUserActionAPI(V2APITestCase):
         uca = UserCompletedAction.objects.get(user=self.user, useraction=self.ua)
         self.assertTrue(uca.uncompleted)
 
+    def test_complete_batch_unauthenticated(self):
+        url = self.get_url('useraction-complete-batch')
+        response = self.client.post(url, {'items': []}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_complete_batch(self):
+        ca = CustomAction.objects.create(
+            user=self.user,
+            goal=self.goal,
+            title="CA",
+            notification_text="CA"
+        )
+        # NOTE: timestamps are sent with millisecond precision.
+        now = timezone.now().replace(microsecond=0)
+        yesterday = now - timedelta(days=1)
+        url = self.get_url('useraction-complete-batch')
+        self.client.credentials(
+            HTTP_AUTHORIZATION='Token ' + self.user.auth_token.key
+        )
+
+        items = [
+            {'useraction': self.ua.id, 'state': 'dismissed', 'timestamp': yesterday},
+            {'useraction': self.ua.id, 'state': 'snoozed', 'timestamp': now - timedelta(seconds=2)},
+            {'useraction': self.ua.id, 'state': 'completed', 'timestamp': now - timedelta(seconds=1)},
+            {'customaction': ca.id},
+            {'useraction': 0},
+            {'useraction': self.ua.id, 'customaction': ca.id},
+        ]
+        response = self.client.post(url, {'items': items}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        results = response.data['results']
+        self.assertEqual(
+            [r['status'] for r in results],
+            ['created', 'skipped', 'created', 'created', 'error', 'error']
+        )
+
+        # One completion per day; the latest item for today wins.
+        uca = UserCompletedAction.objects.get(id=results[0]['id'])
+        self.assertTrue(uca.dismissed)
+        self.assertEqual(uca.created_on, yesterday)
+        uca = UserCompletedAction.objects.get(id=results[2]['id'])
+        self.assertTrue(uca.completed)
+        ucca = UserCompletedCustomAction.objects.get(id=results[3]['id'])
+        self.assertEqual(ucca.goal, self.goal)
+
+        # Today's completion is updated, unless the item is older than it.
+        items = [
+            {'useraction': self.ua.id, 'state': 'snoozed', 'timestamp': now - timedelta(seconds=10)},
+            {'customaction': ca.id, 'state': 'uncompleted'},
+        ]
+        response = self.client.post(url, {'items': items}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        results = response.data['results']
+        self.assertEqual([r['status'] for r in results], ['skipped', 'updated'])
+        self.assertTrue(UserCompletedAction.objects.get(id=uca.id).completed)
+        ucca = UserCompletedCustomAction.objects.get(id=ucca.id)
+        self.assertEqual(ucca.state, 'uncompleted')
+
     def test_post_useraction_with_parent_data(self):
         """POSTing to create a UserAction with parent object IDs"""
         category = mommy.make(Category, title="cat", state="published")
@@ -2995,3 +3055,66 @@ class TestOrganizationAPI(V2APITestCase):
         self.assertFalse(user.useraction_set.exists())
         self.assertFalse(user.member_organizations.exists())
         self.assertFalse(user.program_set.exists())
+
+
+@override_settings(SESSION_ENGINE=TEST_SESSION_ENGINE)
+@override_settings(REST_FRAMEWORK=TEST_REST_FRAMEWORK)
+@override_settings(CACHES={
+    'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}
+})
+class TestQueryBudgets(V2APITestCase):
+    """Listing a user's content should take a constant number of queries,
+    regardless of the number of results (see the serializers' prefetch plans).
+
+    """
+    def setUp(self):
+        User = get_user_model()
+        self.user = User.objects.create_user('budget', 'budget@example.com', 'p')
+        self.category = mommy.make(Category, title='Budget', state='published')
+        self.client.credentials(
+            HTTP_AUTHORIZATION='Token ' + self.user.auth_token.key
+        )
+
+    def _add_content(self, num):
+        for i in range(num):
+            goal = mommy.make(Goal, title='Budget Goal', state='published')
+            goal.categories.add(self.category)
+            trigger = Trigger.objects.create(
+                name='Budget', time=time(9, 0), recurrences="RRULE:FREQ=DAILY")
+            action = mommy.make(
+                Action, title='Budget Action', state='published',
+                default_trigger=trigger
+            )
+            action.goals.add(goal)
+            mommy.make(UserGoal, user=self.user, goal=goal,
+                       primary_category=self.category)
+            mommy.make(
+                UserAction, user=self.user, action=action, primary_goal=goal,
+                primary_category=self.category,
+                next_trigger_date=timezone.now() + timedelta(hours=1)
+            )
+
+    def _count_queries(self, url, num_results):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['count'], num_results)
+        return len(queries)
+
+    def _assert_constant(self, url):
+        self._add_content(1)
+        self._count_queries(url, 1)  # Warm up any cached values
+        one = self._count_queries(url, 1)
+
+        self._add_content(9)
+        self.assertEqual(self._count_queries(url, 10), one)
+
+    def test_useraction_list(self):
+        self._assert_constant(self.get_url('useraction-list'))
+        response = self.client.get(self.get_url('useraction-list'))
+        for ua in response.data['results']:
+            usergoal = self.user.usergoal_set.get(goal=ua['primary_goal'])
+            self.assertEqual(ua['primary_usergoal'], usergoal.id)
+
+    def test_usergoal_list(self):
+        self._assert_constant(self.get_url('usergoal-list'))
@@ -0,0 +1,123 @@
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from unittest.mock import patch
+
+from model_mommy import mommy
+from rest_framework.authtoken.models import Token
+
+from .. cohorts import get_progress, import_cohort, normalize_emails
+from .. models import Category, Goal, PackageEnrollment
+
+
+TEST_RQ_QUEUES = settings.RQ_QUEUES.copy()
+TEST_RQ_QUEUES['default']['ASYNC'] = False
+TEST_CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    }
+}
+
+User = get_user_model()
+
+
+@override_settings(RQ_QUEUES=TEST_RQ_QUEUES)
+@override_settings(CACHES=TEST_CACHES)
+class TestImportCohort(TestCase):
+
+    def setUp(self):
+        self.admin = User.objects.create_user('cohort-admin', 'ca@example.com', 'p')
+        self.existing = User.objects.create_user('existing', 'Existing@Example.com', 'p')
+        self.category = mommy.make(
+            Category, title='Cohort', state='published', packaged_content=True)
+        self.goal_a = mommy.make(Goal, title='Goal A', state='published')
+        self.goal_b = mommy.make(Goal, title='Goal B', state='published')
+
+    def test_normalize_emails(self):
+        emails = [' A@x.com', 'b@x.com', 'a@X.com', '']
+        self.assertEqual(normalize_emails(emails), ['a@x.com', 'b@x.com'])
+
+    def test_import_cohort(self):
+        emails = ['existing@example.com', 'new@example.com', 'NEW@example.com']
+        goals = [self.goal_a, self.goal_b]
+        enrollments, batch_id = import_cohort(emails, self.category, goals, self.admin)
+
+        self.assertEqual(enrollments.count(), 2)
+        self.assertEqual(
+            sorted(pe.user.email for pe in enrollments),
+            ['Existing@Example.com', 'new@example.com']
+        )
+        for pe in enrollments:
+            self.assertEqual(pe.enrolled_by, self.admin)
+            self.assertEqual(pe.goals.count(), 2)
+
+        # A new, inactive account was created, along with its profile & token.
+        new_user = User.objects.get(email='new@example.com')
+        self.assertFalse(new_user.is_active)
+        self.assertFalse(new_user.has_usable_password())
+        self.assertTrue(new_user.userprofile.needs_onboarding)
+        self.assertTrue(Token.objects.filter(user=new_user).exists())
+
+        self.assertEqual(get_progress(batch_id), {'total': 2, 'done': 2, 'complete': True})
+
+        # Importing again updates (rather than duplicates) the enrollments.
+        enrollments, _ = import_cohort(
+            emails, self.category, goals, self.admin, prevent_triggers=True)
+        self.assertEqual(PackageEnrollment.objects.count(), 2)
+        self.assertTrue(all(pe.prevent_custom_triggers for pe in enrollments))
+        self.assertEqual(User.objects.filter(email__iexact='new@example.com').count(), 1)
+
+    def test_num_queries_independent_of_cohort_size(self):
+        def run(emails):
+            with CaptureQueriesContext(connection) as queries:
+                import_cohort(emails, self.category, [self.goal_a], self.admin,
+                              chunk_size=1000)
+            return len(queries)
+
+        small = run(['s{}@example.com'.format(i) for i in range(2)])
+        large = run(['l{}@example.com'.format(i) for i in range(20)])
+        self.assertEqual(small, large)
+
+    def test_chunks_only_get_their_new_users(self):
+        emails = ['existing@example.com', 'n1@example.com', 'n2@example.com']
+        with patch('goals.cohorts.enroll_chunk') as mock_enroll:
+            enrollments, _ = import_cohort(
+                emails, self.category, [self.goal_a], self.admin, chunk_size=1)
+
+        users = dict(enrollments.values_list('id', 'user_id'))
+        self.assertEqual(mock_enroll.delay.call_count, 3)
+        for call in mock_enroll.delay.call_args_list:
+            enrollment_ids, new_user_ids, batch_id = call[0]
+            self.assertEqual(len(enrollment_ids), 1)
+            user_id = users[enrollment_ids[0]]
+            if user_id == self.existing.id:
+                self.assertEqual(new_user_ids, set())
+            else:
+                self.assertEqual(new_user_ids, {user_id})
+
+    def test_new_enrollments_are_notified(self):
+        from notifications.models import GCMDevice, GCMMessage
+        enrolled = User.objects.create_user('enrolled', 'enrolled@example.com', 'p')
+        no_device = User.objects.create_user('nodevice', 'nodevice@example.com', 'p')
+        mommy.make(PackageEnrollment, user=enrolled, category=self.category)
+        for user in [self.existing, enrolled]:
+            GCMDevice.objects.create(user=user, registration_id=user.username)
+        for user in [self.existing, enrolled, no_device]:
+            user.userprofile.needs_onboarding = False
+            user.userprofile.save()
+
+        emails = [
+            'existing@example.com', 'enrolled@example.com',
+            'nodevice@example.com', 'new@example.com',
+        ]
+        enrollments, _ = import_cohort(
+            emails, self.category, [self.goal_a], self.admin, chunk_size=2)
+
+        messages = GCMMessage.objects.all()
+        self.assertEqual(messages.count(), 1)
+        message = messages.get()
+        self.assertEqual(message.user, self.existing)
+        self.assertEqual(message.object_id, enrollments.get(user=self.existing).id)
+        self.assertEqual(message.message, "Welcome to Cohort")
@@ -0,0 +1,91 @@
+from datetime import time
+
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+
+from model_mommy import mommy
+
+from .. duplication import duplicate_category, get_progress, new_job_id
+from .. models import Action, Category, Goal, Trigger
+
+
+TEST_CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    }
+}
+
+
+@override_settings(CACHES=TEST_CACHES)
+class TestDuplicateCategory(TestCase):
+
+    def _category(self, title, num_goals, num_actions):
+        category = mommy.make(Category, title=title, state='published')
+        for g in range(num_goals):
+            goal = mommy.make(
+                Goal, title='{} goal {}'.format(title, g), state='published')
+            goal.categories.add(category)
+            for a in range(num_actions):
+                trigger = Trigger.objects.create(
+                    name='{} trigger {}-{}'.format(title, g, a),
+                    time=time(9, 30),
+                    recurrences="RRULE:FREQ=DAILY"
+                )
+                action = mommy.make(
+                    Action,
+                    title='{} action {}-{}'.format(title, g, a),
+                    state='published',
+                    default_trigger=trigger
+                )
+                action.goals.add(goal)
+        return category
+
+    def test_duplicate_content(self):
+        category = self._category('C', 2, 2)
+        shared = Action.objects.get(title='C action 0-0')
+        shared.goals.add(Goal.objects.get(title='C goal 1'))
+
+        new_category = category.duplicate_content("Copy of")
+        self.assertEqual(new_category.title, "Copy of C")
+
+        goals = new_category.goal_set.all()
+        self.assertEqual(
+            sorted(g.title for g in goals), ["Copy of C goal 0", "Copy of C goal 1"])
+        for goal in goals:
+            self.assertEqual(goal.state, 'draft')
+            self.assertEqual(goal.title_slug, 'copy-of-c-goal-{}'.format(goal.title[-1]))
+
+        actions = Action.objects.filter(goals__in=goals).distinct()
+        self.assertEqual(actions.count(), 4)
+        copy = actions.get(title='C action 0-0')
+        self.assertEqual(copy.goals.count(), 2)
+        self.assertNotEqual(copy.default_trigger.id, shared.default_trigger.id)
+        self.assertEqual(copy.default_trigger.name, "Copy of C trigger 0-0")
+        self.assertEqual(copy.default_trigger.time, time(9, 30))
+        self.assertEqual(
+            copy.serialized_default_trigger['id'], copy.default_trigger.id)
+
+        # The original content is untouched.
+        self.assertEqual(category.goal_set.count(), 2)
+        self.assertEqual(shared.goals.count(), 2)
+
+    def test_num_queries_independent_of_category_size(self):
+        small = self._category('S', 1, 1)
+        large = self._category('L', 5, 4)
+        with CaptureQueriesContext(connection) as small_queries:
+            duplicate_category(small)
+        with CaptureQueriesContext(connection) as large_queries:
+            duplicate_category(large)
+        self.assertEqual(len(small_queries), len(large_queries))
+
+    def test_progress(self):
+        category = self._category('P', 1, 1)
+        job_id = new_job_id()
+        self.assertEqual(get_progress(job_id)['state'], 'pending')
+
+        new_category = duplicate_category(category, job_id=job_id)
+        progress = get_progress(job_id)
+        self.assertEqual(progress['state'], 'complete')
+        self.assertEqual(progress['done'], progress['total'])
+        self.assertEqual(progress['category_id'], new_category.id)
@@ -0,0 +1,75 @@
+from datetime import time
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+
+from model_mommy import mommy
+
+from .. enrollment import enroll_in_goals
+from .. models import Action, Category, Goal, Trigger, UserAction, UserGoal
+
+
+User = get_user_model()
+
+
+class TestEnrollInGoals(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user('enroll', 'enroll@x.com', 'pass')
+        self.trigger = Trigger.objects.create(
+            name="Daily",
+            time=time(12, 34),
+            recurrences="RRULE:FREQ=DAILY"
+        )
+
+    def _package(self, title, num_goals, num_actions):
+        category = mommy.make(Category, title=title, state='published')
+        for g in range(num_goals):
+            goal = mommy.make(
+                Goal, title='{} goal {}'.format(title, g), state='published')
+            goal.categories.add(category)
+            for a in range(num_actions):
+                action = mommy.make(
+                    Action,
+                    title='{} action {}-{}'.format(title, g, a),
+                    state='published',
+                    default_trigger=self.trigger
+                )
+                action.goals.add(goal)
+        return category
+
+    def test_enroll(self):
+        category = self._package('P', 2, 3)
+        result = enroll_in_goals(self.user, category.goal_set.all(), category)
+        self.assertEqual(result, (2, 6))
+
+        for ug in UserGoal.objects.filter(user=self.user):
+            self.assertEqual(ug.primary_category, category)
+        for ua in UserAction.objects.filter(user=self.user):
+            self.assertEqual(ua.primary_category, category)
+            self.assertIn(ua.primary_goal, ua.action.goals.all())
+            self.assertIsNotNone(ua.next_trigger_date)
+
+        # Enrolling again doesn't create anything new.
+        result = enroll_in_goals(self.user, category.goal_set.all(), category)
+        self.assertEqual(result, (0, 0))
+
+    def test_category_enroll(self):
+        category = self._package('P', 2, 2)
+        category.enroll(self.user)
+        self.assertTrue(self.user.usercategory_set.filter(category=category).exists())
+        self.assertEqual(self.user.usergoal_set.count(), 2)
+        self.assertEqual(self.user.useraction_set.count(), 4)
+
+    def test_num_queries_independent_of_package_size(self):
+        small = self._package('S', 1, 2)
+        large = self._package('L', 4, 10)
+        other = User.objects.create_user('other', 'other@x.com', 'pass')
+
+        with CaptureQueriesContext(connection) as small_queries:
+            enroll_in_goals(self.user, small.goal_set.all(), small)
+        with CaptureQueriesContext(connection) as large_queries:
+            enroll_in_goals(other, large.goal_set.all(), large)
+        self.assertEqual(len(small_queries), len(large_queries))
@@ -0,0 +1,81 @@
+from unittest.mock import Mock
+
+from django.test import TestCase
+
+from .. fb_messenger import (
+    Delivery,
+    Message,
+    MessengerSender,
+    RateLimiter,
+    StandInServer,
+    delivered,
+)
+
+
+class TestRateLimiter(TestCase):
+
+    def test_no_rate(self):
+        sleep = Mock()
+        limiter = RateLimiter(rate=None, sleep=sleep)
+        for i in range(100):
+            limiter.wait()
+        self.assertFalse(sleep.called)
+
+    def test_wait(self):
+        # A fake clock that only advances when we sleep.
+        now = [0.0]
+
+        def sleep(seconds):
+            now[0] += seconds
+
+        limiter = RateLimiter(rate=10, clock=lambda: now[0], sleep=sleep)
+
+        # The first 10 calls are an allowed burst
+        for i in range(10):
+            limiter.wait()
+        self.assertEqual(now[0], 0.0)
+
+        # The next 10 should take about a second.
+        for i in range(10):
+            limiter.wait()
+        self.assertAlmostEqual(now[0], 1.0, places=5)
+
+
+class TestMessengerSender(TestCase):
+
+    def test_delivered(self):
+        m = Message('1', 'hi', 1)
+        self.assertTrue(delivered(Delivery(m, 200, None, 0)))
+        self.assertFalse(delivered(Delivery(m, 404, None, 0)))
+        self.assertFalse(delivered(Delivery(m, None, 'error', 0)))
+
+    def test_send_all_empty(self):
+        sender = MessengerSender(url='http://localhost/{user_id}')
+        self.assertEqual(sender.send_all([]), [])
+
+    def test_send_all(self):
+        messages = [Message(str(i), "Message {}".format(i), i) for i in range(20)]
+        with StandInServer(fail_for=['3']) as server:
+            sender = MessengerSender(url=server.url, concurrency=4, rate=None)
+            deliveries = sender.send_all(messages)
+            sender.close()
+
+            # every message was received by the server.
+            self.assertEqual(len(server.received), 20)
+            received = sorted(int(user_id) for user_id, body in server.received)
+            self.assertEqual(received, list(range(20)))
+
+        # Deliveries are returned in order, with per-recipient status
+        self.assertEqual([d.message for d in deliveries], messages)
+        failed = [d.message.user_id for d in deliveries if not delivered(d)]
+        self.assertEqual(failed, ['3'])
+        self.assertEqual(deliveries[3].status, 404)
+
+    def test_send_connection_error(self):
+        # Nothing is listening on this port.
+        with StandInServer() as server:
+            url = server.url
+        sender = MessengerSender(url=url, rate=None, timeout=1)
+        delivery = sender.send(Message('1', 'hi', 1))
+        self.assertIsNone(delivery.status)
+        self.assertIsNotNone(delivery.error)
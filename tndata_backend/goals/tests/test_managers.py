@@ -18,6 +18,7 @@ from .. models import (
     Trigger,
     UserAction,
     UserCompletedAction,
+    UserGoal,
 )
 from .. settings import (
     DEFAULT_MORNING_GOAL_TRIGGER_NAME,
@@ -343,6 +344,49 @@ class TestTriggerManager(TestCase):
         a.delete()
 
 
+class TestUserGoalManager(TestCase):
+    """Tests for the `UserGoalManager` manager."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.goal = mommy.make(Goal, title="G", state='published')
+        cls.action = mommy.make(Action, title="A", state='published')
+        cls.usergoals = []
+        # Users complete 0, 1, 2, and 3 out of 3 notifications.
+        for i in range(4):
+            user = User.objects.create_user('ug{}'.format(i), 'ug{}@y.z'.format(i), 'p')
+            cls.usergoals.append(mommy.make(UserGoal, user=user, goal=cls.goal))
+            ua = mommy.make(UserAction, user=user, action=cls.action,
+                            primary_goal=cls.goal)
+            for j in range(3):
+                state = 'completed' if j < i else 'dismissed'
+                mommy.make(UserCompletedAction, user=user, action=cls.action,
+                           useraction=ua, state=state)
+
+    def test_update_engagement(self):
+        self.assertEqual(UserGoal.objects.update_engagement(), 4)
+
+        func = UserCompletedAction.objects.engagement
+        ranks = []
+        for ug in self.usergoals:
+            ug.refresh_from_db()
+            expected = func(ug.user, goal=self.goal, days=15)
+            if expected:  # Like calculate_engagement, 0 isn't stored.
+                self.assertAlmostEqual(ug.engagement_15_days, expected, places=2)
+            ranks.append(ug.engagement_rank)
+            self.assertEqual(
+                UserGoal.objects.engagement_rank(ug.user, self.goal),
+                ug.engagement_rank
+            )
+        self.assertEqual(ranks, [0.0, 33.33, 66.67, 100.0])
+
+    def test_update_engagement_for_user(self):
+        user = self.usergoals[1].user
+        self.assertEqual(UserGoal.objects.update_engagement(user=user), 1)
+        self.usergoals[1].refresh_from_db()
+        self.assertAlmostEqual(self.usergoals[1].engagement_15_days, 33.33)
+
+
 class TestUserCompletedActionManager(TestCase):
     """Tests for the `UserCompletedActionManager` manager."""
 
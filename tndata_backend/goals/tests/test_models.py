@@ -5,11 +5,11 @@ from unittest.mock import Mock, patch
 from django.contrib.auth import get_user_model
 from django.core.urlresolvers import reverse
 from django.test import TestCase
-from django.db.models import QuerySet
+from django.db.models import Min, QuerySet
 from django.utils import timezone
 
 from model_mommy import mommy
-from utils.user_utils import tzdt
+from utils.user_utils import local_day_range, to_localtime, tzdt
 
 from .. models import (
     Action,
@@ -1553,6 +1553,33 @@ class TestDailyProgress(TestCase):
         # Now, creating a progress for "today" should increment that value.
         dp = DailyProgress.objects.create(user=user)
         self.assertEqual(dp.checkin_streak, 2)
+        self.assertEqual(user.checkin_streak.current_streak, 2)
+        self.assertEqual(
+            user.checkin_streak.last_checkin,
+            to_localtime(dp.created_on, user).date()
+        )
+
+    def test_checkin_streak_not_updated_on_save(self):
+        user = mommy.make(User)
+        dp = DailyProgress.objects.create(user=user)
+        self.assertEqual(dp.checkin_streak, 1)
+
+        # Subsequent saves don't need to look up the streak.
+        with self.assertNumQueries(1):
+            dp.save()
+        self.assertEqual(dp.checkin_streak, 1)
+
+    def test_checkin_streak_reset(self):
+        user = mommy.make(User)
+        with patch('django.utils.timezone.now') as mock_now:
+            mock_now.return_value = timezone.now() - timedelta(days=3)
+            DailyProgress.objects.create(user=user)
+            DailyProgress.objects.create(user=user)  # Same day; no change.
+        self.assertEqual(user.checkin_streak.current_streak, 1)
+
+        # Missing a day restarts the streak.
+        dp = DailyProgress.objects.create(user=user)
+        self.assertEqual(dp.checkin_streak, 1)
 
     def test_usercompleted_actions(self):
         # smoke test so we know if this works or not.
@@ -1574,3 +1601,85 @@ class TestDailyProgress(TestCase):
 
         self.progress.calculate_engagement()  # 15-day
         self.assertEqual(self.progress.engagement_15_days, 100.0)
+
+
+class TestDailyProgressUpdateStats(TestCase):
+    """Verify that the single-query `update_stats` gives the same results as
+    counting each value individually, across a generated set of data."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.users = [mommy.make(User) for i in range(3)]
+        actions = [
+            mommy.make(Action, title='a{}'.format(i), state='published')
+            for i in range(4)
+        ]
+        states = [
+            UserCompletedAction.COMPLETED,
+            UserCompletedAction.SNOOZED,
+            UserCompletedAction.DISMISSED,
+            UserCompletedAction.UNCOMPLETED,
+        ]
+        now = timezone.now()
+        for u, user in enumerate(cls.users):
+            for a, action in enumerate(actions[:u + 2]):
+                ua = mommy.make(UserAction, user=user, action=action)
+                ca = mommy.make(CustomAction, user=user, title='ca{}'.format(a))
+                # Spread the objects' creation dates over a few days.
+                days_ago = (u + a) % 3
+                UserAction.objects.filter(pk=ua.pk).update(
+                    created_on=now - timedelta(days=days_ago))
+                CustomAction.objects.filter(pk=ca.pk).update(
+                    created_on=now - timedelta(days=days_ago))
+
+                for i, state in enumerate(states[a % 4:] + states[:a % 4]):
+                    uca = mommy.make(
+                        UserCompletedAction, user=user, useraction=ua,
+                        action=action, state=state
+                    )
+                    ucca = mommy.make(
+                        UserCompletedCustomAction, user=user,
+                        customaction=ca, state=state
+                    )
+                    created = now - timedelta(days=i % 2, hours=u)
+                    UserCompletedAction.objects.filter(pk=uca.pk).update(
+                        created_on=created)
+                    UserCompletedCustomAction.objects.filter(pk=ucca.pk).update(
+                        created_on=created)
+
+    def _expected(self, dp):
+        """Count everything individually (this is how `update_stats` used to
+        work)."""
+        start, end = local_day_range(dp.user, dt=dp.created_on)
+        results = {}
+        for prefix, items, completions in [
+            ('actions', UserAction, UserCompletedAction),
+            ('customactions', CustomAction, UserCompletedCustomAction),
+        ]:
+            items = items.objects.filter(user=dp.user)
+            from_date = items.aggregate(Min('created_on'))['created_on__min'] or start
+            results[prefix + '_total'] = items.filter(
+                created_on__range=(from_date, end)).count()
+
+            completions = completions.objects.filter(
+                user=dp.user, created_on__range=(start, end))
+            for state in ['completed', 'snoozed', 'dismissed']:
+                results['{}_{}'.format(prefix, state)] = completions.filter(
+                    state=state).count()
+        return results
+
+    def test_update_stats(self):
+        now = timezone.now()
+        for user in self.users:
+            for days_ago in range(3):
+                dp = DailyProgress(user=user, created_on=now - timedelta(days=days_ago))
+                dp.update_stats()
+                expected = self._expected(dp)
+                for field, value in expected.items():
+                    self.assertEqual(getattr(dp, field), value, field)
+
+    def test_update_stats_num_queries(self):
+        dp = DailyProgress(user=self.users[0], created_on=timezone.now())
+        local_day_range(dp.user)  # Make sure the user's timezone is cached.
+        with self.assertNumQueries(1):
+            dp.update_stats()
@@ -0,0 +1,71 @@
+from datetime import time
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase
+
+from utils.user_utils import local_now
+
+from .. models import Action, Category, Goal, Trigger
+from .. package_calendar import build_calendar, content_version
+
+
+class TestPackageCalendar(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        User = get_user_model()
+        self.user = User.objects.create_user('cal', 'cal@example.com', 'pass')
+        self.category = Category.objects.create(
+            order=1,
+            title='Package',
+            packaged_content=True
+        )
+        self.goal = Goal.objects.create(title='Goal')
+        self.goal.categories.add(self.category)
+        self.trigger = Trigger.objects.create(
+            name="Daily",
+            time=time(12, 34),
+            recurrences="RRULE:FREQ=DAILY"
+        )
+        self.action = Action.objects.create(
+            title='Action',
+            default_trigger=self.trigger
+        )
+        self.action.goals.add(self.goal)
+
+    def _entries(self, data):
+        return [e for week in data['weeks'] for day, entries in week for e in entries]
+
+    def test_build_calendar(self):
+        start = local_now(self.user)
+        data = build_calendar(self.category, self.user, start)
+        self.assertEqual(len(data['weeks'][0]), 7)
+        self.assertFalse(data['contains_relative_reminders'])
+
+        entries = self._entries(data)
+        self.assertTrue(len(entries) > 0)
+        self.assertEqual(entries[0]['action_id'], self.action.id)
+        self.assertEqual(entries[0]['goal_ids'], [self.goal.id])
+        for week in data['weeks']:
+            for day, day_entries in week:
+                self.assertTrue(all(e['date'] == day for e in day_entries))
+
+    def test_cached(self):
+        start = local_now(self.user)
+        build_calendar(self.category, self.user, start)
+        with self.assertNumQueries(0):
+            build_calendar(self.category, self.user, start)
+
+    def test_invalidated_when_content_changes(self):
+        version = content_version(self.category.id)
+        self.action.save()
+        self.assertEqual(content_version(self.category.id), version + 1)
+
+        self.trigger.save()
+        self.assertEqual(content_version(self.category.id), version + 2)
+
+        self.action.goals.remove(self.goal)
+        self.assertEqual(content_version(self.category.id), version + 3)
+        data = build_calendar(self.category, self.user, local_now(self.user))
+        self.assertEqual(self._entries(data), [])
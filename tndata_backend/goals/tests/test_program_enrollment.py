@@ -0,0 +1,127 @@
+from datetime import timedelta
+from unittest.mock import patch
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from model_mommy import mommy
+
+from .. import program_enrollment
+from .. models import (
+    Category,
+    Goal,
+    Organization,
+    Program,
+    ProgramEnrollmentChunk,
+    UserGoal,
+)
+from .. settings import PROGRAM_ENROLLMENT_CHUNK_TIMEOUT
+
+
+TEST_RQ_QUEUES = settings.RQ_QUEUES.copy()
+TEST_RQ_QUEUES['default']['ASYNC'] = False
+
+
+@override_settings(RQ_QUEUES=TEST_RQ_QUEUES)
+class TestProgramEnrollment(TestCase):
+
+    def setUp(self):
+        User = get_user_model()
+        self.users = [
+            User.objects.create_user('pe{}'.format(i), 'pe{}@example.com'.format(i), 'p')
+            for i in range(5)
+        ]
+        self.category = mommy.make(Category, title='Program Cat', state='published')
+        self.goal = mommy.make(Goal, title='Program Goal', state='draft')
+        self.goal.categories.add(self.category)
+
+        org = mommy.make(Organization, name='Program Org')
+        self.program = mommy.make(Program, name='Program', organization=org)
+        self.program.categories.add(self.category)
+        self.program.members.add(*self.users)
+
+    def _enrolled(self):
+        return UserGoal.objects.filter(goal=self.goal).count()
+
+    def test_enroll_program_members(self):
+        batch = program_enrollment.enroll_program_members(self.goal, chunk_size=2)
+
+        self.assertEqual(self._enrolled(), 5)
+        chunks = ProgramEnrollmentChunk.objects.filter(batch=batch)
+        self.assertEqual(chunks.count(), 3)
+        self.assertEqual(
+            sorted(len(chunk.user_ids) for chunk in chunks), [1, 2, 2])
+        progress = program_enrollment.get_progress(batch)
+        self.assertEqual(progress['done'], 3)
+        self.assertEqual(progress['failed'], 0)
+
+    def test_failed_chunk_is_retried_alone(self):
+        failing = self.users[0]
+        original = Goal.enroll
+
+        def enroll(goal, user, *args, **kwargs):
+            if user == failing:
+                raise ValueError("nope")
+            return original(goal, user, *args, **kwargs)
+
+        with patch('goals.program_enrollment.enroll_chunk.delay'):
+            batch = program_enrollment.enroll_program_members(self.goal, chunk_size=2)
+
+        with patch.object(Goal, 'enroll', autospec=True, side_effect=enroll):
+            for chunk in ProgramEnrollmentChunk.objects.filter(batch=batch):
+                try:
+                    program_enrollment.enroll_chunk(chunk.key)
+                except ValueError:
+                    pass
+        self.assertEqual(self._enrolled(), 3)  # The failed chunk stopped at its first user.
+
+        failed = ProgramEnrollmentChunk.objects.get(state='failed')
+        self.assertIn(failing.id, failed.user_ids)
+        self.assertEqual(failed.error, "nope")
+
+        # Retrying only re-runs the failed chunk.
+        with patch.object(Goal, 'enroll', autospec=True, side_effect=original) as m:
+            self.assertEqual(program_enrollment.retry_failed(), 1)
+            self.assertEqual(m.call_count, len(failed.user_ids))
+
+        failed.refresh_from_db()
+        self.assertEqual(failed.state, 'done')
+        self.assertEqual(self._enrolled(), 5)
+        self.assertEqual(failed.attempts, 2)
+
+        # A completed chunk is never redone.
+        with patch.object(Goal, 'enroll') as m:
+            program_enrollment.enroll_chunk(failed.key)
+            self.assertFalse(m.called)
+
+    def test_running_chunk_is_not_claimed_again(self):
+        """A duplicate (or re-queued) job doesn't enroll a chunk that another
+        job is working on."""
+        with patch('goals.program_enrollment.enroll_chunk.delay'):
+            batch = program_enrollment.enroll_program_members(self.goal)
+        chunk = ProgramEnrollmentChunk.objects.get(batch=batch)
+        ProgramEnrollmentChunk.objects.filter(id=chunk.id).update(
+            state='running', claimed_on=timezone.now())
+
+        with patch.object(Goal, 'enroll') as m:
+            program_enrollment.enroll_chunk(chunk.key)
+            self.assertFalse(m.called)
+        self.assertEqual(program_enrollment.retry_failed(), 0)
+
+    def test_stalled_chunk_is_retried(self):
+        """A chunk whose job died while it was running is re-queued."""
+        with patch('goals.program_enrollment.enroll_chunk.delay'):
+            batch = program_enrollment.enroll_program_members(self.goal)
+        chunk = ProgramEnrollmentChunk.objects.get(batch=batch)
+        claimed_on = timezone.now() - timedelta(
+            seconds=PROGRAM_ENROLLMENT_CHUNK_TIMEOUT + 60)
+        ProgramEnrollmentChunk.objects.filter(id=chunk.id).update(
+            state='running', claimed_on=claimed_on, attempts=1)
+
+        self.assertEqual(program_enrollment.retry_failed(batch=batch), 1)
+        chunk.refresh_from_db()
+        self.assertEqual(chunk.state, 'done')
+        self.assertEqual(chunk.attempts, 2)
+        self.assertEqual(self._enrolled(), 5)
@@ -0,0 +1,55 @@
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+
+from model_mommy import mommy
+from waffle.testutils import override_switch
+
+from .. import progress_queue
+from .. models import Action, DailyProgress, UserAction, UserCompletedAction
+
+
+class TestProgressQueue(TestCase):
+
+    def setUp(self):
+        User = get_user_model()
+        self.user = User.objects.create_user('pq', 'pq@example.com', 'pass')
+        self.action = mommy.make(Action, title='A', state='published')
+        self.useraction = mommy.make(UserAction, user=self.user, action=self.action)
+        DailyProgress.objects.filter(user=self.user).delete()
+
+    def _complete(self):
+        return mommy.make(
+            UserCompletedAction, user=self.user, useraction=self.useraction,
+            action=self.action, state=UserCompletedAction.COMPLETED
+        )
+
+    def test_completion_updates_progress(self):
+        with patch('goals.progress_queue.mark_dirty') as mark_dirty:
+            self._complete()
+            self.assertFalse(mark_dirty.called)
+        dp = DailyProgress.objects.get(user=self.user)
+        self.assertEqual(dp.actions_completed, 1)
+
+    @override_switch(progress_queue.SWITCH, active=True)
+    def test_completion_marks_dirty(self):
+        with patch('goals.progress_queue.mark_dirty') as mark_dirty:
+            self._complete()
+            mark_dirty.assert_called_once_with(self.user.id)
+        self.assertFalse(DailyProgress.objects.filter(user=self.user).exists())
+
+    @override_switch(progress_queue.SWITCH, active=True)
+    def test_recompute_dirty(self):
+        with patch('goals.progress_queue.mark_dirty'):
+            self._complete()
+            self._complete()
+
+        with patch('goals.progress_queue.take_dirty') as take_dirty:
+            take_dirty.return_value = [self.user.id]
+            with patch('goals.progress_queue.get_connection'):
+                self.assertEqual(progress_queue.recompute_dirty(), 1)
+
+        dp = DailyProgress.objects.get(user=self.user)
+        self.assertEqual(dp.actions_total, 1)
+        self.assertEqual(dp.actions_completed, 2)
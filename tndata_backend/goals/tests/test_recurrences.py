@@ -0,0 +1,139 @@
+import pytz
+from datetime import datetime, time, timedelta
+
+from django.test import TestCase
+
+from recurrence import deserialize
+
+from .. models import Trigger
+from .. recurrences import CompiledRecurrence, RecurrenceCache, recurrence_cache
+
+
+class TestCompiledRecurrence(TestCase):
+
+    def setUp(self):
+        self.tz = pytz.timezone("America/Chicago")
+        self.dtstart = self.tz.localize(datetime(2016, 3, 1, 9, 30))
+
+    def _assert_same_as_rruleset(self, rrule, dtend=None):
+        recurrence = deserialize(rrule)
+        compiled = CompiledRecurrence(recurrence, self.dtstart, dtend)
+        rruleset = recurrence.to_dateutil_rruleset(self.dtstart, dtend)
+
+        for hours in range(-24, 24 * 120, 7):
+            dt = self.dtstart + timedelta(hours=hours)
+            end = dt + timedelta(days=10)
+            for inc in [True, False]:
+                self.assertEqual(compiled.after(dt, inc), rruleset.after(dt, inc))
+                self.assertEqual(
+                    compiled.between(dt, end, inc),
+                    rruleset.between(dt, end, inc)
+                )
+
+    def test_daily(self):
+        self._assert_same_as_rruleset("RRULE:FREQ=DAILY")
+
+    def test_weekly(self):
+        self._assert_same_as_rruleset("RRULE:FREQ=WEEKLY;BYDAY=MO,WE,FR")
+
+    def test_until(self):
+        self._assert_same_as_rruleset("RRULE:FREQ=DAILY;UNTIL=20160401T000000Z")
+
+    def test_stacked(self):
+        self._assert_same_as_rruleset(
+            "RRULE:FREQ=WEEKLY;BYDAY=MO\nRRULE:FREQ=MONTHLY;BYMONTHDAY=15"
+        )
+
+    def test_with_dtend(self):
+        dtend = self.dtstart + timedelta(days=30)
+        recurrence = deserialize("RRULE:FREQ=DAILY")
+        compiled = CompiledRecurrence(recurrence, self.dtstart, dtend)
+        self.assertIsNone(compiled.horizon)
+        self.assertEqual(
+            list(compiled),
+            list(recurrence.occurrences(dtstart=self.dtstart, dtend=dtend))
+        )
+        self._assert_same_as_rruleset("RRULE:FREQ=DAILY", dtend=dtend)
+
+    def test_horizon(self):
+        recurrence = deserialize("RRULE:FREQ=DAILY")
+        compiled = CompiledRecurrence(recurrence, self.dtstart, horizon_days=10)
+        self.assertEqual(compiled.horizon, self.dtstart + timedelta(days=10))
+        self.assertEqual(len(compiled.dates), 11)
+
+        # Lookups beyond the horizon fall back to the rruleset.
+        dt = self.dtstart + timedelta(days=20)
+        self.assertEqual(compiled.after(dt), dt + timedelta(days=1))
+
+
+class TestRecurrenceCache(TestCase):
+
+    def setUp(self):
+        self.cache = RecurrenceCache(maxsize=2)
+        self.recurrence = deserialize("RRULE:FREQ=DAILY")
+        self.dtstart = pytz.utc.localize(datetime(2016, 3, 1, 9, 30))
+
+    def test_get(self):
+        a = self.cache.get(self.recurrence, self.dtstart)
+        b = self.cache.get(self.recurrence, self.dtstart)
+        self.assertIs(a, b)
+        self.assertEqual(self.cache.hits, 1)
+        self.assertEqual(self.cache.misses, 1)
+
+    def test_keys_include_timezone(self):
+        tz = pytz.timezone("America/Chicago")
+        other = self.dtstart.astimezone(tz)  # Same instant, different tz
+        a = self.cache.get(self.recurrence, self.dtstart)
+        b = self.cache.get(self.recurrence, other)
+        self.assertIsNot(a, b)
+
+    def test_keys_include_rules(self):
+        weekly = deserialize("RRULE:FREQ=WEEKLY")
+        a = self.cache.get(self.recurrence, self.dtstart)
+        b = self.cache.get(weekly, self.dtstart)
+        self.assertIsNot(a, b)
+
+    def test_lru(self):
+        for days in range(5):
+            self.cache.get(self.recurrence, self.dtstart + timedelta(days=days))
+        self.assertEqual(len(self.cache), 2)
+
+    def test_disabled(self):
+        cache = RecurrenceCache(maxsize=0)
+        compiled = cache.get(self.recurrence, self.dtstart)
+        self.assertIsNone(compiled.dates)
+        self.assertEqual(len(cache), 0)
+        self.assertEqual(
+            compiled.after(self.dtstart),
+            self.dtstart + timedelta(days=1)
+        )
+
+
+class TestTriggerCompiledRecurrences(TestCase):
+
+    def test_compiled_recurrences(self):
+        trigger = Trigger.objects.create(
+            name="Compiled",
+            time=time(9, 30),
+            recurrences="RRULE:FREQ=DAILY"
+        )
+        dtstart = pytz.utc.localize(datetime(2016, 3, 1, 9, 30))
+        compiled = trigger.compiled_recurrences(dtstart)
+        self.assertIs(compiled, trigger.compiled_recurrences(dtstart))
+        self.assertEqual(compiled.after(dtstart), dtstart + timedelta(days=1))
+
+    def test_stacked_next_uses_cache(self):
+        trigger = Trigger.objects.create(
+            name="Stacked",
+            time=time(9, 30),
+            recurrences=(
+                "RRULE:FREQ=WEEKLY;BYDAY=MO\n"
+                "RRULE:FREQ=MONTHLY;BYMONTHDAY=15"
+            )
+        )
+        recurrence_cache.clear()
+        first = trigger.next()
+        misses = recurrence_cache.misses
+        self.assertEqual(trigger.next(), first)
+        self.assertEqual(recurrence_cache.misses, misses)
+        self.assertGreaterEqual(recurrence_cache.hits, 1)
@@ -0,0 +1,107 @@
+from datetime import time
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase
+
+from .. models import Action, Goal, Trigger, UserAction, UserGoal
+from .. refresh import refresh_useractions, requires_save
+
+
+User = get_user_model()
+
+
+class TestRefreshUserActions(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('ref', 'ref@example.com', 'pass')
+        self.trigger = Trigger.objects.create(
+            name="Daily",
+            time=time(12, 34),
+            recurrences="RRULE:FREQ=DAILY"
+        )
+        self.goal = Goal.objects.create(title="Goal", state='published')
+        UserGoal.objects.create(user=self.user, goal=self.goal)
+
+        self.useractions = []
+        for i in range(5):
+            action = Action.objects.create(
+                title='Action {}'.format(i),
+                default_trigger=self.trigger,
+                state='published'
+            )
+            action.goals.add(self.goal)
+            ua = UserAction.objects.create(user=self.user, action=action)
+            self.useractions.append(ua)
+
+        # Clear the values that were set when these were created.
+        UserAction.objects.update(next_trigger_date=None, prev_trigger_date=None)
+
+    def _expected(self, ua):
+        """Compute the dates the old-fashioned way (i.e. what save() does)."""
+        ua = UserAction.objects.get(pk=ua.pk)
+        ua._set_next_trigger_date()
+        return (ua.next_trigger_date, ua.prev_trigger_date)
+
+    def _actual(self, ua):
+        ua = UserAction.objects.get(pk=ua.pk)
+        return (ua.next_trigger_date, ua.prev_trigger_date)
+
+    def test_matches_save(self):
+        expected = [self._expected(ua) for ua in self.useractions]
+        result = refresh_useractions(UserAction.objects.all(), batch_size=2)
+        self.assertEqual(result.processed, 5)
+        self.assertEqual(result.updated, 5)
+        self.assertEqual(result.saved, 0)
+        self.assertEqual(result.last_id, self.useractions[-1].id)
+        self.assertEqual([self._actual(ua) for ua in self.useractions], expected)
+        self.assertIsNotNone(expected[0][0])
+
+    def test_groups_updates_by_value(self):
+        # All of these share the same trigger & timezone, so they all get
+        # the same values (and are written with a single UPDATE).
+        refresh_useractions(UserAction.objects.all(), batch_size=10)
+        values = set(self._actual(ua) for ua in self.useractions)
+        self.assertEqual(len(values), 1)
+
+    def test_limit(self):
+        result = refresh_useractions(UserAction.objects.all(), limit=3)
+        self.assertEqual(result.processed, 3)
+        self.assertIsNone(self._actual(self.useractions[3])[0])
+
+    def test_start_id(self):
+        start_id = self.useractions[2].id
+        result = refresh_useractions(UserAction.objects.all(), start_id=start_id)
+        self.assertEqual(result.processed, 2)
+        self.assertIsNone(self._actual(self.useractions[0])[0])
+        self.assertIsNotNone(self._actual(self.useractions[4])[0])
+
+    def test_checkpoint(self):
+        key = 'test-refresh-checkpoint'
+        cache.set(key, self.useractions[3].id)
+        result = refresh_useractions(UserAction.objects.all(), checkpoint_key=key)
+        self.assertEqual(result.processed, 1)
+
+        # The checkpoint is removed once we're finished.
+        self.assertIsNone(cache.get(key))
+
+    def test_include(self):
+        ids = {self.useractions[0].id}
+        result = refresh_useractions(
+            UserAction.objects.all(),
+            include=lambda user: ids
+        )
+        self.assertEqual(result.updated, 1)
+        self.assertIsNotNone(self._actual(self.useractions[0])[0])
+        self.assertIsNone(self._actual(self.useractions[1])[0])
+
+    def test_requires_save(self):
+        ua = self.useractions[0]
+        self.assertFalse(requires_save(ua))
+
+        self.trigger.relative_value = 1
+        self.trigger.relative_units = 'days'
+        ua = UserAction.objects.get(pk=ua.pk)
+        ua.action.default_trigger = self.trigger
+        self.assertTrue(requires_save(ua))
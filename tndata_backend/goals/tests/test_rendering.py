@@ -0,0 +1,53 @@
+from io import StringIO
+from unittest.mock import patch
+
+from django.core.management import call_command
+from django.test import TestCase
+
+from model_mommy import mommy
+
+from .. import rendering
+from .. models import Action, Category, Goal
+from .. serializers.v2 import ActionSerializer
+
+
+class TestRendering(TestCase):
+
+    def test_rendered_on_save(self):
+        category = mommy.make(
+            Category, title='Cat', description='A *cat*', consent_summary='**ok**')
+        self.assertEqual(category.rendered_description, '<p>A <em>cat</em></p>')
+        self.assertEqual(category.rendered_consent_summary, '<p><strong>ok</strong></p>')
+        self.assertEqual(category.rendered_consent_more, '')
+        self.assertFalse(rendering.is_stale(category))
+
+        goal = mommy.make(Goal, title='Goal', description=' A *goal* ')
+        self.assertEqual(goal.rendered_description, '<p>A <em>goal</em></p>')
+
+        action = mommy.make(Action, title='Action', description='A', more_info='- B')
+        action.more_info = '- C'
+        action.save()
+        self.assertEqual(action.rendered_description, '<p>A</p>')
+        self.assertEqual(action.rendered_more_info, '<ul>\n<li>C</li>\n</ul>')
+
+    def test_serializers_use_stored_html(self):
+        action = mommy.make(Action, title='Action', description='*A*')
+        with patch('goals.rendering.markdown') as markdown:
+            data = ActionSerializer(action).data
+            self.assertFalse(markdown.called)
+        self.assertEqual(data['html_description'], '<p><em>A</em></p>')
+
+    def test_render_markdown_command(self):
+        goal = mommy.make(Goal, title='Goal', description='*old*')
+        Goal.objects.filter(pk=goal.pk).update(description='*new*')
+        goal.refresh_from_db()
+        self.assertTrue(rendering.is_stale(goal))
+
+        out = StringIO()
+        call_command('render_markdown', '--check', stdout=out)
+        self.assertIn("Goal: 1 stale", out.getvalue())
+
+        call_command('render_markdown', stdout=StringIO())
+        goal.refresh_from_db()
+        self.assertFalse(rendering.is_stale(goal))
+        self.assertEqual(goal.rendered_description, '<p><em>new</em></p>')
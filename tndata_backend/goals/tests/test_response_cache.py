@@ -0,0 +1,100 @@
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.urlresolvers import reverse
+from django.test import override_settings
+from model_mommy import mommy
+from rest_framework.test import APITestCase
+from waffle.testutils import override_switch
+
+from .. import response_cache
+from .. models import Action, Category, Goal, Organization
+from .. transitions import draft_tree
+
+
+TEST_CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'response-cache-tests',
+    }
+}
+
+
+@override_settings(CACHES=TEST_CACHES)
+@override_switch(response_cache.RESPONSE_CACHE_SWITCH, active=True)
+@patch('goals.response_cache.metric')
+class TestResponseCache(APITestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.category = mommy.make(Category, title='Cat', state='published')
+        self.goal = mommy.make(Goal, title='Goal', state='published')
+        self.goal.categories.add(self.category)
+        self.url = reverse('goal-list') + '?version=2'
+
+    def _get(self, url):
+        resp = self.client.get(url)
+        self.assertEqual(resp.status_code, 200)
+        return resp
+
+    def test_hits_skip_the_viewset(self, metric):
+        resp = self._get(self.url)
+        self.assertEqual(resp.data['count'], 1)
+        metric.assert_any_call('response-cache-miss GoalViewSet.list', category='Response Cache')
+
+        with patch('goals.api.GoalViewSet.get_queryset') as get_queryset:
+            cached = self._get(self.url)
+            self.assertFalse(get_queryset.called)
+        self.assertEqual(cached.data, resp.data)
+        metric.assert_any_call('response-cache-hit GoalViewSet.list', category='Response Cache')
+
+        # The same params, in a different order, use the same response.
+        self._get(self.url + '&page=1')
+        with patch('goals.api.GoalViewSet.get_queryset') as get_queryset:
+            self._get(reverse('goal-list') + '?page=1&version=2')
+            self.assertFalse(get_queryset.called)
+
+    def test_saving_content_invalidates(self, metric):
+        self._get(self.url)
+        version = response_cache.content_version()
+
+        self.goal.title = 'New Title'
+        self.goal.save()
+        self.assertGreater(response_cache.content_version(), version)
+        resp = self._get(self.url)
+        self.assertEqual(resp.data['results'][0]['title'], 'New Title')
+
+        # As does a bulk transition.
+        version = response_cache.content_version()
+        draft_tree([self.category])
+        self.assertGreater(response_cache.content_version(), version)
+        resp = self._get(self.url)
+        self.assertEqual(resp.data['count'], 0)
+
+    def test_m2m_changes_invalidate(self, metric):
+        action = mommy.make(Action, title='Action', state='published')
+        url = reverse('action-list') + '?version=2&goal={}'.format(self.goal.id)
+        resp = self._get(url)
+        self.assertEqual(resp.data['count'], 0)
+
+        action.goals.add(self.goal)
+        resp = self._get(url)
+        self.assertEqual(resp.data['count'], 1)
+
+    def test_organization_changes_invalidate(self, metric):
+        url = reverse('category-list') + '?version=2'
+        resp = self._get(url)
+        self.assertEqual(resp.data['count'], 1)
+
+        # Categories in an organization aren't public.
+        organization = mommy.make(Organization, name='Org')
+        self.category.organizations.add(organization)
+        resp = self._get(url)
+        self.assertEqual(resp.data['count'], 0)
+
+    def test_authenticated_requests_are_not_cached(self, metric):
+        user = get_user_model().objects.create_user('u', 'u@example.com', 'p')
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + user.auth_token.key)
+        self._get(self.url)
+        self.assertFalse(metric.called)
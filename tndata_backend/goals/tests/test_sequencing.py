@@ -4,22 +4,29 @@ sequencing results in the user seeing the correct data based on their
 'progress' in responding to notifications.
 
 """
+from io import StringIO
+
 from django.contrib.auth import get_user_model
+from django.core.management import call_command
 from django.test import TestCase
 from model_mommy import mommy
+from waffle.testutils import override_switch
 
 from .. models import (
     Action,
     Category,
     Goal,
+    SequenceState,
     Trigger,
     UserCompletedAction,
 )
-from .. sequence import get_next_useractions_in_sequence
+from .. sequence import SEQUENCE_STATE_SWITCH, get_next_useractions_in_sequence
 
 
 def _complete_goal(user, title):
     user.usergoal_set.filter(goal__title=title).update(completed=True)
+    # update() skips the signals that keep the SequenceState in sync.
+    SequenceState.objects.update_for(user)
 
 
 def _complete_action(user, action_title):
@@ -214,6 +221,49 @@ class TestSequencing(TestCase):
         )
 
 
+class TestSequencingWithSequenceState(TestSequencing):
+    """Runs the same scenario as TestSequencing, but using the materialized
+    SequenceState table."""
+
+    def setUp(self):
+        switch = override_switch(SEQUENCE_STATE_SWITCH, active=True)
+        switch.__enter__()
+        self.addCleanup(switch.__exit__, None, None, None)
+
+    def test_state(self):
+        # Created on demand.
+        self.assertFalse(SequenceState.objects.filter(user=self.user).exists())
+        get_next_useractions_in_sequence(self.user)
+        state = SequenceState.objects.get(user=self.user)
+        self.assertEqual(state.goal_order, 0)
+        self.assertEqual(state.action_order, 0)
+        self.assertEqual(state.sequence_order, 0)
+
+        # Updated incrementally
+        for action in ['AA', 'AB', 'AC', 'BJ', 'BK', 'CN', 'CO']:
+            _complete_action(self.user, action)
+        state = SequenceState.objects.get(user=self.user)
+        self.assertEqual(state.action_order, 1)
+        self.assertEqual(state.sequence_order, 1)
+        self.assertEqual(list(SequenceState.objects.inconsistencies()), [])
+
+    def test_reset_when_content_changes(self):
+        SequenceState.objects.for_user(self.user)
+        Action.objects.get(title='AA').save()
+        self.assertFalse(SequenceState.objects.filter(user=self.user).exists())
+
+    def test_inconsistencies(self):
+        state = SequenceState.objects.for_user(self.user)
+        SequenceState.objects.filter(pk=state.pk).update(action_order=5)
+        results = list(SequenceState.objects.inconsistencies())
+        self.assertEqual(len(results), 1)
+        self.assertEqual(results[0][1]['action_order'], 0)
+
+        # Which can be fixed by rebuilding the table.
+        call_command('rebuild_sequence_state', stdout=StringIO())
+        self.assertEqual(list(SequenceState.objects.inconsistencies()), [])
+
+
 class TestContentCompletion(TestCase):
     """Ensure that when a user completes all actions in a Goal, the UserGoal
     is marked as completed.
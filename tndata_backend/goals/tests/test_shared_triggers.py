@@ -0,0 +1,83 @@
+from datetime import time
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase
+
+from waffle.testutils import override_switch
+
+from .. import shared_triggers
+from .. models import Action, Trigger
+
+
+class TestSharedTriggers(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        User = get_user_model()
+        self.user = User.objects.create_user('st', 'st@example.com', 'pass')
+        self.user.userprofile.timezone = "America/Chicago"
+        self.user.userprofile.save()
+
+        self.trigger = Trigger.objects.create(
+            name="Shared default",
+            time=time(12, 34),
+            recurrences="RRULE:FREQ=DAILY"
+        )
+        self.action = Action.objects.create(
+            title="Shared",
+            default_trigger=self.trigger,
+            state='published',
+        )
+
+    def test_is_shareable(self):
+        self.assertTrue(shared_triggers.is_shareable(self.trigger))
+        self.assertFalse(shared_triggers.is_shareable(None))
+
+        custom = Trigger(name="custom", user=self.user, time=time(8, 0))
+        self.assertFalse(shared_triggers.is_shareable(custom))
+
+        dynamic = Trigger(name="dyn", time_of_day='morning', frequency='daily')
+        self.assertFalse(shared_triggers.is_shareable(dynamic))
+
+    def test_fingerprint_changes_with_schedule(self):
+        before = shared_triggers.fingerprint(self.trigger)
+        self.trigger.time = time(13, 0)
+        self.assertNotEqual(before, shared_triggers.fingerprint(self.trigger))
+
+    def test_compute(self):
+        valid_from, valid_until, next_date = shared_triggers.compute(
+            self.trigger, "America/Chicago"
+        )
+        self.assertIsNotNone(next_date)
+        self.assertLess(valid_from, valid_until)
+        self.assertLessEqual(valid_until, next_date)
+
+    def test_shared_next_switch_off(self):
+        self.assertEqual(
+            shared_triggers.shared_next(self.trigger, self.user),
+            self.trigger.next(user=self.user)
+        )
+
+    @override_switch(shared_triggers.SWITCH, active=True)
+    def test_shared_next_matches_trigger_next(self):
+        expected = self.trigger.next(user=self.user)
+        self.assertEqual(shared_triggers.shared_next(self.trigger, self.user), expected)
+
+        # The second call is served from the cache.
+        key = shared_triggers._cache_key(self.trigger, "America/Chicago")
+        self.assertIsNotNone(cache.get(key))
+        self.assertEqual(shared_triggers.shared_next(self.trigger, self.user), expected)
+
+    def test_precompute(self):
+        triggers = shared_triggers.default_triggers()
+        self.assertIn(self.trigger, triggers)
+
+        count = shared_triggers.precompute(triggers, ["America/Chicago", "UTC"])
+        self.assertEqual(count, 2)
+        for tz in ["America/Chicago", "UTC"]:
+            key = shared_triggers._cache_key(self.trigger, tz)
+            self.assertIsNotNone(cache.get(key))
+
+    def test_timezones_in_use(self):
+        self.assertIn("America/Chicago", shared_triggers.timezones_in_use())
@@ -0,0 +1,165 @@
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from model_mommy import mommy
+from utils.user_utils import local_day_range
+
+from .. models import (
+    Action,
+    CheckinStreak,
+    CustomAction,
+    DailyProgress,
+    UserAction,
+    UserCompletedAction,
+    UserCompletedCustomAction,
+)
+from .. snapshots import snapshot_daily_progress
+
+
+User = get_user_model()
+
+FIELDS = [
+    'actions_total', 'actions_completed', 'actions_snoozed',
+    'actions_dismissed', 'customactions_total', 'customactions_completed',
+    'customactions_snoozed', 'customactions_dismissed', 'checkin_streak',
+    'engagement_15_days', 'engagement_30_days', 'engagement_60_days',
+]
+
+
+class TestSnapshotDailyProgress(TestCase):
+    """Verify that the set-based snapshots give the same results as creating
+    them one user at a time (which is how `daily_progress_snapshot` used to
+    work)."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.users = [
+            User.objects.create_user('u{}'.format(i), 'u{}@x.com'.format(i), 'p')
+            for i in range(3)
+        ]
+        # Put one user in a different timezone.
+        profile = cls.users[2].userprofile
+        profile.timezone = 'Asia/Tokyo'
+        profile.save()
+
+        actions = [
+            mommy.make(Action, title='a{}'.format(i), state='published')
+            for i in range(3)
+        ]
+        states = [
+            UserCompletedAction.COMPLETED,
+            UserCompletedAction.SNOOZED,
+            UserCompletedAction.DISMISSED,
+            UserCompletedAction.UNCOMPLETED,
+        ]
+        now = timezone.now()
+        for u, user in enumerate(cls.users):
+            for a, action in enumerate(actions[:u + 1]):
+                ua = mommy.make(UserAction, user=user, action=action)
+                ca = mommy.make(CustomAction, user=user, title='ca{}'.format(a))
+                for i, state in enumerate(states[a:] + states[:a]):
+                    uca = mommy.make(
+                        UserCompletedAction, user=user, useraction=ua,
+                        action=action, state=state
+                    )
+                    ucca = mommy.make(
+                        UserCompletedCustomAction, user=user,
+                        customaction=ca, state=state
+                    )
+                    # Spread completions over the engagement windows.
+                    created = now - timedelta(days=[0, 20, 45, 90][i])
+                    UserCompletedAction.objects.filter(pk=uca.pk).update(
+                        created_on=created)
+                    UserCompletedCustomAction.objects.filter(pk=ucca.pk).update(
+                        created_on=created)
+
+        # The first user checked in yesterday.
+        yesterday = DailyProgress.objects.create(user=cls.users[0])
+        DailyProgress.objects.filter(pk=yesterday.pk).update(
+            created_on=now - timedelta(days=1),
+            checkin_streak=4
+        )
+        # Start tracking their streak from that DailyProgress.
+        CheckinStreak.objects.filter(user=cls.users[0]).delete()
+
+    def _expected(self):
+        """Create snapshots one user at a time, returning their values."""
+        results = {}
+        for user in self.users:
+            progress = DailyProgress.objects.for_today(user)
+            progress.update_stats()
+            progress.calculate_engagement(days=15)
+            progress.calculate_engagement(days=30)
+            progress.calculate_engagement(days=60)
+            progress.save()
+            results[user.id] = {f: getattr(progress, f) for f in FIELDS}
+        return results
+
+    def _today(self, user):
+        return DailyProgress.objects.get(
+            user=user,
+            created_on__range=local_day_range(user)
+        )
+
+    def _assert_snapshots(self, expected):
+        for user in self.users:
+            dp = self._today(user)
+            for field in FIELDS:
+                self.assertAlmostEqual(
+                    getattr(dp, field), expected[user.id][field], places=2,
+                    msg=field
+                )
+
+    def test_snapshot_creates_daily_progress(self):
+        expected = self._expected()
+        for user in self.users:
+            self._today(user).delete()
+
+        self.assertEqual(snapshot_daily_progress(User.objects.all()), 3)
+        self._assert_snapshots(expected)
+        self.assertEqual(self._today(self.users[0]).checkin_streak, 5)
+        streak = CheckinStreak.objects.get(user=self.users[0])
+        self.assertEqual(streak.current_streak, 5)
+
+    def test_snapshot_updates_daily_progress(self):
+        expected = self._expected()
+        DailyProgress.objects.filter(
+            created_on__gte=timezone.now() - timedelta(hours=12)
+        ).update(**{f: 0 for f in FIELDS if f != 'checkin_streak'})
+
+        self.assertEqual(snapshot_daily_progress(User.objects.all()), 3)
+        self._assert_snapshots(expected)
+
+    def test_num_queries_independent_of_users(self):
+        users = User.objects.filter(userprofile__timezone=self.users[0].userprofile.timezone)
+        with CaptureQueriesContext(connection) as one_user:
+            snapshot_daily_progress(users.filter(pk=self.users[0].pk))
+        DailyProgress.objects.all().delete()
+        CheckinStreak.objects.all().delete()
+        with CaptureQueriesContext(connection) as many_users:
+            snapshot_daily_progress(users)
+        self.assertEqual(len(one_user), len(many_users))
+
+    def test_engagement_matches_usercompletedaction_engagement(self):
+        # 1 of 32 completed is a tie (3.125), which both round up.
+        tie = User.objects.create_user('tie', 'tie@x.com', 'p')
+        action = mommy.make(Action, title='tie', state='published')
+        ua = mommy.make(UserAction, user=tie, action=action)
+        mommy.make(UserCompletedAction, user=tie, useraction=ua, action=action,
+                   state=UserCompletedAction.COMPLETED)
+        mommy.make(UserCompletedAction, user=tie, useraction=ua, action=action,
+                   state=UserCompletedAction.SNOOZED, _quantity=31)
+
+        snapshot_daily_progress(User.objects.all())
+        func = UserCompletedAction.objects.engagement
+        self.assertEqual(func(tie, days=15), 3.13)
+        for user in self.users + [tie]:
+            dp = self._today(user)
+            self.assertEqual(dp.engagement_15_days, func(user, days=15))
+            self.assertEqual(dp.engagement_30_days, func(user, days=30))
+            self.assertEqual(dp.engagement_60_days, func(user, days=60))
@@ -0,0 +1,91 @@
+from unittest.mock import patch
+
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+
+from model_mommy import mommy
+
+from .. models import Action, Category, Goal
+from .. transitions import draft_tree, publish_tree
+
+
+class TestTransitions(TestCase):
+
+    def _tree(self, title, num_goals, num_actions, state='draft'):
+        category = mommy.make(Category, title=title, state=state)
+        for g in range(num_goals):
+            goal = mommy.make(Goal, title='{} goal {}'.format(title, g), state=state)
+            goal.categories.add(category)
+            for a in range(num_actions):
+                action = mommy.make(
+                    Action, title='{} action {}-{}'.format(title, g, a), state=state)
+                action.goals.add(goal)
+        return category
+
+    def _states(self, model):
+        return dict(model.objects.values_list('title', 'state'))
+
+    @patch('goals.transitions.remove_queued_messages')
+    def test_publish_tree(self, remove_queued_messages):
+        category = self._tree('C', 2, 2)
+        declined = Goal.objects.get(title='C goal 1')
+        declined.state = 'declined'
+        declined.save()
+
+        count = publish_tree([category])
+        self.assertEqual(count, 6)  # the category, 1 goal, 4 actions
+
+        category.refresh_from_db()
+        self.assertEqual(category.state, 'published')
+        self.assertEqual(
+            self._states(Goal), {'C goal 0': 'published', 'C goal 1': 'declined'})
+        self.assertEqual(set(self._states(Action).values()), {'published'})
+        self.assertEqual(
+            Goal.objects.get(title='C goal 0').category_ids, [category.id])
+
+        # One job removes the queued messages for all of the actions.
+        action_ids = sorted(Action.objects.values_list('id', flat=True))
+        remove_queued_messages.delay.assert_called_once_with(action_ids)
+
+    @patch('goals.transitions.remove_queued_messages')
+    def test_draft_tree(self, remove_queued_messages):
+        category = self._tree('C', 2, 1, state='published')
+        other = self._tree('O', 1, 0, state='published')
+
+        # Goal 0 is also in another published category, and action 1-0 is
+        # also in that goal; neither should be drafted.
+        Goal.objects.get(title='C goal 0').categories.add(other)
+        Action.objects.get(title='C action 1-0').goals.add(Goal.objects.get(title='C goal 0'))
+        Action.objects.get(title='C action 0-0').goals.add(Goal.objects.get(title='C goal 1'))
+
+        count = draft_tree([category])
+        self.assertEqual(count, 2)  # the category & goal 1
+        self.assertEqual(self._states(Goal), {
+            'C goal 0': 'published',
+            'C goal 1': 'draft',
+            'O goal 0': 'published',
+        })
+        self.assertEqual(self._states(Action), {
+            'C action 0-0': 'published',
+            'C action 1-0': 'published',
+        })
+        self.assertEqual(Goal.objects.get(title='C goal 0').category_ids, [other.id])
+        self.assertFalse(remove_queued_messages.delay.called)
+
+        # Drafting the goal (an Action's only published parent) drafts it.
+        count = draft_tree([Goal.objects.get(title='C goal 0')])
+        self.assertEqual(count, 3)
+        self.assertEqual(set(self._states(Action).values()), {'draft'})
+        remove_queued_messages.delay.assert_called_once_with(
+            sorted(Action.objects.values_list('id', flat=True)))
+
+    @patch('goals.transitions.remove_queued_messages')
+    def test_num_queries_independent_of_tree_size(self, remove_queued_messages):
+        small = self._tree('S', 1, 1)
+        large = self._tree('L', 4, 5)
+        with CaptureQueriesContext(connection) as small_queries:
+            publish_tree([small])
+        with CaptureQueriesContext(connection) as large_queries:
+            publish_tree([large])
+        self.assertEqual(len(small_queries), len(large_queries))
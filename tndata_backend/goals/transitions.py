@@ -0,0 +1,174 @@
+"""
+Cascading state transitions for trees of content.
+
+Publishing a Category "and all child content" used to call `publish()` and
+`save()` on every Goal and Action, and drafting a Category drafted its Goals
+(and their Actions) one at a time. Every Action save queued its own RQ job to
+remove the Action's queued notifications.
+
+`publish_tree` and `draft_tree` instead find the affected content in a few
+queries, change its `state` with one UPDATE per model (in a single
+transaction), then do the work that the skipped `save()` calls would have:
+
+- refreshing each Goal's `category_ids`
+- resetting the SequenceState of users that selected the content
+- invalidating the affected package calendars
+- queueing program enrollment for newly published goals
+- queueing *one* job to remove the queued notifications of every affected
+  Action (see `remove_queued_messages`)
+- bumping the content version (see goals.response_cache).
+
+"""
+from django.contrib.contenttypes.models import ContentType
+from django.db import connection, transaction
+from django.db.models import Q
+from django.utils import timezone
+from django_rq import job
+
+from .models import (
+    Action,
+    Category,
+    Goal,
+    Program,
+    SequenceState,
+    UserAction,
+    UserGoal,
+)
+from .models.public import _enroll_program_members
+from .response_cache import bump_content_version
+
+
+PUBLISHABLE_STATES = ['draft', 'pending-review']
+
+CATEGORY_IDS_SQL = """
+    UPDATE goals_goal g SET category_ids = COALESCE((
+        SELECT array_agg(c.id ORDER BY c.id)
+        FROM goals_goal_categories gc
+        INNER JOIN goals_category c ON c.id = gc.category_id
+        WHERE gc.goal_id = g.id AND c.state = 'published'
+    ), '{}')
+    WHERE g.id = ANY(%s)
+"""
+
+
+def _ids_by_model(objects):
+    """Split a list of Categories, Goals & Actions into sets of their ids."""
+    ids = {Category: set(), Goal: set(), Action: set()}
+    for obj in objects:
+        ids[obj.__class__].add(obj.id)
+    return ids[Category], ids[Goal], ids[Action]
+
+
+def _set_state(model, ids, state, updated_by):
+    values = {'state': state, 'updated_on': timezone.now()}
+    if updated_by is not None:
+        values['updated_by'] = updated_by
+    return model.objects.filter(id__in=ids).update(**values)
+
+
+@job
+def remove_queued_messages(action_ids):
+    """Delete the unsent GCMMessages for all of the given Actions. This is
+    the bulk version of `Action.remove_queued_messages`."""
+    from notifications.models import GCMMessage
+    GCMMessage.objects.filter(
+        content_type=ContentType.objects.get_for_model(Action),
+        object_id__in=list(action_ids),
+        success=None  # only messages that haven't been sent.
+    ).delete()
+
+
+def _after_transition(goal_ids, action_ids, published_goal_ids=None):
+    """Do the work that saving each changed Goal & Action would have done."""
+    from .package_calendar import invalidate  # Avoid a circular import.
+
+    if goal_ids:
+        with connection.cursor() as cursor:
+            cursor.execute(CATEGORY_IDS_SQL, [list(goal_ids)])
+
+    users = UserAction.objects.filter(action_id__in=action_ids).values('user')
+    usergoal_users = UserGoal.objects.filter(goal_id__in=goal_ids).values('user')
+    SequenceState.objects.filter(
+        Q(user__in=users) | Q(user__in=usergoal_users)
+    ).delete()
+
+    categories = Action.goals.through.objects.filter(action_id__in=action_ids)
+    invalidate(categories.values_list('goal__categories', flat=True))
+
+    if published_goal_ids:
+        in_programs = Program.auto_enrolled_goals.through.objects.filter(
+            goal_id__in=published_goal_ids)
+        for goal in Goal.objects.filter(id__in=in_programs.values('goal_id')):
+            _enroll_program_members.delay(goal)
+
+    if action_ids:
+        remove_queued_messages.delay(sorted(action_ids))
+
+    bump_content_version()
+
+
+def publish_tree(objects, updated_by=None):
+    """Publish the given Categories, Goals, and/or Actions, along with all of
+    their draft (or pending) child content. Returns the number of objects that
+    were published."""
+    category_ids, goal_ids, action_ids = _ids_by_model(objects)
+
+    goals = Goal.objects.filter(Q(id__in=goal_ids) | Q(categories__in=category_ids))
+    goal_ids = set(goals.values_list('id', flat=True))
+    actions = Action.objects.filter(Q(id__in=action_ids) | Q(goals__in=goal_ids))
+    action_ids = set(actions.values_list('id', flat=True))
+
+    publishable = {'state__in': PUBLISHABLE_STATES}
+    published_goal_ids = set(
+        Goal.objects.filter(id__in=goal_ids, **publishable)
+        .values_list('id', flat=True)
+    )
+    published_action_ids = set(
+        Action.objects.filter(id__in=action_ids, **publishable)
+        .values_list('id', flat=True)
+    )
+    with transaction.atomic():
+        count = _set_state(
+            Category,
+            Category.objects.filter(id__in=category_ids, **publishable).values('id'),
+            'published',
+            updated_by
+        )
+        count += _set_state(Goal, published_goal_ids, 'published', updated_by)
+        count += _set_state(Action, published_action_ids, 'published', updated_by)
+
+    _after_transition(goal_ids, published_action_ids, published_goal_ids)
+    return count
+
+
+def draft_tree(objects, updated_by=None):
+    """Revert the given Categories, Goals, and/or Actions to draft. As with
+    `Category.draft` and `Goal.draft`, their published child content is also
+    drafted, unless it has another published parent. Returns the number of
+    objects that were drafted."""
+    category_ids, goal_ids, action_ids = _ids_by_model(objects)
+
+    # Published goals (in the categories) with no other published category.
+    other_categories = Category.objects.filter(state='published')
+    other_categories = other_categories.exclude(id__in=category_ids)
+    goals = Goal.objects.filter(categories__in=category_ids, state='published')
+    goals = goals.exclude(categories__in=other_categories)
+    goal_ids |= set(goals.values_list('id', flat=True))
+
+    # Published actions (in those goals) with no other published goal.
+    other_goals = Goal.objects.filter(state='published').exclude(id__in=goal_ids)
+    actions = Action.objects.filter(goals__in=goal_ids, state='published')
+    actions = actions.exclude(goals__in=other_goals)
+    action_ids |= set(actions.values_list('id', flat=True))
+
+    with transaction.atomic():
+        count = _set_state(Category, category_ids, 'draft', updated_by)
+        count += _set_state(Goal, goal_ids, 'draft', updated_by)
+        count += _set_state(Action, action_ids, 'draft', updated_by)
+
+    # Also refresh the category_ids of every goal in the drafted categories.
+    all_goal_ids = goal_ids | set(
+        Goal.objects.filter(categories__in=category_ids).values_list('id', flat=True)
+    )
+    _after_transition(all_goal_ids, action_ids)
+    return count
@@ -50,6 +50,11 @@ urlpatterns = [
         views.enrollment_reminder,
         name='package-reminder'
     ),
+    url(
+        r'^packages/(?P<pk>\d+)/enroll/(?P<batch_id>[0-9a-f]+)/progress/$',
+        views.package_enrollment_progress,
+        name='package-enrollment-progress'
+    ),
     url(
         r'^packages/(?P<pk>\d+)/enroll/$',
         views.PackageEnrollmentView.as_view(),
@@ -225,6 +230,11 @@ urlpatterns = [
         views.CategoryDeleteView.as_view(),
         name='category-delete'
     ),
+    url(
+        r'^categories/duplicate-all/(?P<job_id>[0-9a-f]+)/progress/$',
+        views.duplicate_content_progress,
+        name='duplicate-content-progress'
+    ),
     url(
         r'^categories/(?P<pk>\d+)-(?P<title_slug>.+)/duplicate-all/$',
         views.duplicate_content,
@@ -2,7 +2,6 @@ import logging
 import time
 import tablib
 
-from calendar import Calendar
 from collections import defaultdict, Counter, OrderedDict
 from datetime import datetime, timedelta
 from hashlib import md5
@@ -15,7 +14,7 @@ from django.core.urlresolvers import reverse, reverse_lazy
 from django.db.models import Count, Max, Q, Sum
 from django.db.models.functions import Length
 from django.http import (
-    HttpResponse, HttpResponseBadRequest, HttpResponseForbidden,
+    Http404, HttpResponse, HttpResponseBadRequest, HttpResponseForbidden,
     HttpResponseNotFound, JsonResponse
 )
 from django.shortcuts import get_object_or_404, redirect, render
@@ -27,7 +26,6 @@ from django.utils import timezone
 from django.utils.text import slugify
 
 from django_fsm import TransitionNotAllowed
-from django_rq import job
 from notifications import queue
 from redis_metrics import metric
 from userprofile.forms import UserForm
@@ -37,7 +35,12 @@ from utils.forms import EmailForm, SetNewPasswordForm
 from utils.dateutils import dates_range
 from utils.user_utils import local_day_range, local_now, to_localtime
 
-from . import user_feed
+from . import duplication, transitions, user_feed
+from . cohorts import (
+    ENROLLMENT_BATCH_SESSION_KEY,
+    get_progress as get_enrollment_progress,
+    import_cohort,
+)
 from . email import send_package_cta_email, send_package_enrollment_batch
 from . forms import (
     ActionForm,
@@ -78,6 +81,7 @@ from . models import (
     popular_goals,
     popular_categories,
 )
+from . package_calendar import build_calendar
 from . permissions import (
     ContentPermissions,
     is_content_editor,
@@ -201,31 +205,14 @@ class PublishView(View):
                 obj.save(updated_by=request.user)
                 messages.success(request, "{0} has been declined".format(obj))
             elif confirmed and request.POST.get('draft', False):
-                obj.draft()
-                obj.save(updated_by=request.user)
+                # Drafting cascades to child content.
+                transitions.draft_tree([obj], updated_by=request.user)
                 messages.success(request, "{0} is now in Draft".format(obj))
             elif request.POST.get('draft', False) and selections > 0:
                 context = {'selections': selections, 'object': obj}
                 return render(request, 'goals/confirm_state_change.html', context)
             elif is_superuser and request.POST.get('publish_children', False):
-                count = 0   # count *all* children published.
-                if not obj.state == "published":
-                    obj.publish()
-                    obj.save(updated_by=request.user)
-                    count += 1
-
-                # Now, publish all the children
-                children = obj.publish_children(updated_by=request.user)
-                count += len(children)
-
-                # and the children's children
-                while len(children) > 0:
-                    children = [
-                        item.publish_children(updated_by=request.user)
-                        for item in children
-                    ]
-                    children = [val for sublist in children for val in sublist]
-                    count += len(children)
+                count = transitions.publish_tree([obj], updated_by=request.user)
                 messages.success(request, "Published {} items".format(count))
             return redirect(obj.get_absolute_url())
 
@@ -1322,9 +1309,20 @@ class PackageDetailView(ContentViewerMixin, DetailView):
         context['is_editor'] = editor
         if editor:
             context['enrollments'] = self.object.packageenrollment_set.all()
+            context['enrollment_batch'] = self.request.session.pop(
+                ENROLLMENT_BATCH_SESSION_KEY, None)
         return context
 
 
+@permission_required(ContentPermissions.package_managers)
+def package_enrollment_progress(request, pk, batch_id):
+    """Return the progress of a batch of package enrollments as JSON."""
+    progress = get_enrollment_progress(batch_id)
+    if progress is None:
+        raise Http404
+    return JsonResponse(progress)
+
+
 @permission_required(ContentPermissions.package_managers)
 def package_enrollment_user_details(request, package_id, user_id):
     User = get_user_model()
@@ -1446,14 +1444,16 @@ class PackageEnrollmentView(ContentAuthorMixin, FormView):
         emails = form.cleaned_data['email_addresses']
         prevent_triggers = form.cleaned_data.get('prevent_custom_triggers', False)
 
-        # Create enrollments if necessary.
-        enrollments = PackageEnrollment.objects.batch_enroll(
+        # Create enrollments if necessary. The rest of the per-user work is
+        # done in the background; the package detail page polls its progress.
+        enrollments, batch_id = import_cohort(
             emails,
             self.category,
             goals,
             by=self.request.user,
             prevent_triggers=prevent_triggers
         )
+        self.request.session[ENROLLMENT_BATCH_SESSION_KEY] = batch_id
 
         # send a link to the package enrollment not the user.
         send_package_enrollment_batch(self.request, enrollments)
@@ -1483,59 +1483,20 @@ def package_calendar(request, pk):
         year, month = start.split('-')
         start = to_localtime(datetime(int(year), int(month), 1), request.user)
 
-    # Include recurrences for actions that have both a default trigger AND
-    # where those triggers have a time (otherwise they're essentially invalid)
-    actions = category.actions.filter(
-        default_trigger__isnull=False,
-        default_trigger__time__isnull=False  # exclude invalid triggers
-    )
-
-    # note: start calendar on suday (6)
-    cal = Calendar(firstweekday=6).monthdatescalendar(start.year, start.month)
-    action_data = []
-    stop_on_completes = defaultdict(int)  # Action.id to number of iterations
-    contains_relative_reminders = False
-    for action in actions:
-        kwargs = {'days': 31}  # params for get_occurances
-        if action.default_trigger.is_relative:
-            # XXX: Temporarily set the trigger's start date, so this date
-            # gets used when generating recurrences (which is how this will
-            # work when a user selects the action). Additionally, we need to
-            # temporarily assign a user (the logged in user) to make this work.
-            action.default_trigger.user = request.user
-            start_on = action.default_trigger.relative_trigger_date(start)
-            action.default_trigger.trigger_date = start_on
-
-        # include some meta-data for the stop-on-complete actions
-        action.stop_on_complete = action.default_trigger.stop_on_complete
-
-        for dt in action.default_trigger.get_occurences(**kwargs):
-            stop_counter = None  # A counter for the stop_on_complete triggers.
-            if action.stop_on_complete:
-                stop_on_completes[action.id] += 1
-                stop_counter = stop_on_completes[action.id]
-            action_data.append((dt.date(), dt, action, stop_counter))
-
-        # include a list of goal-ids in the action
-        action.goal_ids = list(action.goals.values_list('id', flat=True))
-        action.is_relative = action.default_trigger.is_relative
-        if action.default_trigger.is_relative:
-            contains_relative_reminders = True
-
-    action_data = sorted(action_data, key=lambda d: d[1].strftime("%Y%m%d%H%M"))
+    # The calendar & occurrences are cached (see goals.package_calendar)
+    data = build_calendar(category, request.user, start)
 
     goals = list(category.goals.values_list('id', 'title'))
     ctx = {
         'is_editor': is_content_editor(request.user),
         'today': local_now(request.user),
         'category': category,
-        'actions': action_data,
-        'calendar': cal,
+        'calendar': data['weeks'],
         'starting_date': start,
-        'next_date': (cal[-1][-1] + timedelta(days=1)).strftime("%Y-%m"),
-        'prev_date': (cal[0][0] - timedelta(days=1)).strftime("%Y-%m"),
+        'next_date': (data['last_day'] + timedelta(days=1)).strftime("%Y-%m"),
+        'prev_date': (data['first_day'] - timedelta(days=1)).strftime("%Y-%m"),
         'goals': goals,
-        'contains_relative_reminders': contains_relative_reminders,
+        'contains_relative_reminders': data['contains_relative_reminders'],
     }
     return render(request, "goals/package_calendar.html", ctx)
 
@@ -1813,16 +1774,13 @@ def admin_batch_assign_keywords(request):
     return render(request, 'goals/admin_batch_assign_keywords.html', context)
 
 
-@job
-def _duplicate_category_content(category, prefix=None):
-    """Given a category and an optional prefix, duplicate all of it's content;
-    NOTE: This is an async RQ task, defined here, because otherwise the
-    view below won't be able to import it (or least I couldn't get it to
-    work)."""
-    if prefix:
-        category.duplicate_content(prefix)
-    else:
-        category.duplicate_content()
+@user_passes_test(staff_required, login_url='/')
+def duplicate_content_progress(request, job_id):
+    """Return the progress of a content duplication as JSON."""
+    progress = duplication.get_progress(job_id)
+    if progress is None:
+        raise Http404
+    return JsonResponse(progress)
 
 
 @user_passes_test(staff_required, login_url='/')
@@ -1832,19 +1790,22 @@ def duplicate_content(request, pk, title_slug):
         form = TitlePrefixForm(request.POST)
         if form.is_valid():
             prefix = form.cleaned_data['prefix']
-            _duplicate_category_content.delay(category, prefix)
+            job_id = duplication.new_job_id()
+            duplication.duplicate_in_background.delay(category.id, prefix, job_id)
             msg = (
                 "Your content is being duplicated and should be available in "
                 "about a minute."
             )
             messages.success(request, msg)
-            return redirect("goals:category-list")
+            url = reverse('goals:duplicate-content', args=[pk, title_slug])
+            return redirect("{}?job={}".format(url, job_id))
     else:
         form = TitlePrefixForm()
 
     context = {
         'category': category,
         'form': form,
+        'job_id': request.GET.get('job'),
     }
     return render(request, 'goals/duplicate_content.html', context)
 
@@ -8,6 +8,7 @@ from rest_framework.authentication import (
     SessionAuthentication, TokenAuthentication
 )
 from rest_framework.response import Response
+from utils.pagination import KeysetPagination
 from utils.user_utils import hash_value
 
 from . import models
@@ -151,6 +152,10 @@ def remove_gcm_device_on_logout(sender, request, user, **kwargs):
             models.GCMDevice.objects.filter(registration_id=registration_id).delete()
 
 
+class GCMMessagePagination(KeysetPagination):
+    ordering = ('id', )
+
+
 class GCMMessageViewSet(mixins.ListModelMixin,
                         mixins.RetrieveModelMixin,
                         mixins.UpdateModelMixin,
@@ -206,6 +211,7 @@ class GCMMessageViewSet(mixins.ListModelMixin,
     queryset = models.GCMMessage.objects.all()
     serializer_class = serializers.GCMMessageSerializer
     permission_classes = [IsOwner]
+    pagination_class = GCMMessagePagination
 
     def get_queryset(self):
         return self.queryset.filter(user__id=self.request.user.id)
@@ -0,0 +1,20 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.conf import settings
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('notifications', '0023_auto_20160523_1940'),
+    ]
+
+    operations = [
+        migrations.AlterIndexTogether(
+            name='gcmmessage',
+            index_together=set([('user', 'id')]),
+        ),
+    ]
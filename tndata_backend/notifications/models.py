@@ -150,6 +150,8 @@ class GCMMessage(models.Model):
     class Meta:
         ordering = ['-success', 'deliver_on', 'priority', '-created_on']
         unique_together = ("user", "title", "message", "deliver_on")
+        # For keyset pagination of a user's messages (see utils.pagination).
+        index_together = [("user", "id")]
         verbose_name = "GCM Message"
         verbose_name_plural = "GCM Messages"
 
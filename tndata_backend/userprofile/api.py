@@ -8,6 +8,7 @@ from django.contrib.auth import get_user_model
 from django.contrib.auth import logout
 from django.core.cache import cache
 from django.db.models import F
+from django.http import StreamingHttpResponse
 from django.utils.text import slugify
 
 from rest_framework import mixins, status, viewsets
@@ -24,6 +25,7 @@ from utils.mixins import VersionedViewSetMixin
 from utils.oauth import verify_token
 from utils.user_utils import get_client_ip, username_hash
 
+from . import data_sections
 from . import models
 from . import permissions
 from .serializers import v1, v2
@@ -274,6 +276,41 @@ class UserDataViewSet(VersionedViewSetMixin, viewsets.ModelViewSet):
         qs = qs.filter(id=self.request.user.id)
         return qs
 
+    def _streams_json(self, request):
+        # The browsable api still gets a regular response.
+        return request.accepted_renderer.format == 'json'
+
+    def list(self, request, *args, **kwargs):
+        """Stream the JSON one section at a time (see data_sections)."""
+        if not self._streams_json(request):
+            return super().list(request, *args, **kwargs)
+
+        users = self.filter_queryset(self.get_queryset())
+        page = self.paginate_queryset(users)
+        envelope = None
+        if page is None:
+            page = list(users)
+        else:
+            envelope = self.get_paginated_response([]).data
+        content = data_sections.stream_users(
+            self.get_serializer_class(),
+            page,
+            self.get_serializer_context(),
+            envelope
+        )
+        return StreamingHttpResponse(content, content_type='application/json')
+
+    def retrieve(self, request, *args, **kwargs):
+        if not self._streams_json(request):
+            return super().retrieve(request, *args, **kwargs)
+
+        content = data_sections.stream_user(
+            self.get_serializer_class(),
+            self.get_object(),
+            self.get_serializer_context()
+        )
+        return StreamingHttpResponse(content, content_type='application/json')
+
 
 class UserFeedViewSet(VersionedViewSetMixin, viewsets.ReadOnlyModelViewSet):
     """ViewSet for the Feed. See userprofile/api_docs for more info."""
@@ -0,0 +1,148 @@
+"""
+Streamed, section-cached responses for the User Data endpoint.
+
+`UserDataSerializer` builds one large payload for a user: a few fields from
+their profile and a list of each kind of their selected content (places,
+categories, goals, actions, custom goals & custom actions). Each of those
+lists is a *section*. Rather than serializing the whole thing in memory,
+`UserDataViewSet` streams the JSON one section at a time (see
+`stream_user` and `stream_users`).
+
+Each section's rendered JSON is cached, keyed by:
+
+- the user and the section name,
+- the api version,
+- the section's version for that user, which is bumped (see `bump`) by the
+  signal handlers when one of the user's objects in that section is saved or
+  deleted (and by the bulk operations that skip those signals), and
+- the public content version (see goals.response_cache), since the sections
+  include the content that the user selected.
+
+so a change to a user's actions only re-renders their `user_actions`.
+
+"""
+import json
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework.renderers import JSONRenderer
+
+
+SECTION_VERSION_KEY = 'userdata-version-{user_id}-{section}'
+SECTION_KEY = 'userdata-{user_id}-{section}-v{api_version}-{version}-{content_version}'
+
+# The number of seconds a rendered section is kept. Some values (e.g. the
+# nightly UserGoal engagement values) are updated in bulk for every user,
+# so this limits how long those may be out of date.
+SECTION_TIMEOUT = getattr(settings, 'USER_DATA_SECTION_TIMEOUT', 60 * 60)
+
+# The sections of the payload, and the models whose objects appear in them.
+SECTIONS = {
+    'places': ['UserPlace'],
+    'user_categories': ['UserCategory'],
+    'user_goals': ['UserGoal'],
+    'user_actions': ['UserAction', 'Trigger'],
+    'customgoals': ['CustomGoal'],
+    'customactions': ['CustomAction', 'Trigger'],
+}
+
+
+def sections_for_model(model_name):
+    """Return the names of the sections that include the given model."""
+    return [name for name, models in SECTIONS.items() if model_name in models]
+
+
+def _version_key(user_id, section):
+    return SECTION_VERSION_KEY.format(user_id=user_id, section=section)
+
+
+def section_version(user_id, section):
+    version = cache.get(_version_key(user_id, section))
+    if version is None:
+        # Start from the current time so a version that's been evicted from
+        # the cache doesn't restart at a value that's already been used.
+        cache.add(_version_key(user_id, section), int(time.time()), None)
+        version = cache.get(_version_key(user_id, section))
+    return version
+
+
+def bump(user_id, sections=None):
+    """Invalidate the given sections (or all of them) of a user's data."""
+    for section in (sections or SECTIONS.keys()):
+        try:
+            cache.incr(_version_key(user_id, section))
+        except ValueError:  # No version yet (or a cache that doesn't do incr).
+            section_version(user_id, section)
+
+
+def bump_for_model(user_id, model_name):
+    """Invalidate the sections of a user's data that include the given
+    model (e.g. 'UserAction')."""
+    bump(user_id, sections_for_model(model_name))
+
+
+def render_section(serializer, user, section, api_version):
+    """Return the rendered JSON (bytes) for a section of the user's data,
+    using the cached copy if it's up to date."""
+    from goals.response_cache import content_version  # Avoid a circular import.
+
+    key = SECTION_KEY.format(
+        user_id=user.id,
+        section=section,
+        api_version=api_version,
+        version=section_version(user.id, section),
+        content_version=content_version(),
+    )
+    content = cache.get(key)
+    if content is None:
+        data = getattr(serializer, 'get_{}'.format(section))(user)
+        content = JSONRenderer().render(data)
+        cache.set(key, content, SECTION_TIMEOUT)
+    return content
+
+
+def stream_user(serializer_class, user, context):
+    """Yield the JSON for one user's data, a field (or section) at a time."""
+    serializer = serializer_class(user, context=context)
+    # Only the fields that `serializer.data` would include (e.g. no password).
+    field_names = [
+        name for name, field in serializer.fields.items()
+        if not field.write_only
+    ]
+    sections = [name for name in field_names if name in SECTIONS]
+    for name in sections:
+        serializer.fields.pop(name)
+    values = serializer.data  # Everything but the sections.
+    api_version = context['request'].version
+
+    yield b'{'
+    for i, name in enumerate(field_names):
+        prefix = b',' if i else b''
+        yield prefix + json.dumps(name).encode('utf8') + b':'
+        if name in sections:
+            yield render_section(serializer, user, name, api_version)
+        else:
+            yield JSONRenderer().render(values[name])
+    yield b'}'
+
+
+def stream_users(serializer_class, users, context, envelope=None):
+    """Yield the JSON for a list of users' data. If an `envelope` (an ordered
+    dict, e.g. the pagination info, whose last item is `results`) is given,
+    the list is its `results`."""
+    if envelope is not None:
+        yield b'{'
+        for name, value in envelope.items():
+            if name != 'results':
+                yield json.dumps(name).encode('utf8') + b':'
+                yield JSONRenderer().render(value) + b','
+        yield b'"results":'
+    yield b'['
+    for i, user in enumerate(users):
+        if i:
+            yield b','
+        yield from stream_user(serializer_class, user, context)
+    yield b']'
+    if envelope is not None:
+        yield b'}'
@@ -0,0 +1,103 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from goals.models import Action, Category, Goal, UserAction, UserGoal
+from userprofile import data_sections
+from userprofile.serializers import v2
+from utils.db import get_max_order
+from utils.decorators import timed
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = (
+        'Creates a user with many UserActions, then compares rendering their '
+        'User Data in memory with streaming it by (cached) sections. All '
+        'changes are rolled back.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--actions',
+            action='store',
+            dest='actions',
+            default=1000,
+            type=int,
+            help="Number of the user's UserActions"
+        )
+
+    def _create_user(self, num_actions):
+        user = get_user_model().objects.create_user(
+            'user-data-benchmark', 'user-data-benchmark@example.com', 'pass')
+        category = Category.objects.create(
+            order=get_max_order(Category),
+            title="User Data Benchmark",
+            state='published'
+        )
+        goal = Goal.objects.create(title="User Data Benchmark", state='published')
+        goal.categories.add(category)
+        UserGoal.objects.create(user=user, goal=goal, primary_category=category)
+        for i in range(num_actions):
+            action = Action.objects.create(
+                title="User Data Benchmark Action {}".format(i),
+                state='published'
+            )
+            action.goals.add(goal)
+        UserAction.objects.bulk_create([
+            UserAction(user=user, action=action, primary_goal=goal,
+                       primary_category=category)
+            for action in goal.action_set.all()
+        ])
+        return user
+
+    def _measure(self, func):
+        """Return a tuple of (number of queries, elapsed time, result)."""
+        with CaptureQueriesContext(connection) as queries:
+            with timed() as t:
+                result = func()
+        return len(queries), t.elapsed, result
+
+    def handle(self, *args, **options):
+        request = Request(APIRequestFactory().get('/api/users/data/'))
+        request.version = '2'
+        context = {'request': request}
+        serializer_class = v2.UserDataSerializer
+
+        def in_memory():
+            data = serializer_class(user, context=context).data
+            return [JSONRenderer().render(data)]
+
+        def streamed():
+            return list(data_sections.stream_user(serializer_class, user, context))
+
+        results = []
+        try:
+            with transaction.atomic():
+                user = self._create_user(options['actions'])
+                results.append(("in memory", self._measure(in_memory)))
+                data_sections.bump(user.id)
+                results.append(("streamed (cold)", self._measure(streamed)))
+                results.append(("streamed (warm)", self._measure(streamed)))
+                data_sections.bump(user.id, ['user_actions'])
+                results.append(("streamed (actions changed)", self._measure(streamed)))
+                raise Rollback
+        except Rollback:
+            pass
+
+        self.stdout.write("{} UserActions:".format(options['actions']))
+        for label, (num_queries, elapsed, chunks) in results:
+            self.stdout.write(
+                "  {}: {} queries, {:.2f}s, {} bytes (largest chunk {} bytes)".format(
+                    label, num_queries, elapsed,
+                    sum(len(chunk) for chunk in chunks),
+                    max(len(chunk) for chunk in chunks)
+                )
+            )
@@ -6,7 +6,7 @@ from datetime import datetime
 from django.conf import settings
 from django.core.urlresolvers import reverse
 from django.db import models
-from django.db.models.signals import post_save
+from django.db.models.signals import post_delete, post_save
 from django.db.models import ObjectDoesNotExist
 from django.dispatch import receiver
 from django.utils.text import slugify
@@ -14,6 +14,8 @@ from django.utils.text import slugify
 from rest_framework.authtoken.models import Token
 from survey.models import Instrument
 
+from . import data_sections
+
 
 class Place(models.Model):
     name = models.CharField(max_length=32, unique=True, db_index=True)
@@ -448,3 +450,10 @@ def create_usertoken(sender, **kwargs):
     """All newly-created Users should also get an API token."""
     if kwargs.get('created', False) and 'instance' in kwargs:
         Token.objects.create(user=kwargs['instance'])
+
+
+@receiver(post_save, sender=UserPlace, dispatch_uid='userplace-user-data')
+@receiver(post_delete, sender=UserPlace, dispatch_uid='userplace-user-data')
+def bump_user_data_places(sender, instance, **kwargs):
+    """Invalidate the cached places section of the user's data."""
+    data_sections.bump_for_model(instance.user_id, 'UserPlace')
@@ -1,16 +1,21 @@
 import hashlib
+import json
 from datetime import date
 from unittest.mock import patch
 
 from django.contrib.auth import get_user_model
+from django.core.cache import cache
 from django.core.urlresolvers import reverse
 from django.test import TestCase, override_settings
 
 from rest_framework import status
-from rest_framework.test import APITestCase
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory, APITestCase
 
+from .. import data_sections
 from .. models import Place, UserPlace, UserProfile
-from .. serializers import UserSerializer
+from .. serializers import UserSerializer, v2
 from utils import user_utils
 from utils.user_utils import username_hash
 
@@ -934,3 +939,60 @@ class TestSimpleProfileAPI(V2APITestCase):
         self.assertEqual(profile.zipcode, '')
         self.assertEqual(profile.birthday, None)
         self.assertEqual(profile.get_sex_display(), "Prefer not to answer")
+
+
+@override_settings(REST_FRAMEWORK=TEST_REST_FRAMEWORK)
+@override_settings(CACHES={
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'user-data-tests',
+    }
+})
+class TestUserDataAPI(V2APITestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.user = get_user_model().objects.create_user('u', 'u@example.com', 'p')
+        self.place = Place.objects.create(name="Home")
+        self.client.credentials(
+            HTTP_AUTHORIZATION='Token ' + self.user.auth_token.key
+        )
+
+    def _get(self):
+        response = self.client.get(self.get_url('userdata-list'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response.streaming)
+        return json.loads(b''.join(response.streaming_content).decode('utf8'))
+
+    def test_streamed_data_matches_the_serializer(self):
+        UserPlace.objects.create(user=self.user, place=self.place)
+        data = self._get()
+        self.assertEqual(data['count'], 1)
+
+        expected = v2.UserDataSerializer(self.user).data
+        expected = json.loads(JSONRenderer().render(expected).decode('utf8'))
+        self.assertEqual(data['results'], [expected])
+        self.assertEqual(len(data['results'][0]['places']), 1)
+
+    def test_sections_are_cached_until_they_change(self):
+        self._get()
+        with patch.object(v2.UserDataSerializer, 'get_places') as get_places:
+            self._get()
+            self.assertFalse(get_places.called)
+
+        UserPlace.objects.create(user=self.user, place=self.place)
+        with patch.object(v2.UserDataSerializer, 'get_user_goals') as get_user_goals:
+            data = self._get()
+            self.assertFalse(get_user_goals.called)
+        self.assertEqual(len(data['results'][0]['places']), 1)
+
+    def test_stream_user_skips_write_only_fields(self):
+        request = Request(APIRequestFactory().get('/api/users/'))
+        request.version = '2'
+        context = {'request': request}
+        content = b''.join(data_sections.stream_user(v2.UserSerializer, self.user, context))
+        data = json.loads(content.decode('utf8'))
+        self.assertNotIn('password', data)
+
+        expected = v2.UserSerializer(self.user, context=context).data
+        self.assertEqual(list(data.keys()), list(expected.keys()))
@@ -0,0 +1,135 @@
+"""
+Buffered api metrics (see `utils.middleware.APIMetricsMiddleware`).
+
+For every api request we count the endpoint's usage (a redis_metrics
+metric in the "API Metrics" category) and keep a running average of its
+response time (a gauge). Writing those for each request meant a handful of
+round trips to Redis: a GET and SET for the gauge (which could also lose
+updates from concurrent requests), and several more for the metric.
+
+Instead, `record` adds the request to a buffer that belongs to the current
+thread, so no locking is needed. Each thread flushes its buffer to Redis
+every `API_METRICS_FLUSH_INTERVAL` seconds (or once it holds
+`API_METRICS_MAX_BUFFERED` requests) with a single pipeline. That pipeline
+writes the same keys as redis_metrics' `metric` and `gauge`, so the metrics
+dashboard works as before. The gauge is updated atomically by a small Lua
+script.
+
+Anything still buffered when a worker exits is lost; that's at most a few
+seconds of requests per thread.
+
+"""
+import threading
+import time
+
+from collections import Counter, defaultdict
+
+from django.conf import settings
+from redis.exceptions import RedisError
+from redis_metrics.utils import get_r
+
+
+CATEGORY = "API Metrics"
+
+# Each request used to update the gauge to the average of its current value
+# and the request's response time, i.e. an exponentially-weighted average
+# that halves the weight of the older values. For a batch of `n` requests,
+# this applies the same weighting using the batch's average:
+#
+#   gauge = gauge * 0.5 ** n + average * (1 - 0.5 ** n)
+#
+# KEYS[1] -- the gauge's key
+# ARGV[1] -- the batch's average response time
+# ARGV[2] -- the weight of the current value (0.5 ** n)
+AVERAGE_GAUGE_SCRIPT = """
+local value = tonumber(ARGV[1])
+local current = redis.call('GET', KEYS[1])
+if current then
+    local weight = tonumber(ARGV[2])
+    value = tonumber(current) * weight + value * (1 - weight)
+end
+value = tostring(value)
+redis.call('SET', KEYS[1], value)
+return value
+"""
+
+
+def flush_interval():
+    return getattr(settings, 'API_METRICS_FLUSH_INTERVAL', 10)
+
+
+def max_buffered():
+    return getattr(settings, 'API_METRICS_MAX_BUFFERED', 500)
+
+
+class MetricsBuffer(threading.local):
+    """Counts and total response times of api requests, by key. Each thread
+    sees its own instance's attributes."""
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.counts = Counter()
+        self.durations = defaultdict(float)
+        self.size = 0
+        self.last_flush = time.time()
+
+    def add(self, key, elapsed):
+        self.counts[key] += 1
+        self.durations[key] += elapsed
+        self.size += 1
+
+    def due(self):
+        return (
+            self.size >= max_buffered() or
+            time.time() - self.last_flush >= flush_interval()
+        )
+
+    def flush(self):
+        counts, durations = self.counts, self.durations
+        self.reset()
+        if counts:
+            write(counts, durations)
+
+
+buffer = MetricsBuffer()
+
+
+def write(counts, durations):
+    """Write the metrics for a number of requests with one pipeline.
+
+    * counts: a dict of the number of requests, by key.
+    * durations: a dict of the total response time of requests, by key.
+
+    """
+    r = get_r()
+    pipe = r.r.pipeline(transaction=False)
+    pipe.sadd(r._categories_key, CATEGORY)
+    for key, num in counts.items():
+        # Same as `redis_metrics.metric(key, num=num, category=CATEGORY)`
+        pipe.sadd(r._metric_slugs_key, key)
+        pipe.sadd(r._category_key(CATEGORY), key)
+        for metric_key in r._build_keys(key):
+            pipe.incr(metric_key, num)
+
+        # And the gauge.
+        pipe.sadd(r._gauge_slugs_key, key)
+        # NOTE: EVAL rather than EVALSHA, so the pipeline doesn't need an
+        # extra round trip to check that the script is loaded.
+        pipe.eval(
+            AVERAGE_GAUGE_SCRIPT, 1, r._gauge_key(key),
+            durations[key] / num, 0.5 ** num
+        )
+    try:
+        pipe.execute()
+    except RedisError:
+        pass  # Drop this batch rather than failing the request.
+
+
+def record(key, elapsed):
+    """Record an api request (for the given key) that took `elapsed` seconds,
+    and flush the current thread's buffer if it's due."""
+    buffer.add(key, elapsed)
+    if buffer.due():
+        buffer.flush()
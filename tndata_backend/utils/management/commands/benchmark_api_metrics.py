@@ -0,0 +1,71 @@
+from django.core.management.base import BaseCommand
+from django.test import RequestFactory
+from redis_metrics import gauge, metric
+from redis_metrics.utils import get_r
+
+from utils import api_metrics
+from utils.decorators import timed
+from utils.middleware import APIMetricsMiddleware
+
+
+KEY = 'api-metrics-benchmark'
+
+
+class Command(BaseCommand):
+    help = (
+        'Measures the overhead per request of recording api metrics: writing '
+        'them to Redis on every request (as we used to) vs. buffering them '
+        'and flushing them periodically. Uses (and then removes) an '
+        '"{}" metric.'.format(KEY)
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--requests',
+            action='store',
+            dest='requests',
+            default=1000,
+            type=int,
+            help="Number of requests to simulate"
+        )
+
+    def _unbuffered(self, num):
+        """The metrics written for every request (a gauge GET & SET, and a
+        metric), as APIMetricsMiddleware used to do."""
+        r = get_r()
+        for i in range(num):
+            current = r.get_gauge(KEY)
+            request_time = 0.1
+            if current is not None:
+                request_time = (float(current) + request_time) / 2
+            gauge(KEY, request_time)
+            metric(KEY, category=api_metrics.CATEGORY)
+
+    def _buffered(self, num):
+        mid = APIMetricsMiddleware()
+        request = RequestFactory().get('/{}/'.format(KEY.replace('-', '/')))
+        response = None
+        for i in range(num):
+            mid.process_request(request)
+            mid.process_response(request, response)
+        api_metrics.buffer.flush()  # Include writing whatever is left.
+
+    def handle(self, *args, **options):
+        num = options['requests']
+        api_metrics.buffer.flush()
+
+        results = []
+        for label, func in [("unbuffered", self._unbuffered), ("buffered", self._buffered)]:
+            with timed() as t:
+                func(num)
+            results.append((label, t.elapsed))
+
+        r = get_r()
+        r.delete_metric(KEY)
+        r.delete_gauge(KEY)
+        r.r.srem(r._category_key(api_metrics.CATEGORY), KEY)
+
+        self.stdout.write("{} requests:".format(num))
+        for label, elapsed in results:
+            self.stdout.write("  {}: {:.3f}s ({:.1f}us per request)".format(
+                label, elapsed, elapsed / num * 1000000))
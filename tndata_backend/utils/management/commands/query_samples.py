@@ -0,0 +1,55 @@
+from collections import defaultdict
+
+from django.core.management.base import BaseCommand
+from utils import querybudget
+
+
+class Command(BaseCommand):
+    help = (
+        'Summarizes the requests whose queries were sampled by the '
+        'QueryBudgetMiddleware: the views that run the most queries, and the '
+        'most repeated queries (likely N+1 patterns).'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--count',
+            action='store',
+            dest='count',
+            default=1000,
+            type=int,
+            help="Number of (the most recent) samples to examine"
+        )
+        parser.add_argument(
+            '--top',
+            action='store',
+            dest='top',
+            default=10,
+            type=int,
+            help="Number of views & repeated queries to list"
+        )
+
+    def handle(self, *args, **options):
+        samples = querybudget.samples(options['count'])
+        threshold = querybudget.repeat_threshold()
+
+        views = defaultdict(list)  # view -> query counts
+        repeated = defaultdict(list)  # (shape, site) -> counts per request
+        for sample in samples:
+            views[sample['view']].append(sample['count'])
+            for group in sample['groups']:
+                if group['count'] >= threshold:
+                    repeated[(group['shape'], group['site'])].append(group['count'])
+
+        self.stdout.write("{} samples\n".format(len(samples)))
+        self.stdout.write("Views (by average number of queries):")
+        views = sorted(views.items(), key=lambda v: sum(v[1]) / len(v[1]), reverse=True)
+        for view, counts in views[:options['top']]:
+            self.stdout.write("  {}: {:.1f} queries (max {}) in {} requests".format(
+                view, sum(counts) / len(counts), max(counts), len(counts)))
+
+        self.stdout.write("\nRepeated queries (by number of requests):")
+        repeated = sorted(repeated.items(), key=lambda r: len(r[1]), reverse=True)
+        for (shape, site), counts in repeated[:options['top']]:
+            self.stdout.write("  {} requests, up to {} times, from {}:\n    {}".format(
+                len(counts), max(counts), site, shape))
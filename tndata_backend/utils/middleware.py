@@ -1,4 +1,6 @@
+import logging
 import pytz
+import random
 import re
 import time
 
@@ -7,11 +9,12 @@ from django.http import HttpResponse, HttpResponseRedirect
 from django.shortcuts import render
 from django.utils import timezone
 
-from redis_metrics import gauge, metric
-from redis_metrics.utils import get_r
+from . import api_metrics, querybudget
 
 TZ_SESSION_KEY = "django_timezone"
 
+logger = logging.getLogger(__name__)
+
 
 class APIMetricsMiddleware:
     """Middleware to track metrics for our api.
@@ -19,16 +22,16 @@ class APIMetricsMiddleware:
     Currently tracked are:
 
     - endpoint usage: we just count how many times an endpoint is requested
-    - response time: this is a gauge that gets updated on every request
-      with an average response time.
+    - response time: this is a gauge that gets updated with an average
+      response time.
 
-    """
-    def __init__(self, *args, **kwargs):
-        self._key = None   # ONLY track api metrics
-        self._start_time = None
-        self._end_time = None
-        super().__init__(*args, **kwargs)
+    Metrics are buffered in-process and written to Redis periodically; see
+    `utils.api_metrics`.
+
+    NOTE: A single instance of this class handles every request (in every
+    thread), so all per-request state is kept on the request.
 
+    """
     def _get_request_key(self, request):
         key = None   # ONLY track api metrics
         if request.path.startswith("/api/"):
@@ -41,40 +44,115 @@ class APIMetricsMiddleware:
             key = re.sub('\d+', 'detail', key)
         return key
 
-    def _current_average_response_time(self):
-        # Assume `_start_time` and `_end_time` are set, retrieve the current
-        # gauge value (if any), average the current response time, and return
-        # the value (as a string).
+    def process_request(self, request):
+        key = self._get_request_key(request)
+        if key is not None:
+            request._api_metrics = (key, time.time())
 
-        r = get_r()
-        request_time = self._end_time - self._start_time
+    def process_response(self, request, response):
+        metrics = getattr(request, '_api_metrics', None)
+        if metrics is not None:
+            key, start_time = metrics
+            api_metrics.record(key, time.time() - start_time)
+        return response
 
-        current = r.get_gauge(self._key)
-        if current is not None:
-            current = (float(current) + request_time) / 2
-        else:
-            current = request_time
-        return current
 
-    def process_request(self, request):
-        self._key = self._get_request_key(request)
-        if self._key is not None:
-            self._start_time = time.time()
+class QueryBudgetMiddleware(object):
+    """Records the SQL executed by views, checks it against the view's
+    `query_budget`, and looks for repeated queries (N+1 patterns). See
+    `utils.querybudget` for details.
 
-    def process_response(self, request, response):
-        if self._key and self._start_time:
-            # Capture the ending time and update our gauge
-            self._end_time = time.time()
+    Requests are always recorded when DEBUG (or QUERY_BUDGET_STRICT) is on;
+    otherwise a QUERY_BUDGET_SAMPLE_RATE fraction of them are recorded, and
+    their summaries are stored in Redis.
+
+    For streaming responses, the queries run while the content is generated
+    (e.g. by `userprofile.api.UserDataViewSet`), so the checks happen once
+    the stream has been consumed.
 
-            # Set the gauge
-            gauge(self._key, self._current_average_response_time())
+    NOTE: All per-request state is kept on the request.
 
-            # Inspect the original response to see which endpoint was called
-            metric(self._key, category="API Metrics")
+    """
+    def _strict(self):
+        return getattr(settings, 'QUERY_BUDGET_STRICT', False)
+
+    def _sampled(self):
+        rate = getattr(settings, 'QUERY_BUDGET_SAMPLE_RATE', 0)
+        return rate > 0 and random.random() < rate
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        sampled = not (settings.DEBUG or self._strict()) and self._sampled()
+        if settings.DEBUG or self._strict() or sampled:
+            request._query_recorder = querybudget.QueryRecorder()
+            request._query_recorder.start()
+            request._query_budget = querybudget.get_budget(view_func, request)
+            request._query_budget_sampled = sampled
+            view = getattr(view_func, 'cls', view_func)
+            request._query_budget_view = getattr(view, '__name__', str(view))
+
+    def process_exception(self, request, exception):
+        recorder = getattr(request, '_query_recorder', None)
+        if recorder is not None:
+            recorder.stop()
+            request._query_recorder = None
 
+    def process_response(self, request, response):
+        recorder = getattr(request, '_query_recorder', None)
+        if recorder is None:
+            return response
+        if response.streaming:
+            response.streaming_content = RecordedStream(
+                self, request, response, response.streaming_content)
+            return response
+        return self._check(request, response)
+
+    def _check(self, request, response):
+        recorder = request._query_recorder
+        recorder.stop()
+        budget = request._query_budget
+        problems = recorder.problems(budget, querybudget.repeat_threshold())
+        if problems:
+            logger.warning("Query budget: %s %s (%s)\n%s", request.method,
+                           request.path, request._query_budget_view,
+                           "\n".join(problems))
+        if request._query_budget_sampled:
+            querybudget.store_sample(recorder.summary(
+                method=request.method,
+                path=request.path,
+                view=request._query_budget_view,
+                status=response.status_code,
+                budget=budget,
+                timestamp=time.time(),
+            ))
+        if self._strict() and budget is not None and recorder.count > budget:
+            raise querybudget.QueryBudgetExceeded("{} {}: {}".format(
+                request.method, request.path, problems[0]))
         return response
 
 
+class RecordedStream:
+    """The content of a streaming response whose queries are recorded by
+    QueryBudgetMiddleware: they're checked once the content is consumed. If
+    it isn't (entirely), closing the response stops the recording."""
+
+    def __init__(self, middleware, request, response, content):
+        self.middleware = middleware
+        self.request = request
+        self.response = response
+        self.content = content
+
+    def __iter__(self):
+        try:
+            yield from self.content
+        except BaseException:  # Including GeneratorExit
+            self.close()
+            raise
+        self.middleware._check(self.request, self.response)
+
+    def close(self):
+        self.request._query_recorder.stop()
+
+
 class TimezoneMiddleware(object):
     """Simple middleware that set's the user's timezone."""
 
@@ -95,6 +95,20 @@ class VersionedViewSetMixin:
         return docstring
 
 
+class PrefetchPlanMixin:
+    """This mixin applies the `prefetch_plan` (see utils.prefetch) of a
+    viewset's serializer class to the queryset it lists or retrieves, so the
+    serializer can read related objects without a query per object.
+
+    """
+    def filter_queryset(self, queryset):
+        queryset = super().filter_queryset(queryset)
+        plan = getattr(self.get_serializer_class(), 'prefetch_plan', None)
+        if plan is not None:
+            queryset = plan.apply(queryset)
+        return queryset
+
+
 class TombstoneMixin:
     """This mixin records a metric when an object is created."""
 
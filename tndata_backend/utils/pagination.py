@@ -0,0 +1,177 @@
+"""
+Keyset (cursor) pagination for large, per-user collections.
+
+`PageNumberPagination` runs a `COUNT(*)` for every page, and fetches page N
+with an `OFFSET`, so deep pages get slower as a collection grows.
+`KeysetPagination` instead orders the queryset by a unique key (e.g. `id`,
+or `(updated_on, id)`) and fetches the rows that come after (or before) the
+key of the last item on the previous page:
+
+    SELECT ... WHERE (updated_on, id) < (%s, %s)
+    ORDER BY updated_on DESC, id DESC LIMIT 26
+
+With a matching index, e.g. on `(user_id, updated_on, id)`, every page costs
+the same. There's no count, and the cursors (the `next` and `previous` links)
+are opaque.
+
+To enable it for a viewset, subclass it with the viewset's `ordering`:
+
+    class UserActionPagination(KeysetPagination):
+        ordering = ('id', )
+
+Clients opt in by sending a `cursor` query param (which is empty for the
+first page); requests without one are paginated by the `fallback_class`, so
+existing clients that request `?page=N` keep working.
+
+"""
+import json
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from binascii import Error as BinasciiError
+from collections import OrderedDict
+
+from django.core.exceptions import ValidationError
+from django.db import connection
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import (
+    BasePagination, PageNumberPagination, _positive_int
+)
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    # The ordering of the results. Every field must be in the same direction,
+    # and together they must be unique (so the last is typically `id`).
+    ordering = ('-id', )
+
+    cursor_query_param = 'cursor'
+    invalid_cursor_message = 'Invalid cursor'
+    page_size = api_settings.PAGE_SIZE
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+
+    # Paginates requests that don't include a cursor.
+    fallback_class = PageNumberPagination
+
+    def __init__(self):
+        self.fallback = None
+
+    def get_page_size(self, request):
+        try:
+            return _positive_int(
+                request.query_params[self.page_size_query_param],
+                strict=True,
+                cutoff=self.max_page_size
+            )
+        except (KeyError, ValueError):
+            return self.page_size
+
+    def _fields(self, model):
+        return [model._meta.get_field(name.lstrip('-')) for name in self.ordering]
+
+    def encode_cursor(self, values, reverse=False):
+        # NOTE: datetimes keep their microseconds (DjangoJSONEncoder would
+        # truncate them), so the keys compare exactly.
+        values = [v.isoformat() if hasattr(v, 'isoformat') else v for v in values]
+        data = json.dumps({'k': values, 'r': reverse})
+        return urlsafe_b64encode(data.encode('utf8')).decode('ascii')
+
+    def decode_cursor(self, cursor, model):
+        """Return a tuple of the (key values, reverse) in a cursor, or None
+        for an empty cursor (i.e. the first page)."""
+        if not cursor:
+            return None
+        try:
+            data = json.loads(urlsafe_b64decode(cursor.encode('ascii')).decode('utf8'))
+            fields = self._fields(model)
+            if len(data['k']) != len(fields):
+                raise ValueError
+            values = [f.to_python(value) for f, value in zip(fields, data['k'])]
+            return values, bool(data['r'])
+        except (BinasciiError, KeyError, TypeError, ValueError, ValidationError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def _order(self, queryset, reverse):
+        ordering = self.ordering
+        if reverse:
+            ordering = [
+                name[1:] if name.startswith('-') else '-' + name
+                for name in ordering
+            ]
+        return queryset.order_by(*ordering)
+
+    def _after(self, queryset, values, reverse):
+        """Filter the queryset to the rows after (or before, in reverse) the
+        given key values, using a row comparison (so it can use an index)."""
+        model = queryset.model
+        columns = ", ".join(
+            "{}.{}".format(
+                connection.ops.quote_name(model._meta.db_table),
+                connection.ops.quote_name(field.column)
+            )
+            for field in self._fields(model)
+        )
+        descending = self.ordering[0].startswith('-')
+        op = '<' if descending != reverse else '>'
+        where = "({}) {} ({})".format(columns, op, ", ".join(["%s"] * len(values)))
+        return queryset.extra(where=[where], params=values)
+
+    def _key(self, obj):
+        return [getattr(obj, field.attname) for field in self._fields(obj.__class__)]
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if self.cursor_query_param not in request.query_params:
+            self.fallback = self.fallback_class()
+            return self.fallback.paginate_queryset(queryset, request, view=view)
+
+        self.request = request
+        cursor = self.decode_cursor(
+            request.query_params[self.cursor_query_param], queryset.model)
+        values, reverse = cursor or (None, False)
+
+        queryset = self._order(queryset, reverse)
+        if values is not None:
+            queryset = self._after(queryset, values, reverse)
+
+        page_size = self.get_page_size(request)
+        results = list(queryset[:page_size + 1])
+        has_more = len(results) > page_size
+        results = results[:page_size]
+        if reverse:
+            results.reverse()
+
+        # Coming back (in reverse) from a page means there's a next page.
+        self.has_next = reverse or has_more
+        self.has_previous = has_more if reverse else values is not None
+        self.page = results
+        return results
+
+    def _link(self, obj, reverse):
+        url = self.request.build_absolute_uri()
+        cursor = self.encode_cursor(self._key(obj), reverse)
+        return replace_query_param(url, self.cursor_query_param, cursor)
+
+    def get_next_link(self):
+        if not (self.page and self.has_next):
+            return None
+        return self._link(self.page[-1], reverse=False)
+
+    def get_previous_link(self):
+        if not (self.page and self.has_previous):
+            return None
+        return self._link(self.page[0], reverse=True)
+
+    def get_paginated_response(self, data):
+        if self.fallback is not None:
+            return self.fallback.get_paginated_response(data)
+        return Response(OrderedDict([
+            ('next', self.get_next_link()),
+            ('previous', self.get_previous_link()),
+            ('results', data)
+        ]))
+
+    def get_results(self, data):
+        if self.fallback is not None:
+            return self.fallback.get_results(data)
+        return data['results']
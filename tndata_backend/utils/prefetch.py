@@ -0,0 +1,68 @@
+"""
+Declarative prefetch plans for serializers.
+
+A serializer that reads related objects (or values that would otherwise
+require a query per object) declares what it needs as a `prefetch_plan`:
+
+    class ActionSerializer(serializers.ModelSerializer):
+        prefetch_plan = PrefetchPlan(prefetch_related=['goals'])
+
+    class UserActionSerializer(serializers.ModelSerializer):
+        prefetch_plan = PrefetchPlan(
+            select_related=['primary_goal'],
+            extra_select={'primary_usergoal_id': "(SELECT ...)"},
+        ) + ActionSerializer.prefetch_plan.nested('action')
+
+ViewSets that include `PrefetchPlanMixin` (see utils.mixins) apply their
+serializer's plan to the queryset they serialize.
+
+"""
+
+
+class PrefetchPlan:
+    """The `select_related` and `prefetch_related` lookups, and the extra
+    (annotated) values from `QuerySet.extra(select=...)`, that a serializer
+    needs to avoid issuing queries for each object."""
+
+    def __init__(self, select_related=None, prefetch_related=None, extra_select=None):
+        self.select_related = list(select_related or [])
+        self.prefetch_related = list(prefetch_related or [])
+        self.extra_select = dict(extra_select or {})
+
+    def __add__(self, other):
+        extra_select = dict(self.extra_select)
+        extra_select.update(other.extra_select)
+        return PrefetchPlan(
+            select_related=self.select_related + other.select_related,
+            prefetch_related=self.prefetch_related + other.prefetch_related,
+            extra_select=extra_select,
+        )
+
+    def __repr__(self):
+        return "<PrefetchPlan select_related={} prefetch_related={} extra_select={}>".format(
+            self.select_related, self.prefetch_related, list(self.extra_select))
+
+    def nested(self, prefix):
+        """Return a copy of this plan for a serializer that's nested under
+        the given relation (e.g. `ActionSerializer` for `UserAction.action`).
+
+        NOTE: extra values can't follow a relation, so they're not included.
+
+        """
+        def _prefix(lookups):
+            return ["{}__{}".format(prefix, lookup) for lookup in lookups]
+
+        return PrefetchPlan(
+            select_related=[prefix] + _prefix(self.select_related),
+            prefetch_related=_prefix(self.prefetch_related),
+        )
+
+    def apply(self, queryset):
+        """Apply the plan to the given queryset."""
+        if self.select_related:
+            queryset = queryset.select_related(*self.select_related)
+        if self.prefetch_related:
+            queryset = queryset.prefetch_related(*self.prefetch_related)
+        if self.extra_select:
+            queryset = queryset.extra(select=self.extra_select)
+        return queryset
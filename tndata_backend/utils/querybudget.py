@@ -0,0 +1,264 @@
+"""
+Per-request query budgets and N+1 detection.
+
+`QueryRecorder` records every SQL statement executed while it's active (on
+the current thread's database connections), along with the call site in our
+code that executed it. Statements are grouped by their *shape*: the SQL with
+its literals, placeholders, and `IN (...)` lists normalized, so that
+
+    SELECT ... FROM goals_goal WHERE id = 12
+    SELECT ... FROM goals_goal WHERE id = 13
+
+are the same shape. The same shape executed many times from the same call
+site is usually an N+1 pattern (e.g. a property that runs a query, used in
+a loop or a serializer).
+
+Views declare a budget on their (viewset) class, either a number or a dict
+keyed by the viewset's action:
+
+    class UserActionViewSet(...):
+        query_budget = {'list': 12, 'retrieve': 6}
+
+`utils.middleware.QueryBudgetMiddleware` then:
+
+* records every request when `DEBUG` is on (or `QUERY_BUDGET_STRICT`), and
+  logs a warning for requests that exceed their budget or repeat a shape
+  `QUERY_BUDGET_REPEAT_THRESHOLD` (or more) times.
+* raises `QueryBudgetExceeded` when `QUERY_BUDGET_STRICT` is on (the default
+  while running the tests), so a test that requests a view that exceeds its
+  budget fails.
+* otherwise, records a `QUERY_BUDGET_SAMPLE_RATE` fraction of requests and
+  stores a summary of each in a (capped) Redis list; see `samples`.
+
+In tests, `assert_query_budget` checks a block of code directly:
+
+    with assert_query_budget(5):
+        self.client.get(url)
+
+"""
+import json
+import os
+import re
+import sys
+import time
+
+from collections import OrderedDict, namedtuple
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import connections
+from django.db.backends.utils import CursorWrapper
+from django_rq import get_connection
+from redis.exceptions import RedisError
+
+
+SAMPLES_KEY = 'querybudget:samples'
+
+# A statement that was executed, and where.
+Query = namedtuple('Query', ['alias', 'sql', 'shape', 'site', 'duration'])
+
+# All the statements of the same shape executed from the same call site.
+QueryGroup = namedtuple('QueryGroup', ['shape', 'site', 'count', 'duration'])
+
+# Our code lives here; anything else (django, libraries) isn't a call site.
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r"\b\d+(?:\.\d+)?\b")
+_PLACEHOLDER = re.compile(r"%s|%\(\w+\)s")
+_LIST = re.compile(r"\(\s*\?(?:\s*,\s*\?)*\s*\)")
+_SPACE = re.compile(r"\s+")
+
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+
+def repeat_threshold():
+    return getattr(settings, 'QUERY_BUDGET_REPEAT_THRESHOLD', 5)
+
+
+def normalize(sql):
+    """Return the shape of a SQL statement: literals and placeholders are
+    replaced with `?`, and lists of them (e.g. for an `IN`) with `(...)`."""
+    shape = _STRING.sub('?', sql)
+    shape = _PLACEHOLDER.sub('?', shape)
+    shape = _NUMBER.sub('?', shape)
+    shape = _LIST.sub('(...)', shape)
+    return _SPACE.sub(' ', shape).strip()
+
+
+def call_site():
+    """Return the innermost frame of the stack that's in our code (i.e. not
+    in django, a library, or this module) as a `path:line in function`
+    string."""
+    frame = sys._getframe(1)
+    while frame is not None:
+        filename = frame.f_code.co_filename
+        if (
+            filename.startswith(PROJECT_ROOT) and
+            filename != __file__ and
+            'site-packages' not in filename
+        ):
+            return "{}:{} in {}".format(
+                os.path.relpath(filename, PROJECT_ROOT),
+                frame.f_lineno,
+                frame.f_code.co_name
+            )
+        frame = frame.f_back
+    return None
+
+
+def get_budget(view_func, request):
+    """Return the query budget declared on the view (class) that handles the
+    request, if any."""
+    budget = getattr(getattr(view_func, 'cls', None), 'query_budget', None)
+    if isinstance(budget, dict):
+        actions = getattr(view_func, 'actions', None) or {}
+        budget = budget.get(actions.get(request.method.lower()))
+    return budget
+
+
+class RecordingCursorWrapper(CursorWrapper):
+    """Wraps a connection's cursor, and tells a QueryRecorder about every
+    statement it executes."""
+
+    def __init__(self, cursor, db, recorder):
+        super().__init__(cursor, db)
+        self.recorder = recorder
+
+    def execute(self, sql, params=None):
+        start = time.time()
+        try:
+            return self.cursor.execute(sql, params)
+        finally:
+            self.recorder.record(self.db.alias, sql, time.time() - start)
+
+    def executemany(self, sql, param_list):
+        start = time.time()
+        try:
+            return self.cursor.executemany(sql, param_list)
+        finally:
+            self.recorder.record(self.db.alias, sql, time.time() - start)
+
+
+class QueryRecorder:
+    """Records the SQL executed on this thread's connections (between calls
+    to `start` and `stop`, or within a `with` block)."""
+
+    def __init__(self, using=None):
+        self.using = using or list(settings.DATABASES)
+        self.queries = []
+        self._originals = {}
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+
+    def _wrap(self, connection, make_cursor):
+        def wrapped(cursor):
+            return RecordingCursorWrapper(make_cursor(cursor), connection, self)
+        return wrapped
+
+    def start(self):
+        # NOTE: connections are thread-local, so this only sees the queries
+        # executed by the current thread (i.e. request).
+        for alias in self.using:
+            connection = connections[alias]
+            self._originals[alias] = {}
+            for name in ['make_cursor', 'make_debug_cursor']:
+                self._originals[alias][name] = connection.__dict__.get(name)
+                setattr(connection, name, self._wrap(connection, getattr(connection, name)))
+
+    def stop(self):
+        for alias, originals in self._originals.items():
+            connection = connections[alias]
+            for name, original in originals.items():
+                if original is None:
+                    delattr(connection, name)
+                else:
+                    setattr(connection, name, original)
+        self._originals = {}
+
+    def record(self, alias, sql, duration):
+        self.queries.append(Query(alias, sql, normalize(sql), call_site(), duration))
+
+    @property
+    def count(self):
+        return len(self.queries)
+
+    def groups(self):
+        """Return a list of QueryGroups, most executed first."""
+        groups = OrderedDict()
+        for query in self.queries:
+            key = (query.shape, query.site)
+            count, duration = groups.get(key, (0, 0))
+            groups[key] = (count + 1, duration + query.duration)
+        groups = [
+            QueryGroup(shape, site, count, duration)
+            for (shape, site), (count, duration) in groups.items()
+        ]
+        return sorted(groups, key=lambda group: group.count, reverse=True)
+
+    def repeated(self, threshold=None):
+        """Return the QueryGroups executed at least `threshold` times."""
+        threshold = threshold or repeat_threshold()
+        return [group for group in self.groups() if group.count >= threshold]
+
+    def problems(self, budget=None, threshold=None):
+        """Return a list of messages describing how the recorded queries
+        exceed the budget or (given a threshold) repeat the same shape; the
+        list is empty if there are no problems."""
+        messages = []
+        if budget is not None and self.count > budget:
+            messages.append("{} queries (the budget is {})".format(self.count, budget))
+        for group in (self.repeated(threshold) if threshold else []):
+            messages.append("{} queries from {}: {}".format(
+                group.count, group.site, group.shape))
+        return messages
+
+    def summary(self, **extra):
+        """Return a dict (that can be dumped to JSON) summarizing the queries."""
+        data = OrderedDict(extra)
+        data['count'] = self.count
+        data['duration'] = sum(query.duration for query in self.queries)
+        data['groups'] = [group._asdict() for group in self.groups()]
+        return data
+
+
+@contextmanager
+def assert_query_budget(max_queries=None, threshold=None, using=None):
+    """A context manager for tests: fail if the block executes more than
+    `max_queries` statements, or (when given a `threshold`) repeats the
+    same shape from the same call site `threshold` or more times.
+
+        with assert_query_budget(5, threshold=3) as recorder:
+            ...
+
+    """
+    with QueryRecorder(using=using) as recorder:
+        yield recorder
+    messages = recorder.problems(max_queries, threshold)
+    if messages:
+        raise QueryBudgetExceeded("\n".join(messages))
+
+
+def store_sample(data):
+    """Push a request's summary onto the (capped) list of samples in Redis."""
+    limit = getattr(settings, 'QUERY_BUDGET_MAX_SAMPLES', 1000)
+    pipe = get_connection('default').pipeline()
+    pipe.lpush(SAMPLES_KEY, json.dumps(data))
+    pipe.ltrim(SAMPLES_KEY, 0, limit - 1)
+    try:
+        pipe.execute()
+    except RedisError:
+        pass  # Samples are only nice to have.
+
+
+def samples(count=100):
+    """Return the most recent samples stored in Redis (newest first)."""
+    items = get_connection('default').lrange(SAMPLES_KEY, 0, count - 1)
+    return [json.loads(item.decode('utf8')) for item in items]
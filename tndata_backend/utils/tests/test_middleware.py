@@ -1,7 +1,10 @@
+import threading
+
 from django.http import HttpRequest, HttpResponse
-from django.test import TestCase
+from django.test import TestCase, override_settings
 from unittest.mock import MagicMock, Mock, patch
 
+from .. import api_metrics
 from ..middleware import APIMetricsMiddleware
 
 
@@ -9,12 +12,6 @@ class TestAPIMetricsMiddleware(TestCase):
     """Smoke test of the middleware. This just creates an instance of the
     middleware object and ensures things don't blow up."""
 
-    def test_init(self):
-        mid = APIMetricsMiddleware()
-        self.assertIsNone(mid._key)
-        self.assertIsNone(mid._start_time)
-        self.assertIsNone(mid._end_time)
-
     def test__get_request_key(self):
         """Ensure that the middelware generates a correctly-formated request key"""
         mid = APIMetricsMiddleware()
@@ -31,31 +28,6 @@ class TestAPIMetricsMiddleware(TestCase):
         request = MagicMock(HttpRequest, path='/something-else/')
         self.assertIsNone(mid._get_request_key(request))
 
-    def test__current_average_response_time(self):
-        """Ensure current average response time is calculated correctly."""
-
-        with patch('utils.middleware.get_r') as mock_get_r:
-            # When there's not a current gauge
-            mock_get_r.return_value = Mock(**{'get_gauge.return_value': None})
-
-            # Set the _end_time & _start_time, because this method expects them.
-            mid = APIMetricsMiddleware()
-            mid._end_time = 3
-            mid._start_time = 1
-
-            # Expected: 3 - 1 = 2
-            self.assertEqual(mid._current_average_response_time(), 2.0)
-
-            # When there IS a current gauge
-            mock_get_r.reset_mock()
-            mock_get_r.return_value = Mock(**{'get_gauge.return_value': 1})
-            mid = APIMetricsMiddleware()
-            mid._end_time = 3
-            mid._start_time = 1
-
-            # Expected: current mock averaged with the set time (2 + 1) / 2
-            self.assertEqual(mid._current_average_response_time(), 1.5)
-
     def test_proces_request(self):
         """Ensure the process request sets a time when we're hitting an api"""
 
@@ -65,27 +37,80 @@ class TestAPIMetricsMiddleware(TestCase):
             mock_time.time.return_value = 1
             mid = APIMetricsMiddleware()
             mid.process_request(request)
-            self.assertEquals(mid._start_time, 1)
+            self.assertEqual(request._api_metrics, ('api-foo', 1))
 
         # When we've got a request that's NOT hitting the api
-        request = MagicMock(HttpRequest, path='/foo/')
+        request = HttpRequest()
+        request.path = '/foo/'
         mid = APIMetricsMiddleware()
         mid.process_request(request)
-        self.assertIsNone(mid._start_time)
+        self.assertFalse(hasattr(request, '_api_metrics'))
 
     def test_process_response(self):
-        """Ensure we set a gauge and metric when hitting the api."""
-        request = MagicMock(HttpRequest, path='/api/')
+        """Ensure we record the request's metrics when hitting the api."""
+        request = MagicMock(HttpRequest, path='/api/', _api_metrics=('api', 1))
         response = MagicMock(HttpResponse)
 
-        with patch('utils.middleware.gauge') as mock_gauge:
-            with patch('utils.middleware.metric') as mock_metric:
+        with patch('utils.middleware.time') as mock_time:
+            mock_time.time.return_value = 3
+            with patch('utils.middleware.api_metrics') as mock_api_metrics:
                 mid = APIMetricsMiddleware()
-                mid._current_average_response_time = Mock(return_value=1.0)
-                mid._key = 'api'
-                mid._start_time = 1
                 resp = mid.process_response(request, response)
 
                 self.assertEqual(resp, response)
-                mock_gauge.assert_called_once_with('api', 1.0)
-                mock_metric.assert_called_once_with('api', category='API Metrics')
+                mock_api_metrics.record.assert_called_once_with('api', 2)
+
+
+@override_settings(API_METRICS_FLUSH_INTERVAL=60, API_METRICS_MAX_BUFFERED=3)
+class TestAPIMetricsBuffer(TestCase):
+
+    def setUp(self):
+        api_metrics.buffer.reset()
+
+    def test_record(self):
+        with patch('utils.api_metrics.write') as mock_write:
+            api_metrics.record('api-foo', 1.0)
+            api_metrics.record('api-foo', 2.0)
+            self.assertFalse(mock_write.called)
+
+            # The buffer is flushed once it's full.
+            api_metrics.record('api-bar', 0.5)
+            mock_write.assert_called_once_with(
+                {'api-foo': 2, 'api-bar': 1},
+                {'api-foo': 3.0, 'api-bar': 0.5}
+            )
+            self.assertEqual(api_metrics.buffer.size, 0)
+
+    def test_record_flushes_periodically(self):
+        with patch('utils.api_metrics.write') as mock_write:
+            api_metrics.buffer.last_flush -= 61
+            api_metrics.record('api-foo', 1.0)
+            mock_write.assert_called_once_with({'api-foo': 1}, {'api-foo': 1.0})
+
+    def test_buffer_is_per_thread(self):
+        api_metrics.record('api-foo', 1.0)
+
+        other_counts = {}
+
+        def other():
+            api_metrics.record('api-bar', 1.0)
+            other_counts.update(api_metrics.buffer.counts)
+
+        thread = threading.Thread(target=other)
+        thread.start()
+        thread.join()
+        self.assertEqual(other_counts, {'api-bar': 1})
+        self.assertEqual(dict(api_metrics.buffer.counts), {'api-foo': 1})
+
+    def test_write(self):
+        pipe = Mock()
+        with patch('utils.api_metrics.get_r') as mock_get_r:
+            mock_get_r.return_value.r.pipeline.return_value = pipe
+            mock_get_r.return_value._build_keys.return_value = ['m:api-foo:d']
+            mock_get_r.return_value._gauge_key.return_value = 'g:api-foo'
+            api_metrics.write({'api-foo': 2}, {'api-foo': 3.0})
+
+        pipe.incr.assert_called_once_with('m:api-foo:d', 2)
+        pipe.eval.assert_called_once_with(
+            api_metrics.AVERAGE_GAUGE_SCRIPT, 1, 'g:api-foo', 1.5, 0.25)
+        pipe.execute.assert_called_once_with()
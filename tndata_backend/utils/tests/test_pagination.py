@@ -0,0 +1,76 @@
+from datetime import datetime
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+from django.utils import timezone
+from rest_framework.exceptions import NotFound
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from ..pagination import KeysetPagination
+
+
+class UserPagination(KeysetPagination):
+    ordering = ('-date_joined', '-id')
+    page_size = 3
+
+
+class TestKeysetPagination(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        User = get_user_model()
+        # Some users share a date_joined, so pages have to break ties by id.
+        joined = [datetime(2016, 1, day, 12, 0, 0, 123456) for day in [1, 1, 2, 2, 2, 3, 4]]
+        for i, date in enumerate(joined):
+            User.objects.create_user(
+                'user{}'.format(i),
+                'user{}@example.com'.format(i),
+                'pass',
+                date_joined=timezone.make_aware(date, timezone.utc)
+            )
+        cls.expected = list(
+            User.objects.order_by('-date_joined', '-id').values_list('username', flat=True)
+        )
+
+    def _page(self, url):
+        paginator = UserPagination()
+        request = Request(APIRequestFactory().get(url))
+        queryset = get_user_model().objects.all()
+        with self.assertNumQueries(1):  # No count query.
+            page = paginator.paginate_queryset(queryset, request)
+        data = paginator.get_paginated_response([u.username for u in page]).data
+        return data
+
+    def test_pages(self):
+        first = self._page('/users/?cursor=')
+        self.assertEqual(first['results'], self.expected[:3])
+        self.assertIsNone(first['previous'])
+
+        second = self._page(first['next'])
+        self.assertEqual(second['results'], self.expected[3:6])
+
+        last = self._page(second['next'])
+        self.assertEqual(last['results'], self.expected[6:])
+        self.assertIsNone(last['next'])
+
+        # Going back.
+        self.assertEqual(self._page(last['previous'])['results'], self.expected[3:6])
+        back = self._page(second['previous'])
+        self.assertEqual(back['results'], self.expected[:3])
+        self.assertIsNone(back['previous'])
+        self.assertEqual(self._page(back['next'])['results'], self.expected[3:6])
+
+    def test_invalid_cursor(self):
+        paginator = UserPagination()
+        request = Request(APIRequestFactory().get('/users/?cursor=nope'))
+        with self.assertRaises(NotFound):
+            paginator.paginate_queryset(get_user_model().objects.all(), request)
+
+    def test_falls_back_to_page_numbers(self):
+        paginator = UserPagination()
+        request = Request(APIRequestFactory().get('/users/?page=1'))
+        queryset = get_user_model().objects.order_by('id')
+        page = paginator.paginate_queryset(queryset, request)
+        data = paginator.get_paginated_response([u.id for u in page]).data
+        self.assertEqual(data['count'], 7)
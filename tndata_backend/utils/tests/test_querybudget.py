@@ -0,0 +1,149 @@
+from django.contrib.auth import get_user_model
+from django.http import HttpRequest, HttpResponse, StreamingHttpResponse
+from django.test import TestCase, override_settings
+from unittest.mock import MagicMock, patch
+
+from ..middleware import QueryBudgetMiddleware
+from ..querybudget import (
+    QueryBudgetExceeded,
+    QueryRecorder,
+    assert_query_budget,
+    get_budget,
+    normalize,
+)
+
+
+class TestNormalize(TestCase):
+
+    def test_normalize(self):
+        self.assertEqual(
+            normalize("SELECT * FROM t WHERE id = 12 AND name = 'o''hai'"),
+            "SELECT * FROM t WHERE id = ? AND name = ?"
+        )
+        self.assertEqual(
+            normalize('SELECT * FROM t\n WHERE "id" IN (%s, %s, %s) LIMIT 21'),
+            'SELECT * FROM t WHERE "id" IN (...) LIMIT ?'
+        )
+        self.assertEqual(
+            normalize('SELECT * FROM t WHERE "id" IN (%s)'),
+            normalize('SELECT * FROM t WHERE "id" IN (%s, %s)')
+        )
+
+
+class TestQueryRecorder(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        User = get_user_model()
+        cls.users = [
+            User.objects.create_user('u{}'.format(i), 'u{}@example.com'.format(i), 'pass')
+            for i in range(3)
+        ]
+
+    def _n_plus_one(self):
+        User = get_user_model()
+        for user in self.users:
+            User.objects.get(pk=user.id)
+
+    def test_groups(self):
+        with QueryRecorder() as recorder:
+            self._n_plus_one()
+            list(get_user_model().objects.all())
+
+        self.assertEqual(recorder.count, 4)
+        groups = recorder.groups()
+        self.assertEqual(len(groups), 2)
+        self.assertEqual(groups[0].count, 3)
+        self.assertIn('in _n_plus_one', groups[0].site)
+        self.assertEqual(recorder.repeated(threshold=3), groups[:1])
+        self.assertEqual(recorder.problems(budget=4), [])
+        self.assertEqual(len(recorder.problems(budget=3, threshold=3)), 2)
+
+        # Once stopped, nothing else is recorded.
+        self._n_plus_one()
+        self.assertEqual(recorder.count, 4)
+
+    def test_assert_query_budget(self):
+        with assert_query_budget(3):
+            self._n_plus_one()
+        with self.assertRaises(QueryBudgetExceeded):
+            with assert_query_budget(2):
+                self._n_plus_one()
+        with self.assertRaises(QueryBudgetExceeded):
+            with assert_query_budget(threshold=3):
+                self._n_plus_one()
+
+
+class TestQueryBudgetMiddleware(TestCase):
+
+    def _view(self, budget):
+        view = MagicMock(actions={'get': 'list'})
+        view.cls = type('ExampleViewSet', (), {'query_budget': budget})
+        return view
+
+    def test_get_budget(self):
+        request = MagicMock(HttpRequest, method='GET')
+        self.assertEqual(get_budget(self._view(3), request), 3)
+        self.assertEqual(get_budget(self._view({'list': 2}), request), 2)
+        self.assertIsNone(get_budget(self._view({'retrieve': 2}), request))
+        self.assertIsNone(get_budget(lambda request: None, request))
+
+    @override_settings(DEBUG=False, QUERY_BUDGET_STRICT=True)
+    def test_strict(self):
+        mid = QueryBudgetMiddleware()
+        request = MagicMock(HttpRequest, method='GET', path='/api/example/')
+        mid.process_view(request, self._view(1), [], {})
+        list(get_user_model().objects.all())
+        mid.process_response(request, HttpResponse())
+
+        request = MagicMock(HttpRequest, method='GET', path='/api/example/')
+        mid.process_view(request, self._view(1), [], {})
+        list(get_user_model().objects.all())
+        list(get_user_model().objects.all())
+        with self.assertRaises(QueryBudgetExceeded):
+            mid.process_response(request, HttpResponse())
+
+    @override_settings(DEBUG=False, QUERY_BUDGET_STRICT=True)
+    def test_streaming(self):
+        def content():
+            yield str(get_user_model().objects.count())
+            yield str(get_user_model().objects.count())
+
+        mid = QueryBudgetMiddleware()
+        request = MagicMock(HttpRequest, method='GET', path='/api/example/')
+        mid.process_view(request, self._view(1), [], {})
+        response = mid.process_response(request, StreamingHttpResponse(content()))
+        # The queries run (and are checked) as the content is consumed.
+        self.assertEqual(request._query_recorder.count, 0)
+        with self.assertRaises(QueryBudgetExceeded):
+            b''.join(response.streaming_content)
+        self.assertEqual(request._query_recorder.count, 2)
+
+        # Closing a response that wasn't consumed stops the recording.
+        request = MagicMock(HttpRequest, method='GET', path='/api/example/')
+        mid.process_view(request, self._view(1), [], {})
+        response = mid.process_response(request, StreamingHttpResponse(content()))
+        response.close()
+        get_user_model().objects.count()
+        self.assertEqual(request._query_recorder.count, 0)
+
+    @override_settings(DEBUG=False, QUERY_BUDGET_STRICT=False, QUERY_BUDGET_SAMPLE_RATE=1)
+    def test_sampled(self):
+        mid = QueryBudgetMiddleware()
+        request = MagicMock(HttpRequest, method='GET', path='/api/example/')
+        mid.process_view(request, self._view(1), [], {})
+        list(get_user_model().objects.all())
+        list(get_user_model().objects.all())
+        with patch('utils.middleware.querybudget.store_sample') as mock_store:
+            mid.process_response(request, HttpResponse())
+            data = mock_store.call_args[0][0]
+            self.assertEqual(data['view'], 'ExampleViewSet')
+            self.assertEqual(data['count'], 2)
+            self.assertEqual(data['budget'], 1)
+
+    @override_settings(DEBUG=False, QUERY_BUDGET_STRICT=False, QUERY_BUDGET_SAMPLE_RATE=0)
+    def test_not_sampled(self):
+        mid = QueryBudgetMiddleware()
+        request = HttpRequest()
+        mid.process_view(request, self._view(1), [], {})
+        self.assertFalse(hasattr(request, '_query_recorder'))